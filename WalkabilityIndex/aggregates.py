@@ -0,0 +1,52 @@
+import numpy as np
+
+# Fields of the correlation matrix in correlations.html, in display order
+CORRELATION_FIELDS = ['NatWalkInd', 'D2A_Ranked', 'D3B_Ranked', 'D4A_Ranked']
+
+# Significant digits kept in the embedded JSON
+PRECISION = 6
+
+def _round(value):
+    value = float(value)
+    if not np.isfinite(value):
+        return None
+    return float(f'{value:.{PRECISION}g}')
+
+def field_summary(values):
+    """Summarize one column the way the pages do with d3.extent/mean/quantile."""
+    values = values[~np.isnan(values)]
+    if not len(values):
+        return None
+    # d3.quantile and numpy's default both use linear interpolation (R-7)
+    q1, median, q3 = np.quantile(values, [0.25, 0.5, 0.75])
+    return {
+        'count': int(len(values)),
+        'extent': [_round(values.min()), _round(values.max())],
+        'mean': _round(values.mean()),
+        'median': _round(median),
+        # d3.deviation is the sample standard deviation
+        'deviation': _round(values.std(ddof=1)) if len(values) > 1 else None,
+        'quartiles': [_round(q1), _round(median), _round(q3)]
+    }
+
+def correlation_matrix(columns, fields=CORRELATION_FIELDS):
+    """Pearson correlations between fields over features with every field present."""
+    fields = [field for field in fields if field in columns]
+    matrix = np.column_stack([columns[field] for field in fields])
+    matrix = matrix[~np.isnan(matrix).any(axis=1)]
+    if len(matrix) < 2:
+        return None
+    with np.errstate(invalid='ignore', divide='ignore'):
+        correlations = np.corrcoef(matrix, rowvar=False)
+    return {
+        'fields': fields,
+        'matrix': [[_round(value) for value in row] for row in np.atleast_2d(correlations)]
+    }
+
+def compute_aggregates(columns):
+    """Compute the per-field summaries and correlation matrix the charts draw from."""
+    return {
+        'count': int(max((len(values) for values in columns.values()), default=0)),
+        'fields': {field: field_summary(values) for field, values in columns.items()},
+        'correlations': correlation_matrix(columns)
+    }
@@ -0,0 +1,143 @@
+import ast
+import hashlib
+import json
+import sys
+from pathlib import Path
+from html_backends import resolve_backend
+
+MANIFEST_VERSION = 2
+
+def file_hash(file_path):
+    """Return the SHA-256 hex digest of a file's bytes."""
+    with open(file_path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def local_imports(source_path):
+    """Return the sources a module imports from its own directory, itself included, transitively."""
+    directory = Path(source_path).resolve().parent
+    found = []
+    pending = [Path(source_path).resolve()]
+    while pending:
+        path = pending.pop()
+        if path in found:
+            continue
+        found.append(path)
+        with open(path, 'r', encoding='utf-8') as f:
+            tree = ast.parse(f.read(), str(path))
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and not node.level and node.module:
+                names = [node.module]
+            else:
+                continue
+            for name in names:
+                candidate = directory / f"{name.split('.')[0]}.py"
+                if candidate.exists():
+                    pending.append(candidate)
+    return sorted(found)
+
+def builder_hash(builder):
+    """Hash everything that shapes the builder's output.
+
+    That is the source of the builder's module and of every helper module
+    it imports from its directory, its parser backend, and its options as
+    canonical JSON, so changing any of them invalidates cached fragments.
+    """
+    module = sys.modules[type(builder).__module__]
+    digest = hashlib.sha256()
+    for path in local_imports(module.__file__):
+        digest.update(f'{path.name}:{file_hash(path)}\n'.encode('utf-8'))
+    options = getattr(builder, 'build_options', dict)()
+    digest.update(json.dumps(options, sort_keys=True, separators=(',', ':')).encode('utf-8'))
+    backend = resolve_backend(getattr(builder, 'parser', None))
+    return f'{digest.hexdigest()}:{backend}'
+
+class BuildManifest:
+    def __init__(self, manifest_path, root_dir, builder):
+        self.manifest_path = Path(manifest_path)
+        self.root_dir = Path(root_dir)
+        self.builder = builder_hash(builder)
+        self.pages = {}
+        self.inputs = {}
+        # Derived files the last build wrote, relative to root_dir
+        self.outputs = []
+        self.seen = set()
+        self.changed = False
+        self.load()
+
+    @classmethod
+    def for_output(cls, output_path, root_dir, builder):
+        """Return the manifest stored next to an integrated output file."""
+        output_path = Path(output_path)
+        manifest_path = output_path.with_name(f'.{output_path.name}.manifest.json')
+        return cls(manifest_path, root_dir, builder)
+
+    def load(self):
+        """Load cached fragments, discarding them if the builder has changed."""
+        if not self.manifest_path.exists():
+            self.changed = True
+            return
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            print(f"Warning: Ignoring unreadable manifest {self.manifest_path}")
+            self.changed = True
+            return
+
+        if data.get('version') != MANIFEST_VERSION or data.get('builder') != self.builder:
+            self.changed = True
+            return
+        self.pages = data.get('pages', {})
+        self.inputs = data.get('inputs', {})
+        self.outputs = data.get('outputs', [])
+
+    def extract_all(self, file_paths, extract_pages):
+        """Return fragments for each page, passing only changed pages to extract_pages."""
+        keys = [Path(file_path).relative_to(self.root_dir).as_posix() for file_path in file_paths]
+        digests = [file_hash(file_path) for file_path in file_paths]
+        self.seen.update(keys)
+
+        stale = [i for i, (key, digest) in enumerate(zip(keys, digests))
+                 if self.pages.get(key, {}).get('hash') != digest]
+        if stale:
+            fresh = extract_pages([file_paths[i] for i in stale])
+            for i, fragments in zip(stale, fresh):
+                self.pages[keys[i]] = {'hash': digests[i], 'fragments': fragments}
+            self.changed = True
+
+        return [self.pages[key]['fragments'] for key in keys]
+
+    def track(self, file_path):
+        """Record a non-page input, such as a data file, whose change forces a rebuild."""
+        key = Path(file_path).relative_to(self.root_dir).as_posix()
+        digest = file_hash(file_path) if Path(file_path).exists() else None
+        if self.inputs.get(key) != digest:
+            self.inputs[key] = digest
+            self.changed = True
+
+    def record_outputs(self, names):
+        """Record the derived files a build wrote, relative to root_dir."""
+        self.outputs = sorted(set(names))
+
+    def missing_outputs(self):
+        return [name for name in self.outputs if not (self.root_dir / name).exists()]
+
+    def is_stale(self, output_path):
+        """Return True if the output must be written for this build."""
+        removed = set(self.pages) - self.seen
+        return (self.changed or bool(removed) or not Path(output_path).exists() or
+                bool(self.missing_outputs()))
+
+    def save(self):
+        """Write the manifest, keeping only pages used in this build."""
+        pages = {key: self.pages[key] for key in sorted(self.seen)}
+        with open(self.manifest_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'version': MANIFEST_VERSION,
+                'builder': self.builder,
+                'pages': pages,
+                'inputs': self.inputs,
+                'outputs': self.outputs
+            }, f)
@@ -0,0 +1,38 @@
+import numpy as np
+
+# Loader injected ahead of the page scripts. It fetches the binary file once
+# and returns {field: Float32Array} views on the same buffer, with no parse
+# step. Float32Array uses the platform's byte order, which is little-endian
+# in every browser we target, matching the file.
+COLUMNS_LOADER = """
+const loadWalkabilityColumns = (() => {
+    const header = JSON.parse(document.getElementById("walkability-columns").textContent);
+    let columns = null;
+    return () => columns || (columns = fetch(header.url)
+        .then(response => response.arrayBuffer())
+        .then(buffer => Object.fromEntries(Object.entries(header.fields).map(
+            ([field, column]) => [field, new Float32Array(buffer, column.offset, column.length)]))));
+})();
+"""
+
+def write_columns(columns, output_path):
+    """Write columns back to back as little-endian Float32 and return the header.
+
+    The header maps each field to its byte offset and length; every column
+    is a multiple of four bytes, so each offset is aligned for a
+    Float32Array view. Missing values stay NaN.
+    """
+    fields = {}
+    offset = 0
+    with open(output_path, 'wb') as f:
+        for field, values in columns.items():
+            data = np.asarray(values, dtype='<f4')
+            f.write(data.tobytes())
+            fields[field] = {'offset': offset, 'length': len(data)}
+            offset += data.nbytes
+    return {
+        'count': max((column['length'] for column in fields.values()), default=0),
+        'dtype': 'float32',
+        'byteOrder': 'little',
+        'fields': fields
+    }
@@ -0,0 +1,143 @@
+import argparse
+import json
+import time
+from pathlib import Path
+import numpy as np
+from geojson_prune import ID_FIELD
+from walkability_data import GEOJSON_FILE, FeatureSource, scan_features
+
+KINDS = ['queen', 'rook']
+
+# Decimals vertices are matched at; 1e-7 degrees is about a centimetre, well
+# below the digitizing noise of shared block-group boundaries
+PRECISION = 7
+
+def _polygon_rings(feature):
+    geometry = feature.get('geometry')
+    if not geometry:
+        return []
+    polygons = [geometry['coordinates']] if geometry['type'] == 'Polygon' else geometry['coordinates']
+    return [ring for polygon in polygons for ring in polygon if len(ring) > 1]
+
+def _vertex_keys(points, precision):
+    """Pack rounded (x, y) pairs into single int64 keys."""
+    grid = np.round(points * 10 ** precision).astype(np.int64)
+    return (grid[:, 0] << 32) ^ (grid[:, 1] & 0xFFFFFFFF)
+
+def _shared_pairs(keys, owners):
+    """(i, j) pairs of owners, i < j, that have a key in common.
+
+    Keys are sorted with their owners, so every owner of a key sits in one
+    run; the pairs within each run are generated by comparing each entry
+    with the entries d places after it, for d up to the longest run.
+    """
+    if not len(owners):
+        return np.empty((0, 2), dtype=np.int64)
+    order = np.lexsort((owners,) + tuple(keys[::-1]))
+    keys = [key[order] for key in keys]
+    owners = owners[order]
+    same_key = lambda a, b: np.logical_and.reduce([key[a] == key[b] for key in keys])
+
+    # One entry per (key, owner)
+    first = np.ones(len(owners), dtype=bool)
+    first[1:] = ~same_key(slice(1, None), slice(None, -1)) | (owners[1:] != owners[:-1])
+    keys = [key[first] for key in keys]
+    owners = owners[first]
+
+    pairs = []
+    d = 1
+    while d < len(owners):
+        match = same_key(slice(d, None), slice(None, -d))
+        if not match.any():
+            break
+        pairs.append(np.column_stack([owners[:-d][match], owners[d:][match]]))
+        d += 1
+    return np.concatenate(pairs) if pairs else np.empty((0, 2), dtype=np.int64)
+
+def to_csr(pairs, n):
+    """Symmetric adjacency of undirected pairs as CSR (indptr, indices), neighbours sorted."""
+    # A shared boundary yields one pair per shared vertex; dedupe as i * n + j codes
+    codes = np.unique(np.concatenate([pairs[:, 0] * n + pairs[:, 1], pairs[:, 1] * n + pairs[:, 0]]))
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(codes // n, minlength=n), out=indptr[1:])
+    return indptr, codes % n
+
+class ContiguityBuilder:
+    """Vertex and edge keys of features, gathered a feature at a time for contiguity()."""
+
+    def __init__(self, precision=PRECISION):
+        self.precision = precision
+        self.ids = []
+        self.vertex_keys, self.vertex_owners = [], []
+        self.edge_starts, self.edge_ends, self.edge_owners = [], [], []
+
+    def add(self, feature):
+        i = len(self.ids)
+        self.ids.append((feature.get('properties') or {}).get(ID_FIELD))
+        for ring in _polygon_rings(feature):
+            keys = _vertex_keys(np.asarray(ring, dtype=float)[:, :2], self.precision)
+            self.vertex_keys.append(keys)
+            self.vertex_owners.append(np.full(len(keys), i))
+            # Edges keyed by their endpoints in either direction
+            a, b = keys[:-1], keys[1:]
+            edge = a != b
+            self.edge_starts.append(np.minimum(a, b)[edge])
+            self.edge_ends.append(np.maximum(a, b)[edge])
+            self.edge_owners.append(np.full(int(edge.sum()), i))
+
+    def graphs(self):
+        """Return (ids, graphs) over the features added so far, as contiguity() does."""
+        concat = lambda parts: np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+        n = len(self.ids)
+        queen = _shared_pairs([concat(self.vertex_keys)], concat(self.vertex_owners))
+        rook = _shared_pairs([concat(self.edge_starts), concat(self.edge_ends)], concat(self.edge_owners))
+        return self.ids, {'queen': to_csr(queen, n), 'rook': to_csr(rook, n)}
+
+def contiguity(features, precision=PRECISION):
+    """Queen and rook contiguity of the features' polygons.
+
+    Queen neighbours share at least one vertex and rook neighbours share an
+    edge. Vertices are matched exactly after rounding to precision decimals,
+    by sorting vertex and edge keys instead of testing polygon pairs, so the
+    cost is O(V log V) in the number of vertices. Returns (ids, graphs) where
+    ids holds each feature's GEOID10 and graphs maps kind to CSR arrays.
+    """
+    builder = ContiguityBuilder(precision)
+    scan_features(features, [builder])
+    return builder.graphs()
+
+def write_contiguity(ids, graphs, output_path):
+    """Write the graphs as {ids, queen: {indptr, indices}, rook: {...}} JSON."""
+    data = {'ids': ids}
+    for kind, (indptr, indices) in graphs.items():
+        data[kind] = {'indptr': indptr.tolist(), 'indices': indices.tolist()}
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, separators=(',', ':'))
+
+def load_contiguity(path, kind='queen'):
+    """Read one graph back as (ids, indptr, indices) arrays."""
+    if kind not in KINDS:
+        raise ValueError(f"Unknown contiguity {kind}")
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    graph = data[kind]
+    return data['ids'], np.array(graph['indptr'], dtype=np.int64), np.array(graph['indices'], dtype=np.int64)
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the contiguity graphs of the block groups.')
+    parser.add_argument('base_dir', nargs='?', default="/Users/gaia/Downloads/WalkabilityIndex")
+    parser.add_argument('--geojson', default=GEOJSON_FILE)
+    args = parser.parse_args()
+
+    features = FeatureSource(Path(args.base_dir) / args.geojson)
+    start = time.perf_counter()
+    ids, graphs = contiguity(features)
+    elapsed = time.perf_counter() - start
+    print(f"{len(ids):,} features in {elapsed:.2f} s")
+    for kind, (indptr, indices) in graphs.items():
+        degree = np.diff(indptr)
+        print(f"  {kind}: {len(indices) // 2:,} links, mean {degree.mean():.2f} neighbours, "
+              f"{np.count_nonzero(degree == 0):,} islands")
+
+if __name__ == "__main__":
+    main()
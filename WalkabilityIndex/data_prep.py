@@ -0,0 +1,413 @@
+import json
+from pathlib import Path
+import numpy as np
+from aggregates import compute_aggregates, field_summary
+from columnar_export import COLUMNS_LOADER, write_columns
+from contiguity import ContiguityBuilder, write_contiguity
+from downsample import CHART_WIDTHS, series_points, temporal_levels
+from geojson_prune import ID_FIELD, PrunedWriter, find_property_accesses, rewrite_data_loads
+from force_layout import layout_graph_file
+from kde import binned_kde
+from nearest import CENTROID_TREE_FILE, CentroidCollector
+from partition import PARTITIONS_LOADER, TILE_CAPACITY, write_partitions
+from scenarios import BASELINE_TOLERANCE, DEFAULT_SCENARIOS, ScenarioCache, baseline_error, load_scenarios
+from simplify import LOD_WIDTHS, TopologySimplifier, level_load, level_min_area
+from spatial_index import SPATIAL_INDEX_LOADER, BoxCollector, write_spatial_index
+from spatial_stats import OUTLIER_FIELDS, spatial_outliers, write_outliers
+from stream_render import compact_json
+from svg_render import CANVAS_THRESHOLD, ChoroplethCollector, render_choropleth
+from tidy_tree import load_hierarchy, tidy_tree
+from topojson_convert import OBJECT_NAME, geojson_to_topology, topojson_load, write_topology
+from walkability_data import GEOJSON_FILE, ColumnCollector, FeatureSource, scan_features
+
+# Citation graph the references page draws; the build stores its layout
+FORCE_GRAPH_FILE = 'force_graph_data.json'
+
+# Hierarchy the standards page draws as a tree; the build lays it out
+STRUCTURE_FILE = 'structure_data.json'
+
+# Observation series for the temporal chart, and its downsampled levels
+TEMPORAL_FILE = 'temporal_data.json'
+TEMPORAL_LEVEL_FILE = 'temporal_data.w{width}.json'
+
+# Precomputed aggregates, written next to the GeoJSON for standalone pages
+AGGREGATES_FILE = 'walkability_aggregates.json'
+
+# Numeric properties as Float32 columns, with a JSON header of offsets
+COLUMNS_FILE = 'walkability_columns.bin'
+COLUMNS_HEADER_FILE = 'walkability_columns.json'
+
+# Queen and rook neighbours of each block group, as CSR arrays keyed by GEOID10
+CONTIGUITY_FILE = 'walkability_contiguity.json'
+
+# Global and local Moran's I and distribution outliers, keyed by GEOID10,
+# which the outliers page reads
+OUTLIERS_FILE = 'walkability_outliers.json'
+
+# Slimmed GeoJSON with only the properties the page scripts read
+PRUNED_FILE = 'atlanta_walkability_wgs84.slim.geojson'
+
+# Quantized TopoJSON of the pruned features, which the integrated page loads
+TOPOJSON_FILE = 'atlanta_walkability_wgs84.topo.json'
+
+# Simplified level of detail for maps up to a given width in pixels
+LOD_FILE = 'atlanta_walkability_wgs84.lod{width}.topo.json'
+
+# Property the geographic section's choropleth colours by
+MAP_FIELD = 'NatWalkInd'
+
+# Packed Hilbert R-tree of the features' bounding boxes, for point lookups
+SPATIAL_INDEX_FILE = 'walkability_index.bin'
+
+# What-if scenarios to precompute, if present, and the directory of their
+# Float32 layers, named by scenario hash
+SCENARIOS_FILE = 'walkability_scenarios.json'
+SCENARIOS_DIR = 'walkability_scenarios'
+
+# Files the stages read, which incremental builds track
+DATA_INPUTS = [GEOJSON_FILE, FORCE_GRAPH_FILE, STRUCTURE_FILE, TEMPORAL_FILE, SCENARIOS_FILE]
+
+# Directory of per-county or per-tile GeoJSON files and their manifest
+PARTITIONS_DIR = 'walkability_partitions'
+PARTITIONS_MANIFEST = 'manifest.json'
+
+class WalkabilityDataPrep:
+    def __init__(self, base_dir, precision=5, quantization=100000, lod_widths=LOD_WIDTHS,
+                 geojson_file=GEOJSON_FILE, partition=None, tile_capacity=TILE_CAPACITY, view=None,
+                 chart_widths=CHART_WIDTHS, canvas_threshold=CANVAS_THRESHOLD, analysis=False):
+        self.base_dir = Path(base_dir)
+        # Source features; may be a GeoJSONSeq/NDJSON file for national-scale data
+        self.geojson_path = self.base_dir / geojson_file
+        self.precision = precision
+        self.quantization = quantization
+        self.lod_widths = sorted(lod_widths)
+        # Partition scheme ('county' or 'quadtree') and the [west, south,
+        # east, north] bounds pages load first; None picks a view around
+        # the median block group
+        self.partition = partition
+        self.tile_capacity = tile_capacity
+        self.view = view
+        self.chart_widths = sorted(chart_widths)
+        # Maps with more features than this draw to a canvas
+        self.canvas_threshold = canvas_threshold
+        # Write the contiguity graphs, outliers and centroid tree even when
+        # no page script reads them, for outliers.html and nearest.py
+        self.analysis = analysis
+        self.data_loads = {}
+        # Scripts the page needs ahead of its own, such as data loaders
+        self.loader_scripts = []
+        # Pre-rendered map <svg>, set by run when given the map's scripts
+        self.map_svg = None
+        # Files this run wrote, relative to base_dir
+        self.outputs = []
+
+    def record(self, name):
+        """Record a file this run wrote under base_dir, which incremental builds check still exists."""
+        self.outputs.append(name)
+        return name
+
+    def output(self, name):
+        """Path of a file this run writes, recorded as an output."""
+        return self.base_dir / self.record(name)
+
+    def run(self, scripts=(), map_scripts=()):
+        """Run every data-prep stage and return the JSON blocks to embed, by element id.
+
+        Given the scripts of a map page, the choropleth is pre-rendered from
+        the same pass over the features and kept in self.map_svg.
+        """
+        if any(FORCE_GRAPH_FILE in script.get('content', '') for script in scripts):
+            self.layout_force_graph()
+        blocks = {}
+        if any(STRUCTURE_FILE in script.get('content', '') for script in scripts):
+            layout = self.layout_structure()
+            if layout:
+                blocks['structure-layout'] = layout
+        if any(TEMPORAL_FILE in script.get('content', '') for script in scripts):
+            levels = self.downsample_temporal()
+            if levels:
+                blocks['temporal-levels'] = levels
+
+        if not self.geojson_path.exists():
+            print(f"Warning: Skipping data prep, missing {self.geojson_path.name}")
+            return blocks
+
+        # One streamed pass gathers what every stage needs from the features,
+        # so memory doesn't grow with the file and it is read only once
+        read_by_pages = any(GEOJSON_FILE in script.get('content', '') for script in scripts)
+        analysis = self.analysis or any(OUTLIERS_FILE in script.get('content', '') for script in scripts)
+        column_collector = ColumnCollector()
+        collectors = [column_collector]
+        if analysis:
+            contiguity_builder = ContiguityBuilder()
+            collectors.append(contiguity_builder)
+        if self.analysis:
+            centroids = CentroidCollector()
+            collectors.append(centroids)
+        if read_by_pages:
+            box_collector = BoxCollector()
+            pruned = self.open_pruned(scripts)
+            collectors += [box_collector, pruned]
+        if map_scripts:
+            choropleth = ChoroplethCollector(self.canvas_threshold)
+            collectors.append(choropleth)
+        try:
+            scan_features(FeatureSource(self.geojson_path), collectors)
+        finally:
+            if read_by_pages:
+                pruned.close()
+        columns = column_collector.columns()
+        ids = column_collector.ids
+
+        aggregates = compute_aggregates(columns)
+        # Density curve for the distribution chart, via binned FFT convolution
+        aggregates['kde'] = {'NatWalkInd': binned_kde(columns['NatWalkInd'])}
+        with open(self.output(AGGREGATES_FILE), 'w', encoding='utf-8') as f:
+            f.write(compact_json(aggregates))
+        blocks['walkability-aggregates'] = aggregates
+        blocks['walkability-columns'] = self.write_columns(columns)
+        if map_scripts:
+            map_block = self.render_map(map_scripts, choropleth, columns)
+            if map_block:
+                blocks['walkability-map'] = map_block
+        if analysis:
+            graphs = self.write_contiguity(contiguity_builder)
+            self.write_outliers(columns, ids, graphs['queen'])
+        if self.analysis:
+            self.write_centroid_tree(centroids)
+
+        if read_by_pages:
+            fields = self.report_pruned(pruned, column_collector.available)
+            boxes = box_collector.boxes()
+            blocks['walkability-map-render'] = {'canvasThreshold': self.canvas_threshold}
+            # Later stages read the pruned file, which is smaller than the source
+            if self.partition:
+                blocks['walkability-partitions'] = self.write_partitions(boxes, ids, fields)
+            else:
+                # Index ids are feature positions, which partitioned pages don't keep
+                blocks['walkability-spatial-index'] = self.write_spatial_index(boxes)
+                blocks['walkability-scenarios'] = self.write_scenarios(columns, ids)
+                if self.quantization:
+                    topology = self.write_topology(boxes, fields)
+                    if self.lod_widths:
+                        self.write_levels(topology)
+
+        return blocks
+
+    def layout_force_graph(self):
+        """Settle the citation graph's force layout so the page can draw it without simulating."""
+        graph_path = self.base_dir / FORCE_GRAPH_FILE
+        if not graph_path.exists():
+            print(f"Warning: Skipping force layout, missing {FORCE_GRAPH_FILE}")
+            return
+        if layout_graph_file(graph_path):
+            print(f"Stored force layout in {FORCE_GRAPH_FILE}")
+
+    def render_map(self, scripts, choropleth, columns):
+        """Render the choropleth to self.map_svg and return the properties behind its paths.
+
+        Skipped when there are more features than the canvas threshold, since
+        the page then draws to a canvas. The properties the map's scripts read
+        are kept by column for the walkability-map block, so the page can bind
+        them to the paths.
+        """
+        if choropleth.rings is None:
+            print(f"Not pre-rendering the map: {choropleth.count:,} features is over the canvas threshold "
+                  f"of {self.canvas_threshold:,}")
+            return None
+        extent = field_summary(columns[MAP_FIELD])['extent']
+        self.map_svg = render_choropleth(choropleth.rings, columns[MAP_FIELD], extent)
+        fields = sorted(find_property_accesses(scripts, columns))
+        print(f"Pre-rendered the {MAP_FIELD} map: {choropleth.count:,} paths, "
+              f"{len(self.map_svg):,} bytes of SVG")
+        return {
+            'count': choropleth.count,
+            'extent': extent,
+            'columns': {field: [None if np.isnan(value) else float(value) for value in columns[field]]
+                        for field in fields}
+        }
+
+    def layout_structure(self):
+        """Lay out the standards hierarchy as a tidy tree, normalized to the unit square."""
+        structure_path = self.base_dir / STRUCTURE_FILE
+        if not structure_path.exists():
+            print(f"Warning: Skipping tree layout, missing {STRUCTURE_FILE}")
+            return None
+        hierarchy = load_hierarchy(structure_path)
+        layout = tidy_tree(hierarchy)
+        print(f"Laid out {len(layout['x'])} nodes of {STRUCTURE_FILE}")
+        return {'hierarchy': hierarchy, **layout}
+
+    def downsample_temporal(self):
+        """Write LTTB-downsampled copies of the temporal series, one per chart width."""
+        temporal_path = self.base_dir / TEMPORAL_FILE
+        if not temporal_path.exists():
+            print(f"Warning: Skipping temporal downsampling, missing {TEMPORAL_FILE}")
+            return None
+        with open(temporal_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        full_points = series_points(data)
+        levels = []
+        for width, level in temporal_levels(data, self.chart_widths):
+            level_file = TEMPORAL_LEVEL_FILE.format(width=width)
+            with open(self.output(level_file), 'w', encoding='utf-8') as f:
+                f.write(compact_json(level))
+            levels.append({'maxWidth': width, 'url': level_file})
+            print(f"Temporal level for {width}px: {series_points(level):,} of {full_points:,} points, "
+                  f"{(self.base_dir / level_file).stat().st_size:,} bytes")
+        levels.append({'maxWidth': None, 'url': TEMPORAL_FILE})
+        return levels
+
+    def write_columns(self, columns):
+        """Write the numeric columns for Float32Array views and return their header."""
+        header = write_columns(columns, self.output(COLUMNS_FILE))
+        header['url'] = COLUMNS_FILE
+        with open(self.output(COLUMNS_HEADER_FILE), 'w', encoding='utf-8') as f:
+            f.write(compact_json(header))
+        self.loader_scripts.append({'content': COLUMNS_LOADER})
+        print(f"Wrote {len(header['fields'])} Float32 columns for {header['count']:,} features: "
+              f"{(self.base_dir / COLUMNS_FILE).stat().st_size:,} bytes")
+        return header
+
+    def write_contiguity(self, builder):
+        """Write the block groups' contiguity graphs for neighbour-based statistics and return them."""
+        ids, graphs = builder.graphs()
+        write_contiguity(ids, graphs, self.output(CONTIGUITY_FILE))
+        queen_links = len(graphs['queen'][1]) // 2
+        rook_links = len(graphs['rook'][1]) // 2
+        print(f"Wrote contiguity of {len(ids):,} features: {queen_links:,} queen and "
+              f"{rook_links:,} rook links")
+        return graphs
+
+    def write_outliers(self, columns, ids, graph):
+        """Write spatial clusters and outliers of the block groups over their queen contiguity."""
+        indptr, indices = graph
+        fields = [field for field in OUTLIER_FIELDS if field in columns]
+        results = spatial_outliers(columns, ids, indptr, indices, fields)
+        write_outliers(results, self.output(OUTLIERS_FILE))
+        for field, stats in results['global'].items():
+            if stats:
+                print(f"Moran's I of {field}: {stats['I']:.3f} (pseudo p {stats['p']:.3f})")
+        print(f"Wrote {len(results['blockGroups']):,} flagged block groups to {OUTLIERS_FILE}")
+
+    def write_centroid_tree(self, centroids):
+        """Write the KD-tree of block-group centroids that nearest.py queries."""
+        tree = centroids.tree()
+        tree.save(self.output(CENTROID_TREE_FILE))
+        print(f"Wrote a KD-tree of {len(tree.ids):,} centroids to {CENTROID_TREE_FILE}")
+
+    def open_pruned(self, scripts):
+        """Open a GeoJSON of only the properties the scripts read, filled in as the features are scanned.
+
+        The properties aren't known before the scan, so every property the
+        scripts might read is kept; features simply lack those they don't have.
+        """
+        fields = sorted(find_property_accesses(scripts) | {ID_FIELD})
+        self.data_loads[GEOJSON_FILE] = f'd3.json("{PRUNED_FILE}")'
+        return PrunedWriter(self.output(PRUNED_FILE), fields, self.precision)
+
+    def report_pruned(self, pruned, available):
+        """Report the pruned file's savings and return the properties it kept."""
+        fields = [field for field in pruned.fields if field in available]
+        original_size = self.geojson_path.stat().st_size
+        pruned_size = (self.base_dir / PRUNED_FILE).stat().st_size
+        print(f"Pruned {self.geojson_path.name} to {fields} at {self.precision} decimals: "
+              f"{original_size:,} -> {pruned_size:,} bytes "
+              f"({1 - pruned_size / original_size:.0%} saved)")
+        return fields
+
+    def write_topology(self, boxes, fields):
+        """Write the pruned features as TopoJSON and load that instead of the GeoJSON."""
+        # Bounds of the pruned coordinates, rounded as prune_feature rounds them
+        bbox = [round(float(value), self.precision)
+                for value in (*np.nanmin(boxes[:, :2], axis=0), *np.nanmax(boxes[:, 2:], axis=0))]
+        topology = geojson_to_topology(FeatureSource(self.base_dir / PRUNED_FILE), fields,
+                                       self.quantization, bbox=bbox)
+        topology_path = self.output(TOPOJSON_FILE)
+        write_topology(topology, topology_path)
+        self.data_loads[GEOJSON_FILE] = topojson_load(TOPOJSON_FILE)
+
+        pruned_size = (self.base_dir / PRUNED_FILE).stat().st_size
+        topology_size = topology_path.stat().st_size
+        print(f"Converted to TopoJSON with {len(topology['arcs']):,} arcs at "
+              f"{self.quantization:,} quantization: {pruned_size:,} -> {topology_size:,} bytes "
+              f"({1 - topology_size / pruned_size:.0%} saved)")
+        return topology
+
+    def write_levels(self, topology):
+        """Write simplified copies of the topology and load the one that suits the viewport."""
+        simplifier = TopologySimplifier(topology, OBJECT_NAME)
+        full_points = simplifier.point_count()
+        levels = []
+        simplified = simplifier.levels([level_min_area(self.quantization, width) for width in self.lod_widths])
+        for width, level in zip(self.lod_widths, simplified):
+            level_file = LOD_FILE.format(width=width)
+            write_topology(level, self.output(level_file))
+            levels.append((width, level_file))
+            points = simplifier.point_count(level['arcs'])
+            print(f"Level of detail for {width}px: {points:,} of {full_points:,} points "
+                  f"({points / full_points:.0%}), "
+                  f"{(self.base_dir / level_file).stat().st_size:,} bytes")
+        levels.append((None, TOPOJSON_FILE))
+        self.data_loads[GEOJSON_FILE] = level_load(levels, OBJECT_NAME)
+
+    def write_spatial_index(self, boxes):
+        """Write the R-tree pages use to find the feature under a point."""
+        count = write_spatial_index(boxes, self.output(SPATIAL_INDEX_FILE))
+        self.loader_scripts.append({'content': SPATIAL_INDEX_LOADER})
+        print(f"Wrote a spatial index of {count:,} features: "
+              f"{(self.base_dir / SPATIAL_INDEX_FILE).stat().st_size:,} bytes")
+        return {'url': SPATIAL_INDEX_FILE, 'count': count}
+
+    def write_scenarios(self, columns, ids):
+        """Write a NatWalkInd layer per what-if scenario, reusing layers already built."""
+        scenarios_path = self.base_dir / SCENARIOS_FILE
+        scenarios = load_scenarios(scenarios_path) if scenarios_path.exists() else DEFAULT_SCENARIOS
+        error = baseline_error(columns)
+        if error > BASELINE_TOLERANCE:
+            print(f"Warning: NatWalkInd differs from the EPA weighting of its ranks by up to "
+                  f"{error:.2f}; scenario layers shift the published values by the weighted change")
+        cache = ScenarioCache(self.base_dir / SCENARIOS_DIR, columns, ids)
+        layers = []
+        for scenario, (key, values) in zip(scenarios, cache.results(scenarios)):
+            layers.append({
+                'name': scenario['name'],
+                'url': self.record(f"{SCENARIOS_DIR}/{cache.path(key).name}"),
+                'mean': round(float(np.nanmean(values)), 4) if not np.isnan(values).all() else None
+            })
+        print(f"Wrote {len(layers)} scenario layers to {SCENARIOS_DIR}/")
+        return {'count': len(ids), 'layers': layers}
+
+    def write_partitions(self, boxes, ids, fields):
+        """Split the features into partitions that pages load for the current view only."""
+        directory = self.base_dir / PARTITIONS_DIR
+        manifest = write_partitions(FeatureSource(self.base_dir / PRUNED_FILE), boxes, ids, directory,
+                                    fields, self.precision, self.partition, self.tile_capacity, self.view)
+        with open(self.output(f"{PARTITIONS_DIR}/{PARTITIONS_MANIFEST}"), 'w', encoding='utf-8') as f:
+            f.write(compact_json(manifest))
+        for partition in manifest['partitions']:
+            self.record(partition['url'])
+        self.loader_scripts.append({'content': PARTITIONS_LOADER})
+        self.data_loads[GEOJSON_FILE] = 'loadWalkabilityPartitions()'
+
+        partitions = manifest['partitions']
+        print(f"Partitioned by {self.partition} into {len(partitions):,} files, "
+              f"largest {max(partition['count'] for partition in partitions):,} features")
+        if self.quantization:
+            print("Partitioned maps load GeoJSON, so no TopoJSON or LOD levels were written")
+        return manifest
+
+    def rewrite_scripts(self, scripts):
+        """Point the scripts' data loads at the files this run produced."""
+        return rewrite_data_loads(scripts, self.data_loads)
+
+def prepare_page_data(base_dir, scripts):
+    """Run every data-prep stage with the default options for integrators without their own.
+
+    Returns (blocks, scripts, outputs): the JSON blocks to write ahead of the
+    page scripts, the scripts after the loaders they need with their data
+    loads pointed at the prepared files, and the files the stages wrote.
+    """
+    data_prep = WalkabilityDataPrep(base_dir)
+    blocks = data_prep.run(scripts)
+    return blocks, data_prep.loader_scripts + data_prep.rewrite_scripts(scripts), data_prep.outputs
@@ -0,0 +1,114 @@
+import argparse
+import json
+import time
+import numpy as np
+
+# Plot widths in device pixels that each downsampled level is built for;
+# the full series covers anything wider
+CHART_WIDTHS = [480, 960, 1920]
+
+# Points kept per pixel of plot width; one per pixel column already draws
+# the same line as the full series
+POINTS_PER_PIXEL = 1
+
+def lttb_indices(x, y, threshold):
+    """Indices of the points Largest-Triangle-Three-Buckets keeps.
+
+    The first and last points are always kept. The rest are split into
+    threshold - 2 equal buckets, and from each bucket the point forming the
+    largest triangle with the previously kept point and the mean of the next
+    bucket is kept, which preserves peaks and troughs that averaging would
+    flatten. Returns every index when the series already fits.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    # Bucket edges over the interior points, plus the last point as a final bucket
+    edges = (np.arange(threshold - 1) * ((n - 2) / (threshold - 2))).astype(np.int64) + 1
+    edges[-1] = n - 1
+    edges = np.append(edges, n)
+    sizes = np.diff(edges)
+    means_x = np.add.reduceat(x, edges[:-1]) / sizes
+    means_y = np.add.reduceat(y, edges[:-1]) / sizes
+
+    kept = np.empty(threshold, dtype=np.int64)
+    kept[0] = 0
+    a = 0
+    for bucket in range(threshold - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        cx, cy = means_x[bucket + 1], means_y[bucket + 1]
+        bx, by = x[start:stop], y[start:stop]
+        # Twice the triangle area; the factor doesn't change the argmax
+        areas = np.abs((x[a] - cx) * (by - y[a]) - (x[a] - bx) * (cy - y[a]))
+        a = start + int(np.argmax(areas))
+        kept[bucket + 1] = a
+    kept[-1] = n - 1
+    return kept
+
+def downsample_series(series, threshold):
+    """Copy of a {name, x, y} series with at most threshold points, by LTTB.
+
+    Points with a missing y value are dropped first, since LTTB needs a
+    value to weigh every point.
+    """
+    x = np.asarray(series['x'], dtype=float)
+    y = np.asarray([np.nan if value is None else value for value in series['y']], dtype=float)
+    valid = np.isfinite(x) & np.isfinite(y)
+    x, y = x[valid], y[valid]
+    kept = lttb_indices(x, y, threshold)
+    return dict(series, x=x[kept].tolist(), y=y[kept].tolist())
+
+def series_points(data):
+    return sum(len(series['x']) for series in data['series'])
+
+def temporal_levels(data, widths=CHART_WIDTHS, points_per_pixel=POINTS_PER_PIXEL):
+    """Downsample every series for each plot width, coarsest first.
+
+    data is a {series: [{name, x, y}], events: [...]} document; events are
+    copied unchanged. Returns a list of (width, data) and stops at the first
+    width every series already fits, since the full data serves it as well.
+    """
+    longest = max((len(series['x']) for series in data['series']), default=0)
+    levels = []
+    for width in sorted(widths):
+        threshold = int(width * points_per_pixel)
+        if threshold >= longest:
+            break
+        levels.append((width, dict(data, series=[downsample_series(series, threshold)
+                                                 for series in data['series']])))
+    return levels
+
+def random_walk(n, seed=0):
+    """Daily-looking series with noise, spikes and a trend, for timing."""
+    rng = np.random.default_rng(seed)
+    y = np.cumsum(rng.normal(0, 0.05, n)) + np.linspace(8, 9.5, n)
+    spikes = rng.choice(n, size=max(1, n // 1000), replace=False)
+    y[spikes] += rng.normal(0, 1.5, len(spikes))
+    return {'name': 'NatWalkInd', 'x': np.linspace(2012, 2022, n).tolist(), 'y': y.tolist()}
+
+def main():
+    parser = argparse.ArgumentParser(description='Time LTTB downsampling of a long series.')
+    parser.add_argument('--points', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    data = {'series': [random_walk(args.points)], 'events': []}
+    full_size = len(json.dumps(data, separators=(',', ':')))
+    start = time.perf_counter()
+    levels = temporal_levels(data)
+    elapsed = time.perf_counter() - start
+    print(f"{args.points:,} points, {full_size:,} bytes: {len(levels)} levels in {elapsed * 1000:.0f} ms")
+
+    y = np.asarray(data['series'][0]['y'])
+    for width, level in levels:
+        series = level['series'][0]
+        size = len(json.dumps(level, separators=(',', ':')))
+        # Share of the full y range the kept points still span
+        kept = np.asarray(series['y'])
+        print(f"  {width}px: {len(series['x']):,} points, {size:,} bytes, "
+              f"range kept {(kept.max() - kept.min()) / (y.max() - y.min()):.1%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+import argparse
+import json
+import math
+import time
+import numpy as np
+
+# d3-force defaults, so a precomputed layout matches what the page would settle on
+ALPHA_MIN = 0.001
+ALPHA_DECAY = 1 - ALPHA_MIN ** (1 / 300)
+VELOCITY_DECAY = 0.4
+LINK_DISTANCE = 30
+THETA = 0.9
+DISTANCE_MIN2 = 1
+INITIAL_RADIUS = 10
+INITIAL_ANGLE = math.pi * (3 - math.sqrt(5))
+
+# Deepest Barnes-Hut quadtree level; cells below it are summed pair by pair
+MAX_DEPTH = 10
+
+def phyllotaxis(n):
+    """Initial positions d3.forceSimulation gives nodes without coordinates."""
+    i = np.arange(n)
+    radius = INITIAL_RADIUS * np.sqrt(0.5 + i)
+    angle = i * INITIAL_ANGLE
+    return np.column_stack([radius * np.cos(angle), radius * np.sin(angle)])
+
+class QuadTree:
+    """Fixed-depth quadtree over node positions with per-cell charge and centroid.
+
+    Cells at level L are keyed by (ix >> (depth - L), iy >> (depth - L)) of
+    each node's deepest cell, so every level is built with a sort and a few
+    bincounts instead of node-by-node insertion.
+    """
+
+    def __init__(self, positions, strengths, depth):
+        lo = positions.min(axis=0)
+        self.size = max(float((positions.max(axis=0) - lo).max()), 1e-6) * (1 + 1e-9)
+        self.depth = depth
+        self.origin = lo
+        cells = np.minimum(((positions - lo) / self.size * (1 << depth)).astype(np.int64),
+                           (1 << depth) - 1)
+        weights = np.abs(strengths)
+        self.levels = []
+        for level in range(depth + 1):
+            shift = depth - level
+            keys = (cells[:, 0] >> shift) << 32 | (cells[:, 1] >> shift)
+            ids, inverse = np.unique(keys, return_inverse=True)
+            weight = np.bincount(inverse, weights=weights, minlength=len(ids))
+            safe = np.where(weight > 0, weight, 1)
+            centroid = np.column_stack([
+                np.bincount(inverse, weights=weights * positions[:, 0], minlength=len(ids)) / safe,
+                np.bincount(inverse, weights=weights * positions[:, 1], minlength=len(ids)) / safe])
+            value = np.bincount(inverse, weights=strengths, minlength=len(ids))
+            self.levels.append((ids, centroid, value))
+        # Members of each deepest cell, for the exact pairwise sums
+        self.leaf_order = np.argsort(inverse, kind='stable')
+        self.leaf_starts = np.searchsorted(inverse[self.leaf_order], np.arange(len(ids) + 1))
+
+    def lookup(self, level, keys):
+        """Index of each cell key at a level, or -1 where the cell is empty."""
+        ids = self.levels[level][0]
+        index = np.minimum(np.searchsorted(ids, keys), len(ids) - 1)
+        return np.where(ids[index] == keys, index, -1)
+
+def many_body(positions, strengths, alpha, theta=THETA, depth=None, rng=None):
+    """Barnes-Hut approximation of d3.forceManyBody's velocity change.
+
+    All nodes walk the tree together: each (node, cell) pair either takes
+    the cell's aggregate charge when the cell is far enough away
+    (width^2 / theta^2 < distance^2) or splits into the cell's children,
+    and at the deepest level the remaining cells are summed exactly.
+    """
+    n = len(positions)
+    if depth is None:
+        depth = min(MAX_DEPTH, max(1, int(math.ceil(math.log(max(n, 2), 4)))))
+    rng = rng or np.random.default_rng(0)
+    tree = QuadTree(positions, strengths, depth)
+    velocity = np.zeros_like(positions)
+    theta2 = theta * theta
+
+    def add(nodes, dx, dy, charge):
+        l = dx * dx + dy * dy
+        # Coincident points get a small random nudge, as in d3's jiggle
+        zero_x, zero_y = dx == 0, dy == 0
+        if zero_x.any() or zero_y.any():
+            dx = np.where(zero_x, (rng.random(len(dx)) - 0.5) * 1e-6, dx)
+            dy = np.where(zero_y, (rng.random(len(dy)) - 0.5) * 1e-6, dy)
+            l = dx * dx + dy * dy
+        l = np.where(l < DISTANCE_MIN2, np.sqrt(DISTANCE_MIN2 * l), l)
+        scale = charge * alpha / l
+        velocity[:, 0] += np.bincount(nodes, weights=dx * scale, minlength=n)
+        velocity[:, 1] += np.bincount(nodes, weights=dy * scale, minlength=n)
+
+    nodes = np.arange(n)
+    cells = np.zeros(n, dtype=np.int64)
+    for level in range(depth + 1):
+        _, centroid, value = tree.levels[level]
+        width = tree.size / (1 << level)
+        dx = centroid[cells, 0] - positions[nodes, 0]
+        dy = centroid[cells, 1] - positions[nodes, 1]
+        # theta 0 never approximates, giving the exact O(n^2) sum
+        far = width * width < theta2 * (dx * dx + dy * dy)
+        if far.any():
+            add(nodes[far], dx[far], dy[far], value[cells[far]])
+        nodes, cells = nodes[~far], cells[~far]
+        if not len(nodes):
+            return velocity
+
+        if level < depth:
+            # Split the near cells into their non-empty children
+            keys = tree.levels[level][0][cells]
+            kx, ky = keys >> 32, keys & 0xffffffff
+            child_nodes, child_cells = [], []
+            for bx in (0, 1):
+                for by in (0, 1):
+                    child = tree.lookup(level + 1, (kx * 2 + bx) << 32 | (ky * 2 + by))
+                    present = child >= 0
+                    child_nodes.append(nodes[present])
+                    child_cells.append(child[present])
+            nodes, cells = np.concatenate(child_nodes), np.concatenate(child_cells)
+
+    # Near leaves: exact sum over their members, skipping the node itself
+    counts = tree.leaf_starts[cells + 1] - tree.leaf_starts[cells]
+    pair_nodes = np.repeat(nodes, counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    others = tree.leaf_order[np.repeat(tree.leaf_starts[cells], counts) + offsets]
+    keep = others != pair_nodes
+    pair_nodes, others = pair_nodes[keep], others[keep]
+    add(pair_nodes, positions[others, 0] - positions[pair_nodes, 0],
+        positions[others, 1] - positions[pair_nodes, 1], strengths[others])
+    return velocity
+
+def force_layout(nodes, links, charge=-30, distance=LINK_DISTANCE, theta=THETA, seed=0):
+    """Run d3-force's link, many-body and center forces to convergence.
+
+    nodes is a list of dicts with an 'id'; links reference them by id in
+    'source' and 'target'. Returns an (n, 2) array of positions centered on
+    the origin, the way forceCenter(0, 0) would leave them.
+    """
+    n = len(nodes)
+    index = {node['id']: i for i, node in enumerate(nodes)}
+    source = np.array([index[link['source']] for link in links], dtype=np.int64)
+    target = np.array([index[link['target']] for link in links], dtype=np.int64)
+    degree = np.bincount(np.concatenate([source, target]), minlength=n)
+    link_strength = 1 / np.minimum(degree[source], degree[target]) if len(links) else np.array([])
+    bias = degree[source] / (degree[source] + degree[target]) if len(links) else np.array([])
+    strengths = np.full(n, float(charge))
+    rng = np.random.default_rng(seed)
+
+    positions = phyllotaxis(n)
+    velocity = np.zeros_like(positions)
+    alpha = 1.0
+    while alpha >= ALPHA_MIN:
+        alpha += (0 - alpha) * ALPHA_DECAY
+
+        if len(links):
+            dx = positions[target] + velocity[target] - positions[source] - velocity[source]
+            length = np.sqrt((dx * dx).sum(axis=1))
+            length = np.where(length == 0, 1e-6, length)
+            pull = ((length - distance) / length * alpha * link_strength)[:, None] * dx
+            for axis in (0, 1):
+                velocity[:, axis] -= np.bincount(target, weights=pull[:, axis] * bias, minlength=n)
+                velocity[:, axis] += np.bincount(source, weights=pull[:, axis] * (1 - bias), minlength=n)
+
+        if n > 1:
+            velocity += many_body(positions, strengths, alpha, theta, rng=rng)
+
+        velocity *= 1 - VELOCITY_DECAY
+        positions += velocity
+        positions -= positions.mean(axis=0)
+    return positions
+
+def layout_graph_file(graph_path, charge=-30):
+    """Store converged x/y on each node of a {nodes, links} JSON file.
+
+    Only rewrites the file when the coordinates change, so a build is a no-op
+    when the graph hasn't changed. Returns True when the file was written.
+    """
+    with open(graph_path, 'r', encoding='utf-8') as f:
+        graph = json.load(f)
+    positions = force_layout(graph['nodes'], graph['links'], charge=graph.get('charge', charge))
+    laid_out = [dict(node, x=round(float(x), 1), y=round(float(y), 1))
+                for node, (x, y) in zip(graph['nodes'], positions)]
+    if laid_out == graph['nodes']:
+        return False
+    graph['nodes'] = laid_out
+    with open(graph_path, 'w', encoding='utf-8') as f:
+        json.dump(graph, f, indent=2)
+        f.write('\n')
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description='Time the Barnes-Hut layout on a random graph.')
+    parser.add_argument('--nodes', type=int, default=5000)
+    parser.add_argument('--theta', type=float, default=THETA)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    nodes = [{'id': i} for i in range(args.nodes)]
+    links = [{'source': i, 'target': int(rng.integers(0, i))} for i in range(1, args.nodes)]
+
+    start = time.perf_counter()
+    positions = force_layout(nodes, links, theta=args.theta)
+    elapsed = time.perf_counter() - start
+
+    # Compare one tick's many-body force with the exact O(n^2) sum
+    sample = positions[:min(args.nodes, 2000)]
+    strengths = np.full(len(sample), -30.0)
+    approx = many_body(sample, strengths, 1.0, args.theta)
+    exact = many_body(sample, strengths, 1.0, 0.0)
+    error = np.abs(approx - exact).max() / np.abs(exact).max()
+    print(f"{args.nodes} nodes, {len(links)} links: layout in {elapsed:.1f} s")
+    print(f"  many-body error at theta {args.theta}: {error:.2%} of the largest force")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import json
+import re
+
+# Property kept in every pruned file so features can still be joined
+ID_FIELD = 'GEOID10'
+
+PROPERTY_ACCESS = re.compile(r'properties\s*\.\s*([A-Za-z_$][\w$]*)'
+                             r'|properties\s*\[\s*(["\'])([^"\']+)\2\s*\]')
+DYNAMIC_ACCESS = re.compile(r'properties\s*\[\s*[^"\'\s]')
+STRING_LITERAL = re.compile(r'(["\'])([A-Za-z_][\w]*)\1')
+
+def find_property_accesses(scripts, available_fields=None):
+    """Return the GeoJSON properties the scripts read.
+
+    Static accesses (properties.X, properties["X"]) are taken as they are.
+    A script that indexes properties with a variable, such as
+    properties[field.key], also keeps every quoted string in it that names
+    an available property. Without available_fields nothing is filtered,
+    for pruning before the properties are known; prune_feature skips the
+    names a feature doesn't have.
+    """
+    fields = set()
+    for script in scripts:
+        js = script.get('content', '')
+        for match in PROPERTY_ACCESS.finditer(js):
+            fields.add(match.group(1) or match.group(3))
+        if DYNAMIC_ACCESS.search(js):
+            fields.update(literal for _, literal in STRING_LITERAL.findall(js)
+                          if available_fields is None or literal in available_fields)
+    return fields if available_fields is None else fields & set(available_fields)
+
+def round_coordinates(coordinates, precision):
+    """Round nested GeoJSON coordinate arrays to a number of decimals."""
+    if coordinates and isinstance(coordinates[0], (int, float)):
+        return [round(value, precision) for value in coordinates]
+    return [round_coordinates(part, precision) for part in coordinates]
+
+def prune_feature(feature, fields, precision):
+    """Return a copy of a feature with only the given properties and rounded coordinates."""
+    properties = feature.get('properties') or {}
+    geometry = feature.get('geometry')
+    if geometry and 'coordinates' in geometry:
+        geometry = dict(geometry, coordinates=round_coordinates(geometry['coordinates'], precision))
+    return {
+        'type': 'Feature',
+        'properties': {field: properties[field] for field in fields if field in properties},
+        'geometry': geometry
+    }
+
+class PrunedWriter:
+    """Write a slimmed FeatureCollection as features are added."""
+
+    def __init__(self, output_path, fields, precision):
+        self.fields = fields
+        self.precision = precision
+        self.count = 0
+        self.file = open(output_path, 'w', encoding='utf-8')
+        self.file.write('{"type":"FeatureCollection","features":[')
+
+    def add(self, feature):
+        if self.count:
+            self.file.write(',')
+        json.dump(prune_feature(feature, self.fields, self.precision), self.file, separators=(',', ':'))
+        self.count += 1
+
+    def close(self):
+        self.file.write(']}')
+        self.file.close()
+
+def write_pruned_geojson(features, output_path, fields, precision):
+    """Write a slimmed FeatureCollection, one feature at a time."""
+    writer = PrunedWriter(output_path, fields, precision)
+    try:
+        for feature in features:
+            writer.add(feature)
+    finally:
+        writer.close()
+
+def rewrite_data_loads(scripts, loads):
+    """Replace d3.json("url") calls in inline scripts with other JS load expressions.
+
+    loads maps a URL to an expression that resolves to the same data, such
+    as d3.json on a pruned file or a TopoJSON decode.
+    """
+    if not loads:
+        return list(scripts)
+    pattern = re.compile(r'd3\.json\(\s*(["\'])(%s)\1\s*\)' %
+                         '|'.join(re.escape(url) for url in loads))
+    rewritten = []
+    for script in scripts:
+        if 'content' in script:
+            content = pattern.sub(lambda m: loads[m.group(2)], script['content'])
+            script = dict(script, content=content)
+        rewritten.append(script)
+    return rewritten
@@ -0,0 +1,206 @@
+import importlib.util
+from bs4 import BeautifulSoup
+from bs4.builder import HTMLTreeBuilder
+from bs4.formatter import HTMLFormatter
+
+# Parser backends, fastest first
+BACKENDS = ['selectolax', 'lxml', 'html.parser']
+
+# Modules that must be importable for the optional backends
+BACKEND_MODULES = {
+    'selectolax': 'selectolax.lexbor',
+    'lxml': 'lxml'
+}
+
+# How BeautifulSoup writes markup, which LexborPage follows so every
+# backend extracts the same fragments
+SOUP_FORMATTER = HTMLFormatter.REGISTRY['minimal']
+SOUP_VOID_ELEMENTS = HTMLTreeBuilder.DEFAULT_EMPTY_ELEMENT_TAGS
+SOUP_LIST_ATTRIBUTES = HTMLTreeBuilder.DEFAULT_CDATA_LIST_ATTRIBUTES
+SOUP_PRESERVE_WHITESPACE = HTMLTreeBuilder.DEFAULT_PRESERVE_WHITESPACE_TAGS
+
+# Whitespace BeautifulSoup collapses when a string holds nothing else
+ASCII_SPACES = ' \n\t\x0c\r'
+
+def available_backends():
+    """Return the installed parser backends, fastest first."""
+    available = []
+    for backend, module in BACKEND_MODULES.items():
+        try:
+            if importlib.util.find_spec(module) is not None:
+                available.append(backend)
+        except ImportError:
+            pass
+    # html.parser ships with Python and is always available
+    return available + ['html.parser']
+
+def resolve_backend(backend=None):
+    """Return the backend to use, picking the fastest installed one by default."""
+    if backend in (None, 'auto'):
+        return available_backends()[0]
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown parser backend {backend!r}, expected one of {BACKENDS}")
+    if backend not in available_backends():
+        raise ValueError(f"Parser backend {backend!r} is not installed")
+    return backend
+
+def parse_page(markup, backend=None):
+    """Parse an HTML page with the given backend."""
+    backend = resolve_backend(backend)
+    if backend == 'selectolax':
+        return LexborPage(markup)
+    return SoupPage(markup, backend)
+
+class SoupPage:
+    """Page parsed by BeautifulSoup with html.parser or lxml."""
+
+    def __init__(self, markup, features):
+        self.soup = BeautifulSoup(markup, features)
+
+    def title(self):
+        return self.soup.title.string if self.soup.title else ""
+
+    def remove_classes(self, class_names, tag=None, within_body=False):
+        """Remove elements carrying any of class_names, optionally by tag."""
+        root = self.soup.find('body') if within_body else self.soup
+        if root is None:
+            return
+        for element in root.find_all(tag, class_=class_names):
+            element.decompose()
+
+    def has_class(self, class_name):
+        return self.soup.find(class_=class_name) is not None
+
+    def styles(self):
+        """Return the text of every non-empty <style> element."""
+        return [style.string for style in self.soup.find_all('style') if style.string]
+
+    def scripts(self):
+        """Return external scripts as {'src'} and inline ones as {'content'}."""
+        scripts = []
+        for script in self.soup.find_all('script'):
+            if script.get('src'):
+                scripts.append({'src': script['src']})
+            elif script.string:
+                scripts.append({'content': script.string})
+        return scripts
+
+    def body(self, strip_scripts=False):
+        """Return the serialized <body> element, or None if there is none."""
+        body = self.soup.find('body')
+        if not body:
+            return None
+        if strip_scripts:
+            for script in body.find_all('script'):
+                script.decompose()
+        return str(body)
+
+    def class_elements(self, tags):
+        """Describe elements of the given tags in <body> that carry a class."""
+        body = self.soup.find('body')
+        if not body:
+            return []
+        return [{'class': element.get('class'), 'id': element.get('id'), 'type': element.name}
+                for element in body.find_all(tags, class_=True)]
+
+def soup_markup(node, preserve_whitespace=False):
+    """Serialize a lexbor node the way BeautifulSoup serializes the same element.
+
+    Attribute names are lowercased and sorted, list attributes such as
+    class are re-joined with single spaces, void elements end in '/>' and
+    a string of only whitespace outside <pre> and <textarea> becomes one
+    newline or space. The trees match for well-formed markup, except that
+    lexbor drops a newline right after <pre> as HTML5 says; where it
+    repairs invalid markup, such as a <p> around a <pre>, the output can
+    still differ.
+    """
+    tag = node.tag
+    if node.is_text_node:
+        text = node.text_content
+        if not preserve_whitespace and not text.strip(ASCII_SPACES):
+            return '\n' if '\n' in text else ' '
+        if node.parent is not None and node.parent.tag in SOUP_FORMATTER.cdata_containing_tags:
+            return text
+        return SOUP_FORMATTER.substitute(text)
+    if node.is_comment_node:
+        return node.html
+
+    list_attributes = SOUP_LIST_ATTRIBUTES.get('*', set()) | SOUP_LIST_ATTRIBUTES.get(tag, set())
+    attributes = []
+    for name, value in sorted((name.lower(), value or '') for name, value in node.attributes.items()):
+        if name in list_attributes:
+            value = ' '.join(value.split())
+        value = SOUP_FORMATTER.quoted_attribute_value(SOUP_FORMATTER.attribute_value(value))
+        attributes.append(f' {name}={value}')
+    opening = f"<{tag}{''.join(attributes)}"
+    if node.child is None and tag in SOUP_VOID_ELEMENTS:
+        return opening + SOUP_FORMATTER.void_element_close_prefix + '>'
+    preserve_whitespace = preserve_whitespace or tag in SOUP_PRESERVE_WHITESPACE
+    parts = [opening, '>']
+    child = node.child
+    while child is not None:
+        parts.append(soup_markup(child, preserve_whitespace))
+        child = child.next
+    parts.append(f'</{tag}>')
+    return ''.join(parts)
+
+class LexborPage:
+    """Page parsed by selectolax's lexbor engine, the fast path."""
+
+    def __init__(self, markup):
+        from selectolax.lexbor import LexborHTMLParser
+        self.tree = LexborHTMLParser(markup)
+
+    def title(self):
+        title = self.tree.css_first('title')
+        return title.text() if title else ""
+
+    def remove_classes(self, class_names, tag=None, within_body=False):
+        """Remove elements carrying any of class_names, optionally by tag."""
+        root = self.tree.body if within_body else self.tree
+        if root is None:
+            return
+        if isinstance(class_names, str):
+            class_names = [class_names]
+        selector = ', '.join(f'{tag or ""}.{name}' for name in class_names)
+        for element in root.css(selector):
+            element.decompose()
+
+    def has_class(self, class_name):
+        return self.tree.css_first(f'.{class_name}') is not None
+
+    def styles(self):
+        """Return the text of every non-empty <style> element."""
+        return [style.text() for style in self.tree.css('style') if style.text()]
+
+    def scripts(self):
+        """Return external scripts as {'src'} and inline ones as {'content'}."""
+        scripts = []
+        for script in self.tree.css('script'):
+            src = script.attributes.get('src')
+            if src:
+                scripts.append({'src': src})
+            elif script.text():
+                scripts.append({'content': script.text()})
+        return scripts
+
+    def body(self, strip_scripts=False):
+        """Return the serialized <body> element, or None if there is none."""
+        body = self.tree.body
+        if body is None:
+            return None
+        if strip_scripts:
+            for script in body.css('script'):
+                script.decompose()
+        return soup_markup(body)
+
+    def class_elements(self, tags):
+        """Describe elements of the given tags in <body> that carry a class."""
+        body = self.tree.body
+        if body is None:
+            return []
+        selector = ', '.join(f'{tag}[class]' for tag in tags)
+        return [{'class': element.attributes['class'].split(),
+                 'id': element.attributes.get('id'),
+                 'type': element.tag}
+                for element in body.css(selector)]
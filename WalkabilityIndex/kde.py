@@ -0,0 +1,124 @@
+import argparse
+import sys
+import time
+from pathlib import Path
+import numpy as np
+from walkability_data import GEOJSON_FILE, FeatureSource, property_columns
+
+# Points in the density curve embedded for the distribution chart
+CURVE_POINTS = 128
+
+# Bins used for the FFT convolution
+GRID_SIZE = 2048
+
+# Largest gap between the binned curve and the exact sum of kernels that
+# is accepted, as a share of the peak density
+KDE_TOLERANCE = 0.01
+
+# Ratio of Epanechnikov to Gaussian canonical bandwidths, so a Gaussian
+# rule-of-thumb bandwidth can size the Epanechnikov kernel the page uses
+EPANECHNIKOV_SCALE = 2.214
+
+def epanechnikov(u):
+    """Epanechnikov kernel with support [-1, 1], as kernelEpanechnikov in the page."""
+    return np.where(np.abs(u) <= 1, 0.75 * (1 - u * u), 0.0)
+
+def silverman_bandwidth(values):
+    """Half-width of the Epanechnikov kernel from Silverman's rule of thumb."""
+    n = len(values)
+    q1, q3 = np.percentile(values, [25, 75])
+    spread = min(values.std(ddof=1), (q3 - q1) / 1.34) if n > 1 else 0.0
+    if spread <= 0:
+        spread = values.std(ddof=1) if n > 1 else 0.0
+    if spread <= 0:
+        spread = 1.0
+    return EPANECHNIKOV_SCALE * 0.9 * spread * n ** -0.2
+
+def linear_binning(values, lo, hi, size):
+    """Spread each value over its two nearest grid points, weighted by distance."""
+    delta = (hi - lo) / (size - 1)
+    position = (values - lo) / delta
+    left = np.clip(np.floor(position).astype(np.int64), 0, size - 2)
+    weight = position - left
+    counts = np.bincount(left, weights=1 - weight, minlength=size)
+    counts += np.bincount(left + 1, weights=weight, minlength=size)
+    return counts, delta
+
+def binned_kde(values, bandwidth=None, points=CURVE_POINTS, grid_size=GRID_SIZE):
+    """Kernel density estimate by linear binning and FFT convolution.
+
+    Costs O(n + G log G) for n values on a G-point grid instead of the
+    O(n * points) of evaluating every kernel at every output point. Returns
+    a fixed-size curve over the data extent.
+    """
+    values = np.asarray(values, dtype=float)
+    values = values[~np.isnan(values)]
+    if not len(values):
+        return None
+    if bandwidth is None:
+        bandwidth = silverman_bandwidth(values)
+
+    lo, hi = values.min(), values.max()
+    # Pad by the kernel support so mass near the edges isn't wrapped around
+    grid_lo, grid_hi = lo - bandwidth, hi + bandwidth
+    counts, delta = linear_binning(values, grid_lo, grid_hi, grid_size)
+
+    # Kernel sampled at grid offsets, truncated to its support
+    half = min(int(np.ceil(bandwidth / delta)), grid_size - 1)
+    offsets = np.arange(-half, half + 1) * delta
+    weights = epanechnikov(offsets / bandwidth) / bandwidth
+
+    size = 1 << int(np.ceil(np.log2(grid_size + len(weights))))
+    convolved = np.fft.irfft(np.fft.rfft(counts, size) * np.fft.rfft(weights, size), size)
+    density = convolved[half:half + grid_size] / len(values)
+    density = np.maximum(density, 0)
+
+    grid = grid_lo + np.arange(grid_size) * delta
+    x = np.linspace(lo, hi, points)
+    return {
+        'kernel': 'epanechnikov',
+        'bandwidth': float(bandwidth),
+        'x': [round(float(v), 4) for v in x],
+        'density': [round(float(v), 6) for v in np.interp(x, grid, density)]
+    }
+
+def exact_kde(values, x, bandwidth, chunk=256):
+    """Exact Epanechnikov KDE at points x, for checking the binned estimate."""
+    values = np.asarray(values, dtype=float)
+    values = values[~np.isnan(values)]
+    density = np.empty(len(x))
+    for start in range(0, len(x), chunk):
+        u = (np.asarray(x[start:start + chunk])[:, None] - values[None, :]) / bandwidth
+        density[start:start + chunk] = epanechnikov(u).sum(axis=1) / (len(values) * bandwidth)
+    return density
+
+def kde_error(values, curve):
+    """Largest gap between a binned_kde curve and the exact KDE, as a share of the peak."""
+    exact = exact_kde(values, curve['x'], curve['bandwidth'])
+    return float(np.abs(np.array(curve['density']) - exact).max() / exact.max())
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the binned FFT KDE with the exact KDE.')
+    parser.add_argument('base_dir', nargs='?', default="/Users/gaia/Downloads/WalkabilityIndex")
+    parser.add_argument('--field', default='NatWalkInd')
+    args = parser.parse_args()
+
+    values = property_columns(FeatureSource(Path(args.base_dir) / GEOJSON_FILE), [args.field])[args.field]
+
+    start = time.perf_counter()
+    curve = binned_kde(values)
+    binned_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    error = kde_error(values, curve)
+    exact_time = time.perf_counter() - start
+
+    print(f"{args.field}: {len(values)} features, bandwidth {curve['bandwidth']:.4f}")
+    print(f"  binned {binned_time * 1000:.1f} ms, exact {exact_time * 1000:.1f} ms")
+    print(f"  max error {error:.4%} of peak density")
+    if error > KDE_TOLERANCE:
+        print(f"Error is over the {KDE_TOLERANCE:.0%} tolerance")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+import argparse
+import csv
+import heapq
+import math
+import time
+from pathlib import Path
+import numpy as np
+from geojson_prune import ID_FIELD
+from walkability_data import GEOJSON_FILE, FeatureSource, scan_features
+
+# KD-tree of block-group centroids, written next to the GeoJSON
+CENTROID_TREE_FILE = 'walkability_centroids.npz'
+
+# Field queries filter and rank by
+VALUE_FIELD = 'NatWalkInd'
+
+# Centroids per leaf; leaves are scanned with one vectorized distance
+LEAF_SIZE = 16
+
+# Mean Earth radius (IUGG), in kilometres
+EARTH_RADIUS_KM = 6371.0088
+
+def unit_vectors(lonlat):
+    """(lon, lat) degrees as points on the unit sphere.
+
+    Straight-line (chord) distance between unit vectors grows with the
+    great-circle distance, so a Euclidean KD-tree over them answers
+    haversine nearest-neighbour and radius queries exactly.
+    """
+    lam = np.radians(lonlat[:, 0])
+    phi = np.radians(lonlat[:, 1])
+    return np.column_stack([np.cos(phi) * np.cos(lam), np.cos(phi) * np.sin(lam), np.sin(phi)])
+
+def chord_to_km(chord):
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(chord / 2, 1))
+
+def km_to_chord(km):
+    return 2 * math.sin(min(km / (2 * EARTH_RADIUS_KM), math.pi / 2))
+
+def _ring_centroid(ring):
+    """(area, x, y) of a ring by the shoelace formula; area is unsigned."""
+    x, y = ring[:, 0], ring[:, 1]
+    x1, y1 = np.roll(x, -1), np.roll(y, -1)
+    cross = x * y1 - x1 * y
+    area = cross.sum() / 2
+    if area == 0:
+        return 0.0, x.mean(), y.mean()
+    return abs(area), ((x + x1) * cross).sum() / (6 * area), ((y + y1) * cross).sum() / (6 * area)
+
+def centroid(feature):
+    """Area-weighted centroid of a feature's polygons, less their holes, or None without geometry.
+
+    Coordinates are treated as planar, which is well within a block
+    group's width of the true centroid.
+    """
+    geometry = feature.get('geometry')
+    if not geometry:
+        return None
+    polygons = [geometry['coordinates']] if geometry['type'] == 'Polygon' else geometry['coordinates']
+    weight = cx = cy = 0.0
+    vertices = []
+    for polygon in polygons:
+        for i, ring in enumerate(polygon):
+            if len(ring) < 3:
+                continue
+            ring = np.asarray(ring, dtype=float)[:, :2]
+            vertices.append(ring)
+            area, x, y = _ring_centroid(ring)
+            if i:
+                area = -area
+            weight += area
+            cx += area * x
+            cy += area * y
+    if not vertices:
+        return None
+    if weight <= 0:
+        # Degenerate polygons: fall back to the mean vertex
+        return tuple(np.concatenate(vertices).mean(axis=0))
+    return cx / weight, cy / weight
+
+class CentroidTree:
+    """KD-tree over block-group centroids for k-NN and radius queries.
+
+    The tree is implicit: node i has children 2i + 1 and 2i + 2, and every
+    node covers a contiguous slice of the centroids, which are stored in
+    tree order. Each node keeps its bounding box and the range of its
+    values, so searches skip subtrees that are too far away or that hold no
+    value inside the query's thresholds.
+    """
+
+    ARRAYS = ['lonlat', 'ids', 'values', 'box_lo', 'box_hi', 'value_min', 'value_max',
+              'start', 'end', 'split']
+
+    def __init__(self, lonlat, ids, values, box_lo, box_hi, value_min, value_max, start, end, split):
+        self.lonlat = lonlat
+        self.ids = ids
+        self.values = values
+        self.box_lo = box_lo
+        self.box_hi = box_hi
+        self.value_min = value_min
+        self.value_max = value_max
+        self.start = start
+        self.end = end
+        self.split = split
+        self.points = unit_vectors(lonlat)
+
+    @classmethod
+    def build(cls, lonlat, ids, values, leaf_size=LEAF_SIZE):
+        """Build from (n, 2) lon/lat centroids, their ids, and their values (NaN if missing)."""
+        lonlat = np.asarray(lonlat, dtype=float).reshape(-1, 2)
+        values = np.asarray(values, dtype=float)
+        points = unit_vectors(lonlat)
+        n = len(points)
+        depth = max(0, math.ceil(math.log2(n / leaf_size))) if n else 0
+        size = 2 ** (depth + 1) - 1
+        box_lo = np.full((size, 3), np.inf)
+        box_hi = np.full((size, 3), -np.inf)
+        value_min = np.full(size, np.inf)
+        value_max = np.full(size, -np.inf)
+        start = np.zeros(size, dtype=np.int64)
+        end = np.zeros(size, dtype=np.int64)
+        split = np.zeros(size, dtype=bool)
+
+        order = np.arange(n)
+        stack = [(0, 0, n)]
+        while stack:
+            node, lo, hi = stack.pop()
+            start[node], end[node] = lo, hi
+            if hi == lo:
+                continue
+            node_points = points[order[lo:hi]]
+            box_lo[node] = node_points.min(axis=0)
+            box_hi[node] = node_points.max(axis=0)
+            node_values = values[order[lo:hi]]
+            if not np.isnan(node_values).all():
+                value_min[node] = np.nanmin(node_values)
+                value_max[node] = np.nanmax(node_values)
+            if hi - lo <= leaf_size or 2 * node + 2 >= size:
+                continue
+            # Split the widest dimension at the median
+            dim = int(np.argmax(box_hi[node] - box_lo[node]))
+            mid = (lo + hi) // 2
+            order[lo:hi] = order[lo:hi][np.argpartition(node_points[:, dim], mid - lo)]
+            split[node] = True
+            stack.append((2 * node + 1, lo, mid))
+            stack.append((2 * node + 2, mid, hi))
+
+        return cls(lonlat[order], np.asarray(ids, dtype=str)[order], values[order],
+                   box_lo, box_hi, value_min, value_max, start, end, split)
+
+    @classmethod
+    def from_features(cls, features, leaf_size=LEAF_SIZE):
+        """Build over the centroids of features with geometry."""
+        collector = CentroidCollector()
+        scan_features(features, [collector])
+        return collector.tree(leaf_size)
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            np.savez(f, **{name: getattr(self, name) for name in self.ARRAYS})
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(*(data[name] for name in cls.ARRAYS))
+
+    def _box_distance(self, node, point):
+        gap = np.maximum(np.maximum(self.box_lo[node] - point, point - self.box_hi[node]), 0)
+        return float(gap @ gap)
+
+    def query(self, lon, lat, k=None, radius_km=None, min_value=None, max_value=None):
+        """Centroids nearest (lon, lat), as a list of (index, distance in km), nearest first.
+
+        Returns up to k results (all of them when k is None) within
+        radius_km when given, keeping only values in [min_value, max_value];
+        centroids without a value never pass a threshold.
+        """
+        if k is None and radius_km is None:
+            raise ValueError("Give k, radius_km or both")
+        if k == 0 or not len(self.values):
+            return []
+        point = unit_vectors(np.array([[lon, lat]], dtype=float))[0]
+        limit = km_to_chord(radius_km) ** 2 if radius_km is not None else np.inf
+        filtered = min_value is not None or max_value is not None
+        low = -np.inf if min_value is None else min_value
+        high = np.inf if max_value is None else max_value
+
+        # Max-heap of (-squared chord, index) holding the best k so far
+        best = []
+        bound = lambda: -best[0][0] if k is not None and len(best) == k else limit
+        stack = [(0.0, 0)]
+        while stack:
+            distance, node = stack.pop()
+            if distance > bound() or (filtered and (self.value_max[node] < low or
+                                                    self.value_min[node] > high)):
+                continue
+            if self.split[node]:
+                children = [(self._box_distance(child, point), child) for child in (2 * node + 1, 2 * node + 2)]
+                # Nearer child on top of the stack, so the bound tightens sooner
+                stack.extend(sorted(children, reverse=True))
+                continue
+            lo, hi = self.start[node], self.end[node]
+            gap = self.points[lo:hi] - point
+            distances = np.einsum('ij,ij->i', gap, gap)
+            keep = distances <= bound()
+            if filtered:
+                values = self.values[lo:hi]
+                keep &= (values >= low) & (values <= high)
+            for i in np.flatnonzero(keep):
+                entry = (-float(distances[i]), int(lo + i))
+                if k is None or len(best) < k:
+                    heapq.heappush(best, entry)
+                elif entry > best[0]:
+                    heapq.heapreplace(best, entry)
+
+        results = sorted((-d, index) for d, index in best)
+        return [(index, float(chord_to_km(math.sqrt(d)))) for d, index in results]
+
+    def nearest(self, lon, lat, k=10, min_value=None, max_value=None):
+        return self.query(lon, lat, k=k, min_value=min_value, max_value=max_value)
+
+    def within(self, lon, lat, radius_km, min_value=None, max_value=None):
+        return self.query(lon, lat, radius_km=radius_km, min_value=min_value, max_value=max_value)
+
+    def most_walkable(self, lon, lat, radius_km, k=10, min_value=None, max_value=None):
+        """The k highest values within radius_km, highest first, as (index, distance in km).
+
+        Centroids without a value are left out, since they have no rank.
+        """
+        found = [item for item in self.within(lon, lat, radius_km, min_value, max_value)
+                 if not np.isnan(self.values[item[0]])]
+        return sorted(found, key=lambda item: (-self.values[item[0]], item[1]))[:k]
+
+class CentroidCollector:
+    """Centroids, ids and values of features with geometry, gathered a feature at a time."""
+
+    def __init__(self):
+        self.lonlat, self.ids, self.values = [], [], []
+
+    def add(self, feature):
+        point = centroid(feature)
+        if point is None:
+            return
+        properties = feature.get('properties') or {}
+        value = properties.get(VALUE_FIELD)
+        self.lonlat.append(point)
+        self.ids.append(properties.get(ID_FIELD) or '')
+        self.values.append(value if isinstance(value, (int, float)) else np.nan)
+
+    def tree(self, leaf_size=LEAF_SIZE):
+        return CentroidTree.build(self.lonlat, self.ids, self.values, leaf_size)
+
+def load_tree(base_dir, geojson_file=GEOJSON_FILE):
+    """The persisted tree, rebuilt and saved first when missing or older than the GeoJSON."""
+    base_dir = Path(base_dir)
+    tree_path = base_dir / CENTROID_TREE_FILE
+    geojson_path = base_dir / geojson_file
+    if tree_path.exists() and (not geojson_path.exists() or
+                               tree_path.stat().st_mtime >= geojson_path.stat().st_mtime):
+        return CentroidTree.load(tree_path)
+    tree = CentroidTree.from_features(FeatureSource(geojson_path))
+    tree.save(tree_path)
+    return tree
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Find block groups near a point, or near each point of a CSV.')
+    parser.add_argument('points', nargs='?', help='CSV with lon and lat columns (batch mode)')
+    parser.add_argument('--lon', type=float)
+    parser.add_argument('--lat', type=float)
+    parser.add_argument('--base-dir', default="/Users/gaia/Downloads/WalkabilityIndex")
+    parser.add_argument('--geojson', default=GEOJSON_FILE)
+    parser.add_argument('-k', type=int, default=10, help='results per point')
+    parser.add_argument('--radius-km', type=float, help='only block groups within this distance')
+    parser.add_argument('--min-walk', type=float, help=f'lowest {VALUE_FIELD} to keep')
+    parser.add_argument('--max-walk', type=float, help=f'highest {VALUE_FIELD} to keep')
+    parser.add_argument('--most-walkable', action='store_true',
+                        help=f'rank by {VALUE_FIELD} within --radius-km instead of by distance')
+    parser.add_argument('--output', help='CSV to write in batch mode (default: print a summary only)')
+    args = parser.parse_args()
+    if args.points is None and (args.lon is None or args.lat is None):
+        parser.error('give a CSV of points, or --lon and --lat')
+    if args.most_walkable and args.radius_km is None:
+        parser.error('--most-walkable needs --radius-km')
+
+    start = time.perf_counter()
+    tree = load_tree(args.base_dir, args.geojson)
+    load_time = time.perf_counter() - start
+    print(f"Loaded {len(tree.ids):,} centroids in {load_time * 1000:.0f} ms")
+
+    def search(lon, lat):
+        if args.most_walkable:
+            return tree.most_walkable(lon, lat, args.radius_km, args.k, args.min_walk, args.max_walk)
+        return tree.query(lon, lat, args.k, args.radius_km, args.min_walk, args.max_walk)
+
+    if args.points is None:
+        start = time.perf_counter()
+        found = search(args.lon, args.lat)
+        query_time = time.perf_counter() - start
+        for rank, (index, distance) in enumerate(found, 1):
+            print(f"{rank:3d}  {tree.ids[index]}  {VALUE_FIELD} {tree.values[index]:5.2f}  {distance:6.2f} km")
+        print(f"{len(found)} block groups in {query_time * 1000:.2f} ms")
+        return
+
+    with open(args.points, newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    start = time.perf_counter()
+    found = [search(float(row['lon']), float(row['lat'])) for row in rows]
+    query_time = time.perf_counter() - start
+
+    if args.output:
+        fields = [*rows[0].keys(), 'rank', ID_FIELD, VALUE_FIELD, 'distance_km'] if rows else []
+        with open(args.output, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            for row, results in zip(rows, found):
+                for rank, (index, distance) in enumerate(results, 1):
+                    writer.writerow(dict(row, **{'rank': rank, ID_FIELD: tree.ids[index],
+                                                 VALUE_FIELD: tree.values[index],
+                                                 'distance_km': round(distance, 4)}))
+    print(f"Queried {len(rows):,} points in {query_time:.2f} s "
+          f"({query_time / max(len(rows), 1) * 1000:.2f} ms per point), "
+          f"{sum(map(len, found)):,} results")
+
+if __name__ == "__main__":
+    main()
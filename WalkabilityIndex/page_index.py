@@ -0,0 +1,62 @@
+import os
+from pathlib import Path
+
+# Indexes already built in this run, keyed by resolved Tufte directory
+_INDEX_CACHE = {}
+
+class PageIndex:
+    def __init__(self, tufte_dir):
+        self.tufte_dir = Path(tufte_dir)
+        self.by_section = {}
+        self.by_name = {}
+        self.sections = {}
+        self.warned = set()
+        self.build()
+
+    def build(self):
+        """Walk the Tufte directory once and index every HTML page."""
+        self.by_section = {}
+        self.by_name = {}
+        self.sections = {}
+        for root, dirs, files in os.walk(self.tufte_dir):
+            # Sorted walk so ambiguous names always resolve the same way
+            dirs.sort()
+            root_path = Path(root)
+            section = root_path.relative_to(self.tufte_dir).as_posix()
+            if section == '.':
+                section = ''
+            for name in sorted(files):
+                if not name.endswith('.html'):
+                    continue
+                path = root_path / name
+                self.by_section[(section, name)] = path
+                self.by_name.setdefault(name, []).append((section, path))
+                self.sections.setdefault(section, []).append(path)
+
+    def find(self, name, section=None):
+        """Return the path of a page, preferring the given section folder."""
+        if section is not None and (section, name) in self.by_section:
+            return self.by_section[(section, name)]
+
+        # Fall back to any section folder, as the old subdirectory scan did
+        candidates = [path for page_section, path in self.by_name.get(name, [])
+                      if page_section]
+        if not candidates:
+            return None
+        if len(candidates) > 1 and name not in self.warned:
+            self.warned.add(name)
+            print(f"Warning: Ambiguous page {name}, using "
+                  f"{candidates[0].relative_to(self.tufte_dir)} of:",
+                  [str(path.relative_to(self.tufte_dir)) for path in candidates])
+        return candidates[0]
+
+    def pages(self, section):
+        """Return every page in a section folder, sorted by file name."""
+        return list(self.sections.get(section, []))
+
+def get_page_index(tufte_dir):
+    """Return the page index for a Tufte directory, building it once per run."""
+    key = Path(tufte_dir).resolve()
+    if key not in _INDEX_CACHE:
+        _INDEX_CACHE[key] = PageIndex(tufte_dir)
+    return _INDEX_CACHE[key]
@@ -0,0 +1,47 @@
+import copy
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+# Builder copy used by each worker process, set once by the pool initializer
+_worker_builder = None
+_worker_method = None
+
+def _init_worker(builder, method):
+    global _worker_builder, _worker_method
+    _worker_builder = builder
+    _worker_method = method
+
+def _extract(file_path):
+    return getattr(_worker_builder, _worker_method)(file_path)
+
+def resolve_jobs(jobs):
+    """Return the worker count for a --jobs value, 0 or less meaning all cores."""
+    if jobs is None:
+        return 1
+    if jobs <= 0:
+        return os.cpu_count() or 1
+    return jobs
+
+def extract_pages(builder, file_paths, jobs=1, method='extract_content'):
+    """Yield builder.<method> for each of file_paths, in parallel when jobs > 1.
+
+    Results are yielded in the order of file_paths as they become ready, so
+    merging them gives the same output as a serial build.
+    """
+    file_paths = list(file_paths)
+    jobs = min(resolve_jobs(jobs), len(file_paths))
+    if jobs <= 1:
+        extract = getattr(builder, method)
+        for file_path in file_paths:
+            yield extract(file_path)
+        return
+
+    # Ship the builder to each worker once, without the parent's manifest
+    worker = copy.copy(builder)
+    if getattr(worker, 'manifest', None) is not None:
+        worker.manifest = None
+
+    chunksize = max(1, len(file_paths) // (jobs * 4))
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                             initargs=(worker, method)) as executor:
+        yield from executor.map(_extract, file_paths, chunksize=chunksize)
@@ -0,0 +1,63 @@
+import argparse
+import sys
+import time
+from pathlib import Path
+from html_backends import available_backends
+from page_index import get_page_index
+from white_theme_complete import WhiteThemeIntegrator
+
+def page_paths(base_dir):
+    """Every page the integrator can include, in section order."""
+    page_index = get_page_index(Path(base_dir) / 'tufte_tests')
+    return [path for section in sorted(page_index.sections) if section
+            for path in page_index.pages(section)]
+
+def backend_mismatches(base_dir, backends=None):
+    """(backend, page, key) for each fragment a backend extracts differently from html.parser."""
+    file_paths = page_paths(base_dir)
+    reference = WhiteThemeIntegrator(base_dir, parser='html.parser')
+    expected = [reference.extract_content(path) for path in file_paths]
+    mismatches = []
+    for backend in backends or available_backends():
+        integrator = WhiteThemeIntegrator(base_dir, parser=backend)
+        for path, fragments in zip(file_paths, expected):
+            actual = integrator.extract_content(path)
+            mismatches.extend((backend, path, key) for key in fragments if fragments[key] != actual[key])
+    return mismatches
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Check extract_content parser backends agree and time each one.')
+    parser.add_argument('base_dir', nargs='?', default="/Users/gaia/Downloads/WalkabilityIndex")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    # Conformance: fragments must be identical to the html.parser reference
+    tufte_dir = Path(args.base_dir) / 'tufte_tests'
+    mismatches = backend_mismatches(args.base_dir)
+    for backend, path, key in mismatches:
+        print(f"MISMATCH {backend}: {path.relative_to(tufte_dir)} [{key}]")
+
+    file_paths = page_paths(args.base_dir)
+    backends = available_backends()
+    timings = {}
+    for backend in backends:
+        integrator = WhiteThemeIntegrator(args.base_dir, parser=backend)
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            for path in file_paths:
+                integrator.extract_content(path)
+        timings[backend] = (time.perf_counter() - start) / args.repeat
+
+    baseline = timings['html.parser']
+    print(f"{len(file_paths)} pages, mean of {args.repeat} runs")
+    for backend in backends:
+        print(f"  {backend:12s} {timings[backend] * 1000:8.1f} ms  "
+              f"{baseline / timings[backend]:5.1f}x")
+    if mismatches:
+        print(f"{len(mismatches)} fragment mismatches")
+        sys.exit(1)
+    print("All backends produce identical fragments")
+
+if __name__ == "__main__":
+    main()
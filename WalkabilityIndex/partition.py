@@ -0,0 +1,174 @@
+import json
+from collections import OrderedDict
+import numpy as np
+from geojson_prune import prune_feature
+
+SCHEMES = ['county', 'quadtree']
+
+# GEOID10 digits naming the state (2) and county (3)
+COUNTY_PREFIX = 5
+
+# Most features in one quadtree tile before it is split
+TILE_CAPACITY = 2000
+
+# Deepest quadtree split, so stacked duplicates can't recurse forever
+MAX_DEPTH = 16
+
+# Partition files held open at once while writing
+OPEN_FILES = 64
+
+# Share of the data's width and height the page shows first, around the
+# median block group, so the first view loads a few partitions, not all
+VIEW_SHARE = 0.25
+
+# Loader injected ahead of the page scripts. Each partition is fetched at
+# most once; a call returns one FeatureCollection of the partitions whose
+# bounding box intersects the requested [west, south, east, north] bounds,
+# the initial view by default, which the loader's view property holds
+PARTITIONS_LOADER = """
+const loadWalkabilityPartitions = (() => {
+    const manifest = JSON.parse(document.getElementById("walkability-partitions").textContent);
+    const loaded = new Map();
+    const intersects = (a, b) => a[0] <= b[2] && b[0] <= a[2] && a[1] <= b[3] && b[1] <= a[3];
+    const load = (bounds = manifest.view) => Promise.all(manifest.partitions
+        .filter(partition => intersects(partition.bbox, bounds))
+        .map(partition => {
+            if (!loaded.has(partition.url)) loaded.set(partition.url, d3.json(partition.url));
+            return loaded.get(partition.url);
+        }))
+        .then(collections => ({
+            type: "FeatureCollection",
+            features: collections.flatMap(collection => collection.features)
+        }));
+    load.view = manifest.view;
+    return load;
+})();
+"""
+
+def initial_view(boxes, bbox, share=VIEW_SHARE):
+    """[west, south, east, north] spanning share of bbox around the median feature center."""
+    centers = (boxes[:, :2] + boxes[:, 2:]) / 2
+    if np.isnan(centers).all():
+        return bbox
+    low, high = np.array(bbox[:2]), np.array(bbox[2:])
+    half = (high - low) * share / 2
+    center = np.clip(np.nanmedian(centers, axis=0), low + half, high - half)
+    return [float(value) for value in (*(center - half), *(center + half))]
+
+def county_key(geoid):
+    """State and county FIPS prefix of a GEOID10."""
+    geoid = str(geoid or '')
+    return geoid[:COUNTY_PREFIX] if len(geoid) >= COUNTY_PREFIX else 'unknown'
+
+def quadtree_keys(centers, bbox, capacity=TILE_CAPACITY, max_depth=MAX_DEPTH):
+    """Quadkey of the tile holding each center, splitting tiles over capacity.
+
+    Digits are 0-3 for the west-south, east-south, west-north and east-north
+    quadrants; the root tile is 'root'.
+    """
+    keys = np.empty(len(centers), dtype=object)
+    stack = [(np.arange(len(centers)), bbox, '')]
+    while stack:
+        indexes, (x0, y0, x1, y1), key = stack.pop()
+        if len(indexes) <= capacity or len(key) >= max_depth:
+            keys[indexes] = key or 'root'
+            continue
+        mx, my = (x0 + x1) / 2, (y0 + y1) / 2
+        points = centers[indexes]
+        quadrant = (points[:, 0] >= mx).astype(int) | (points[:, 1] >= my).astype(int) << 1
+        tiles = [(x0, y0, mx, my), (mx, y0, x1, my), (x0, my, mx, y1), (mx, my, x1, y1)]
+        for digit, tile in enumerate(tiles):
+            members = indexes[quadrant == digit]
+            if len(members):
+                stack.append((members, tile, key + str(digit)))
+    return keys.tolist()
+
+class PartitionWriter:
+    """Append features to one FeatureCollection file per partition.
+
+    Only OPEN_FILES files stay open; the least recently used is closed and
+    reopened for appending when its partition comes up again.
+    """
+
+    def __init__(self, directory, pattern):
+        self.directory = directory
+        self.pattern = pattern
+        self.handles = OrderedDict()
+        self.counts = {}
+
+    def path(self, key):
+        return self.directory / self.pattern.format(key=key)
+
+    def write(self, key, feature):
+        handle = self.handles.pop(key, None)
+        if handle is None:
+            if len(self.handles) >= OPEN_FILES:
+                self.handles.popitem(last=False)[1].close()
+            handle = open(self.path(key), 'a' if key in self.counts else 'w', encoding='utf-8')
+            if key not in self.counts:
+                handle.write('{"type":"FeatureCollection","features":[')
+                self.counts[key] = 0
+        self.handles[key] = handle
+        if self.counts[key]:
+            handle.write(',')
+        json.dump(feature, handle, separators=(',', ':'))
+        self.counts[key] += 1
+
+    def close(self):
+        for handle in self.handles.values():
+            handle.close()
+        self.handles.clear()
+        for key in self.counts:
+            with open(self.path(key), 'a', encoding='utf-8') as f:
+                f.write(']}')
+
+def write_partitions(features, boxes, ids, directory, fields, precision, scheme='county',
+                     capacity=TILE_CAPACITY, view=None):
+    """Split features into per-county or quadtree-tile GeoJSON files and return a manifest.
+
+    boxes holds each feature's [west, south, east, north], NaN without
+    geometry, and ids its GEOID10, both gathered beforehand, so features
+    is read once to write and can be a FeatureSource streaming from disk.
+    Features are pruned to fields and rounded to precision decimals. The
+    manifest's view, the bounds pages load first, defaults to initial_view.
+    """
+    if scheme not in SCHEMES:
+        raise ValueError(f"Unknown partition scheme {scheme}")
+    boxes = np.asarray(boxes, dtype=float).reshape(-1, 4)
+    keys = [county_key(geoid) for geoid in ids] if scheme == 'county' else None
+    bbox = [float(value) for value in (*np.nanmin(boxes[:, :2], axis=0), *np.nanmax(boxes[:, 2:], axis=0))]
+    if scheme == 'quadtree':
+        centers = (boxes[:, :2] + boxes[:, 2:]) / 2
+        centers = np.where(np.isnan(centers), bbox[:2], centers)
+        keys = quadtree_keys(centers, bbox, capacity)
+
+    directory.mkdir(exist_ok=True)
+    pattern = scheme + '-{key}.geojson'
+    # Clear partitions of an earlier run so stale files don't linger
+    for stale in directory.glob(scheme + '-*.geojson'):
+        stale.unlink()
+    writer = PartitionWriter(directory, pattern)
+    try:
+        for key, feature in zip(keys, features):
+            writer.write(key, prune_feature(feature, fields, precision))
+    finally:
+        writer.close()
+
+    # Bounding box of each partition, grouping features by key in one pass
+    names, inverse = np.unique(np.array(keys, dtype=object), return_inverse=True)
+    lows = np.full((len(names), 2), np.inf)
+    highs = np.full((len(names), 2), -np.inf)
+    np.fmin.at(lows, inverse, boxes[:, :2])
+    np.fmax.at(highs, inverse, boxes[:, 2:])
+    partitions = []
+    for key, low, high in zip(names, lows, highs):
+        box = [float(value) for value in (*low, *high)]
+        partitions.append({
+            'key': key,
+            'url': f'{directory.name}/{pattern.format(key=key)}',
+            # Partitions without any geometry are loaded with every view
+            'bbox': box if np.isfinite(box).all() else bbox,
+            'count': writer.counts[key]
+        })
+    return {'scheme': scheme, 'bbox': bbox, 'view': view or initial_view(boxes, bbox),
+            'partitions': partitions}
@@ -0,0 +1,173 @@
+import argparse
+import hashlib
+import json
+import time
+from pathlib import Path
+import numpy as np
+
+# Ranked indicators behind the National Walkability Index and their weights:
+# NatWalkInd = D2A/6 + D2B/6 + D3B/3 + D4A/3, as EPA defines it
+INDICATORS = ['D2A_Ranked', 'D2B_Ranked', 'D3B_Ranked', 'D4A_Ranked']
+WEIGHTS = np.array([1 / 6, 1 / 6, 1 / 3, 1 / 3])
+INDEX_FIELD = 'NatWalkInd'
+
+# Largest gap between NatWalkInd and the weighted ranks that counts as
+# rounding; EPA publishes the index to four decimals
+BASELINE_TOLERANCE = 1e-3
+
+# Ranks are national ventiles, so changed ranks are clamped to 1-20
+RANK_RANGE = (1, 20)
+
+# Scenarios evaluated together; bounds the scenarios x indicators x block
+# groups array to about BATCH * 4 * n float32 values
+BATCH = 16
+
+# Layers built when no scenarios file is given; with the weights above,
+# two ranks on D3B or D4A, or on D2A and D2B together, add up to 0.67
+DEFAULT_SCENARIOS = [
+    {'name': 'Denser street grid (D3B +2 ranks, up to +0.67)', 'changes': {'D3B_Ranked': {'add': 2}}},
+    {'name': 'Closer transit (D4A +2 ranks, up to +0.67)', 'changes': {'D4A_Ranked': {'add': 2}}},
+    {'name': 'More mixed use (D2A and D2B +2 ranks, up to +0.67)',
+     'changes': {'D2A_Ranked': {'add': 2}, 'D2B_Ranked': {'add': 2}}},
+    {'name': 'Every indicator +2 ranks (up to +2)', 'changes': {field: {'add': 2} for field in INDICATORS}},
+    {'name': 'Transit everywhere (D4A at rank 20)', 'changes': {'D4A_Ranked': {'set': 20}}}
+]
+
+def baseline_error(columns):
+    """Largest gap between the published NatWalkInd and the weighted ranks, ignoring missing values.
+
+    Anything above BASELINE_TOLERANCE means the data doesn't follow the
+    EPA formula, so scenario changes shouldn't be read as index changes.
+    """
+    ranks = np.stack([np.asarray(columns[field], dtype=float) for field in INDICATORS])
+    gap = np.abs(WEIGHTS @ ranks - np.asarray(columns[INDEX_FIELD], dtype=float))
+    gap = gap[~np.isnan(gap)]
+    return float(gap.max()) if len(gap) else 0.0
+
+def scenario_hash(scenario, fingerprint=''):
+    """Key of a scenario's result: its changes and area, not its name, plus the data's fingerprint."""
+    spec = {'changes': scenario.get('changes', {}), 'where': sorted(scenario.get('where') or [])}
+    text = json.dumps(spec, sort_keys=True, separators=(',', ':')) + fingerprint
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]
+
+def _scenario_arrays(scenarios, ids):
+    """Per-scenario (scale, add) matrices over the indicators and the block groups each applies to."""
+    scale = np.ones((len(scenarios), len(INDICATORS)), dtype=np.float32)
+    add = np.zeros((len(scenarios), len(INDICATORS)), dtype=np.float32)
+    mask = np.ones((len(scenarios), len(ids)), dtype=bool)
+    for s, scenario in enumerate(scenarios):
+        for field, change in scenario.get('changes', {}).items():
+            if field not in INDICATORS:
+                raise ValueError(f"Unknown indicator {field}; scenarios can change {', '.join(INDICATORS)}")
+            f = INDICATORS.index(field)
+            if 'set' in change:
+                scale[s, f], add[s, f] = 0, change['set']
+            else:
+                scale[s, f], add[s, f] = change.get('scale', 1), change.get('add', 0)
+        if scenario.get('where'):
+            # GEOID10 prefixes: a state (2 digits), county (5) or tract (11)
+            mask[s] = np.logical_or.reduce([np.char.startswith(ids, prefix) for prefix in scenario['where']])
+    return scale, add, mask
+
+def evaluate(columns, scenarios, ids=None):
+    """NatWalkInd of every block group under each scenario, as a scenarios x block groups array.
+
+    columns maps each indicator and NatWalkInd to a value per block group.
+    A scenario is {name, changes: {indicator: {add, scale or set}}, where:
+    [GEOID10 prefixes]}; ids holds the GEOID10s that where matches. Every
+    scenario of a batch is applied with one broadcast over a scenarios x
+    indicators x block groups array, and the index is recomputed with one
+    weighted sum over the indicator axis. The weighted change is added to
+    the published NatWalkInd, so indicators a scenario leaves alone don't
+    move it. A changed indicator that is missing makes the result NaN.
+    """
+    base = np.stack([np.asarray(columns[field], dtype=np.float32) for field in INDICATORS])
+    published = np.asarray(columns[INDEX_FIELD], dtype=np.float32)
+    ids = np.asarray(ids if ids is not None else [''] * base.shape[1], dtype=str)
+    weights = WEIGHTS.astype(np.float32)
+    results = np.empty((len(scenarios), base.shape[1]), dtype=np.float32)
+    for start in range(0, len(scenarios), BATCH):
+        scale, add, mask = _scenario_arrays(scenarios[start:start + BATCH], ids)
+        changed = np.clip(base * scale[:, :, None] + add[:, :, None], *RANK_RANGE)
+        touched = mask[:, None, :] & ((scale != 1) | (add != 0))[:, :, None]
+        delta = np.where(touched, changed - base, 0)
+        results[start:start + len(scale)] = published + np.einsum('f,sfn->sn', weights, delta)
+    return results
+
+class ScenarioCache:
+    """Scenario results on disk as Float32 files named by scenario hash.
+
+    The fingerprint covers the input columns, so layers built from older
+    data are never served; only missing scenarios are evaluated, together
+    in one batched pass.
+    """
+
+    def __init__(self, directory, columns, ids=None):
+        self.directory = Path(directory)
+        self.columns = columns
+        self.ids = ids
+        digest = hashlib.sha256()
+        for field in INDICATORS + [INDEX_FIELD]:
+            digest.update(np.asarray(columns[field], dtype='<f4').tobytes())
+        digest.update(json.dumps(list(ids) if ids is not None else []).encode('utf-8'))
+        self.fingerprint = digest.hexdigest()
+
+    def path(self, key):
+        return self.directory / f"{key}.bin"
+
+    def results(self, scenarios):
+        """[(hash, values)] for each scenario, evaluating only those not cached."""
+        keys = [scenario_hash(scenario, self.fingerprint) for scenario in scenarios]
+        missing = {}
+        for key, scenario in zip(keys, scenarios):
+            if not self.path(key).exists():
+                missing.setdefault(key, scenario)
+        if missing:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            for key, values in zip(missing, evaluate(self.columns, list(missing.values()), self.ids)):
+                values.astype('<f4').tofile(self.path(key))
+        return [(key, np.fromfile(self.path(key), dtype='<f4')) for key in keys]
+
+def load_scenarios(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def main():
+    parser = argparse.ArgumentParser(description='Time batched what-if scenarios over national-size data.')
+    parser.add_argument('--block-groups', type=int, default=220_000)
+    parser.add_argument('--scenarios', type=int, default=200)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    n = args.block_groups
+    columns = {field: rng.integers(1, 21, n).astype(float) for field in INDICATORS}
+    columns[INDEX_FIELD] = WEIGHTS @ np.stack([columns[field] for field in INDICATORS])
+    ids = [f"{13 + i % 40:02d}{i:09d}" for i in range(n)]
+    scenarios = [{'name': f'scenario {s}',
+                  'changes': {INDICATORS[s % 4]: {'add': 1 + s // 4 % 5}},
+                  'where': [ids[s * 997 % n][:2]] if s % 2 else None}
+                 for s in range(args.scenarios)]
+
+    start = time.perf_counter()
+    results = evaluate(columns, scenarios, ids)
+    batched = time.perf_counter() - start
+
+    start = time.perf_counter()
+    sample = min(args.scenarios, 4)
+    for s in range(sample):
+        change = scenarios[s]['changes']
+        where = scenarios[s]['where']
+        for i in range(n):
+            if where and not ids[i].startswith(tuple(where)):
+                continue
+            ranks = [min(max(columns[field][i] + change.get(field, {}).get('add', 0), 1), 20)
+                     for field in INDICATORS]
+            sum(w * r for w, r in zip(WEIGHTS, ranks))
+    looped = (time.perf_counter() - start) / sample * args.scenarios
+    print(f"{args.scenarios} scenarios x {n:,} block groups: {batched:.2f} s batched, "
+          f"~{looped:.0f} s with a loop per feature")
+    print(f"  mean NatWalkInd {columns[INDEX_FIELD].mean():.2f} -> "
+          f"{results.mean(axis=1).min():.2f}..{results.mean(axis=1).max():.2f} across scenarios")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import re
+from collections import Counter
+
+# d3 fetches that take only a URL, so identical calls return identical data
+DATA_LOAD = re.compile(r'd3\.(json|csv|tsv|text)\(\s*(["\'])([^"\']+)\2\s*\)')
+
+# Memoized loader injected ahead of the page scripts: the first call for a
+# key starts the fetch and every later call gets the same promise
+LOADER_SCRIPT = """
+const sharedDataLoad = (() => {
+    const cache = new Map();
+    return (key, load) => {
+        if (!cache.has(key)) cache.set(key, load());
+        return cache.get(key);
+    };
+})();
+"""
+
+def count_data_loads(scripts):
+    """Count d3 data fetches across inline scripts, keyed by (loader, url)."""
+    counts = Counter()
+    for script in scripts:
+        for match in DATA_LOAD.finditer(script.get('content', '')):
+            counts[(match.group(1), match.group(3))] += 1
+    return counts
+
+def share_data_loads(scripts):
+    """Route data fetches repeated across merged pages through one shared promise.
+
+    Returns the scripts with repeated d3.json/csv/tsv/text calls wrapped in
+    sharedDataLoad(key, () => d3.json(url)) and the loader prepended, so each
+    dataset is fetched and parsed once per page view. Scripts without
+    repeated loads are returned unchanged.
+    """
+    scripts = list(scripts)
+    counts = count_data_loads(scripts)
+    repeated = {key for key, count in counts.items() if count > 1}
+    if not repeated:
+        return scripts
+
+    def wrap(match):
+        if (match.group(1), match.group(3)) not in repeated:
+            return match.group(0)
+        key = f'{match.group(1)}:{match.group(3)}'
+        return f'sharedDataLoad("{key}", () => {match.group(0)})'
+
+    for loader, url in sorted(repeated):
+        print(f"Sharing {counts[(loader, url)]} d3.{loader} loads of {url}")
+    shared = [{'content': LOADER_SCRIPT}]
+    for script in scripts:
+        if 'content' in script:
+            script = dict(script, content=DATA_LOAD.sub(wrap, script['content']))
+        shared.append(script)
+    return shared
@@ -0,0 +1,161 @@
+import json
+import numpy as np
+from topojson_convert import delta_decode, delta_encode
+
+# Map widths in device pixels that each simplified level is built for; the
+# full-resolution topology covers anything wider
+LOD_WIDTHS = [480, 960, 1920]
+
+def _triangle_areas(x, y, i, before, after):
+    """Area of the triangle each point i makes with the points before and after it."""
+    return np.abs((x[i] - x[before]) * (y[after] - y[before]) -
+                  (x[after] - x[before]) * (y[i] - y[before])) / 2
+
+def _below(areas, ranks, i, j):
+    """Whether each point i is smaller than point j, equal areas ordered by rank."""
+    return (areas[i] < areas[j]) | (areas[i] == areas[j]) & (ranks[i] < ranks[j])
+
+def effective_areas(points, lengths):
+    """Effective area of every point of consecutive arcs, by Visvalingam-Whyatt elimination.
+
+    points holds the arcs one after another and lengths their point counts.
+    A point survives simplification at a minimum area A when its weight is at
+    least A; endpoints, which sit on junctions shared with other arcs, are
+    infinite. Rather than one point at a time, each round eliminates every
+    point smaller than both neighbours, in all arcs at once: such points are
+    never adjacent, so their removals don't interact. A point's weight is at
+    least that of any neighbour eliminated before it, so a point is never kept
+    after one it depends on.
+    """
+    n = len(points)
+    x, y = points[:, 0].astype(np.int64), points[:, 1].astype(np.int64)
+    arc_of = np.repeat(np.arange(len(lengths)), lengths)
+    # Random ranks split runs of equal areas, such as collinear points, so a
+    # round eliminates part of every run instead of one point from each end
+    ranks = np.random.default_rng(0).permutation(n)
+    weights = np.full(n, np.inf)
+    floor = np.zeros(n)
+    alive = np.arange(n)
+    while True:
+        arc = arc_of[alive]
+        inner = np.flatnonzero((arc[:-2] == arc[1:-1]) & (arc[1:-1] == arc[2:])) + 1
+        if not len(inner):
+            break
+        areas = np.full(len(alive), np.inf)
+        areas[inner] = _triangle_areas(x, y, alive[inner], alive[inner - 1], alive[inner + 1])
+        alive_ranks = ranks[alive]
+        lowest = inner[_below(areas, alive_ranks, inner, inner - 1) &
+                       _below(areas, alive_ranks, inner, inner + 1)]
+        removed = alive[lowest]
+        weights[removed] = np.maximum(areas[lowest], floor[removed])
+        np.maximum.at(floor, alive[np.concatenate([lowest - 1, lowest + 1])], np.tile(weights[removed], 2))
+        alive = np.delete(alive, lowest)
+
+    # A closed arc is a whole ring and needs two interior points to stay one;
+    # its two heaviest are kept, the later of equal weights first
+    starts = np.cumsum(lengths) - lengths
+    long = np.flatnonzero(lengths >= 3)
+    closed = np.zeros(len(lengths), dtype=bool)
+    closed[long] = (points[starts[long]] == points[starts[long] + lengths[long] - 1]).all(axis=1)
+    candidates = np.flatnonzero(np.isfinite(weights) & closed[arc_of])
+    ranked = candidates[np.lexsort((candidates, weights[candidates], arc_of[candidates]))]
+    ranked_arcs = arc_of[ranked]
+    from_end = np.searchsorted(ranked_arcs, ranked_arcs, side='right') - np.arange(len(ranked))
+    weights[ranked[from_end <= 2]] = np.inf
+    return weights
+
+def _rings(topology, object_name):
+    """Every ring of the object as a list of arc indexes."""
+    rings = []
+    for geometry in topology['objects'][object_name]['geometries']:
+        if geometry.get('type') == 'Polygon':
+            rings.extend(geometry['arcs'])
+        elif geometry.get('type') == 'MultiPolygon':
+            for polygon in geometry['arcs']:
+                rings.extend(polygon)
+    return rings
+
+class TopologySimplifier:
+    """Builds levels of detail from one topology, simplifying shared arcs once.
+
+    Simplifying arcs instead of polygons keeps neighbouring block groups
+    sharing the same boundary, so no gaps or overlaps open between them.
+    Arcs are held as one array of points, so every level is a mask over it.
+    """
+
+    def __init__(self, topology, object_name):
+        self.topology = topology
+        arcs = [delta_decode(arc) for arc in topology['arcs']]
+        self.lengths = np.array([len(arc) for arc in arcs], dtype=np.int64)
+        self.points = np.concatenate(arcs) if arcs else np.empty((0, 2), dtype=np.int64)
+        self.arc_of = np.repeat(np.arange(len(arcs)), self.lengths)
+        self.weights = effective_areas(self.points, self.lengths)
+        rings = _rings(topology, object_name)
+        self.ring_count = len(rings)
+        ring_arcs = np.array([index for ring in rings for index in ring], dtype=np.int64)
+        self.ring_of = np.repeat(np.arange(len(rings)), [len(ring) for ring in rings])
+        self.ring_arcs = np.where(ring_arcs >= 0, ring_arcs, ~ring_arcs)
+        self.ring_signs = np.where(ring_arcs >= 0, 1, -1)
+        self.areas = self.ring_areas(np.ones(len(self.points), dtype=bool))
+
+    def ring_areas(self, keep):
+        """Twice the signed shoelace area of every ring, from the points kept by the mask."""
+        kept = np.flatnonzero(keep)
+        x, y, arc = self.points[kept, 0], self.points[kept, 1], self.arc_of[kept]
+        same = arc[:-1] == arc[1:]
+        cross = np.zeros(len(self.lengths), dtype=np.int64)
+        np.add.at(cross, arc[:-1][same], (x[:-1] * y[1:] - x[1:] * y[:-1])[same])
+        areas = np.zeros(self.ring_count, dtype=np.int64)
+        np.add.at(areas, self.ring_of, self.ring_signs * cross[self.ring_arcs])
+        return areas
+
+    def levels(self, min_areas):
+        """Return the topology simplified to each of min_areas (in quantized units squared).
+
+        Effective areas nest: a point kept at one minimum area is kept at every
+        smaller one, so a single search over the sorted minimums counts the
+        levels each point survives, and each level is a mask on that count.
+        Rings that would collapse or flip orientation keep their arcs at full
+        detail, since a reversed ring is drawn by d3 as covering the globe.
+        """
+        thresholds = np.sort(min_areas)
+        survives = np.searchsorted(thresholds, self.weights, side='right')
+        levels = []
+        for min_area in min_areas:
+            keep = survives > np.searchsorted(thresholds, min_area)
+            keep_all = np.zeros(len(self.lengths), dtype=bool)
+            while True:
+                mask = keep | keep_all[self.arc_of]
+                simplified = self.ring_areas(mask)
+                flipped_rings = (self.areas != 0) & (np.sign(simplified) != np.sign(self.areas))
+                flipped = np.zeros(len(self.lengths), dtype=bool)
+                flipped[self.ring_arcs[flipped_rings[self.ring_of]]] = True
+                if not (flipped & ~keep_all).any():
+                    break
+                keep_all |= flipped
+            counts = np.bincount(self.arc_of[mask], minlength=len(self.lengths))
+            arcs = np.split(self.points[mask], np.cumsum(counts)[:-1])
+            levels.append(dict(self.topology, arcs=[delta_encode(arc) for arc in arcs]))
+        return levels
+
+    def point_count(self, arcs=None):
+        """Points stored in the given arcs, or in the full-resolution topology."""
+        return len(self.points) if arcs is None else sum(len(arc) for arc in arcs)
+
+def level_min_area(quantization, width):
+    """Area in quantized units squared of one square pixel when the data spans width pixels."""
+    return ((quantization - 1) / width) ** 2
+
+def level_load(levels, object_name):
+    """JS expression loading the coarsest level fine enough for the viewport.
+
+    levels is a list of (max_width, url) from coarsest to finest, with the
+    full-resolution level last and a max_width of None. The viewport width
+    bounds the map's rendered width, so the chosen level is never too coarse.
+    """
+    table = json.dumps([{'maxWidth': width, 'url': url} for width, url in levels],
+                       separators=(',', ':'))
+    return (f'd3.json((levels => (levels.find(level => level.maxWidth !== null && '
+            f'level.maxWidth >= window.innerWidth * (window.devicePixelRatio || 1)) || '
+            f'levels[levels.length - 1]).url)({table}))'
+            f'.then(topology => topojson.feature(topology, topology.objects.{object_name}))')
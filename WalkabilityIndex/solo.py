@@ -1,67 +1,20 @@
+import argparse
 import os
-from bs4 import BeautifulSoup
 from pathlib import Path
+from page_index import get_page_index
+from html_backends import BACKENDS, parse_page
+from build_manifest import BuildManifest
+from data_prep import DATA_INPUTS, prepare_page_data
+from parallel_extract import extract_pages
+from shared_loads import share_data_loads
+from stream_render import (OrderedFragments, block_scoped, copy_spool, render_template,
+                           section_spool, split_template, template_script_keys, write_data_blocks,
+                           write_scripts, write_styles)
+import io
 import json
 import re
 
-class TufteIntegrator:
-    def __init__(self, base_dir):
-        self.base_dir = Path(base_dir)
-        self.tufte_dir = self.base_dir / 'tufte_tests'
-        self.structure = {
-            'overview': ['creator.html', 'temporal.html', 'geographic.html'],  # Added geographic.html
-            'access': ['instructions.html', 'requirements.html'],
-            'standards': ['structure.html'],
-            'codebook': ['fields.html'],
-            'context': ['analysis.html'],
-            'uses': ['applications.html'],
-            'sources': ['references.html']
-        }
-        
-    def extract_content(self, file_path):
-        """Extract the content and resources from a Tufte page."""
-        with open(file_path, 'r', encoding='utf-8') as f:
-            soup = BeautifulSoup(f.read(), 'html.parser')
-            
-            # Extract styles
-            styles = []
-            for style in soup.find_all('style'):
-                if style.string:
-                    # Process styles to work in dark mode
-                    css = style.string
-                    # Convert light theme colors to CSS variables
-                    css = re.sub(r'background:\s*#fff', 'background: var(--bg-color)', css)
-                    css = re.sub(r'color:\s*#333', 'color: var(--text-color)', css)
-                    css = re.sub(r'background-color:\s*#fff', 'background-color: var(--bg-color)', css)
-                    styles.append(css)
-            
-            # Extract scripts
-            scripts = []
-            for script in soup.find_all('script'):
-                if script.get('src'):
-                    scripts.append({'src': script['src']})
-                elif script.string:
-                    scripts.append({'content': script.string})
-            
-            # Extract main content
-            main_content = soup.find('body')
-            if main_content:
-                for script in main_content.find_all('script'):
-                    script.decompose()
-                content = str(main_content).replace('<body>', '').replace('</body>', '').strip()
-                
-                # Wrap content in a container for proper styling
-                content = f'<div class="tufte-content">{content}</div>'
-            
-            return {
-                'styles': styles,
-                'scripts': scripts,
-                'content': content
-            }
-    
-    def generate_integrated_html(self):
-        """Generate the integrated datawalker HTML."""
-        template = """
+TEMPLATE = """
 <!DOCTYPE html>
 <html>
 <head>
@@ -380,70 +333,181 @@ class TufteIntegrator:
 </body>
 </html>
 """
-        
-        # Collect all Tufte content
-        all_styles = set()
-        all_scripts = []
-        sections_html = []
-        
+
+# Split once at the placeholders so the document can be streamed
+TEMPLATE_PARTS = split_template(TEMPLATE)
+
+# External scripts the template loads itself, never repeated from pages
+TEMPLATE_SCRIPTS = template_script_keys(TEMPLATE)
+
+class TufteIntegrator:
+    def __init__(self, base_dir, jobs=1, parser=None):
+        self.base_dir = Path(base_dir)
+        self.tufte_dir = self.base_dir / 'tufte_tests'
+        self.manifest = None
+        self.jobs = jobs
+        self.parser = parser
+        self.structure = {
+            'overview': ['creator.html', 'temporal.html', 'geographic.html'],  # Added geographic.html
+            'access': ['instructions.html', 'requirements.html'],
+            'standards': ['structure.html'],
+            'codebook': ['fields.html'],
+            'context': ['analysis.html'],
+            'uses': ['applications.html'],
+            'sources': ['references.html']
+        }
+        self.data_blocks = {}
+        # Files the data prep wrote, which incremental builds check still exist
+        self.data_outputs = []
+    
+    def extract_content(self, file_path):
+        """Extract the content and resources from a Tufte page."""
+        with open(file_path, 'r', encoding='utf-8') as f:
+            page = parse_page(f.read(), self.parser)
+            
+            # Extract styles
+            styles = []
+            for css in page.styles():
+                # Process styles to work in dark mode
+                # Convert light theme colors to CSS variables
+                css = re.sub(r'background:\s*#fff', 'background: var(--bg-color)', css)
+                css = re.sub(r'color:\s*#333', 'color: var(--text-color)', css)
+                css = re.sub(r'background-color:\s*#fff', 'background-color: var(--bg-color)', css)
+                styles.append(css)
+            
+            # Extract scripts
+            scripts = page.scripts()
+            
+            # Extract main content
+            main_content = page.body(strip_scripts=True)
+            if main_content:
+                content = main_content.replace('<body>', '').replace('</body>', '').strip()
+                
+                # Wrap content in a container for proper styling
+                content = f'<div class="tufte-content">{content}</div>'
+            
+            return {
+                'styles': styles,
+                'scripts': scripts,
+                'content': content
+            }
+    
+    def load_pages(self, file_paths):
+        """Extract pages in order, in parallel and from the manifest when enabled."""
+        extract = lambda paths: extract_pages(self, paths, self.jobs)
+        if self.manifest is None:
+            return extract(file_paths)
+        return self.manifest.extract_all(file_paths, extract)
+    
+    def generate_integrated_html(self):
+        """Generate the integrated datawalker HTML."""
+        buffer = io.StringIO()
+        self.write_integrated_html(buffer, self.load_structure_pages())
+        return buffer.getvalue()
+    
+    def load_structure_pages(self):
+        """Find and extract every page in self.structure, grouped by section."""
+        page_index = get_page_index(self.tufte_dir)
+        section_paths = {}
         for section, files in self.structure.items():
-            section_content = []
+            section_paths[section] = []
             for file in files:
                 # Find the file in the section subdirectory
-                file_path = None
-                for subdir in self.tufte_dir.glob('*'):
-                    if subdir.is_dir():
-                        potential_path = subdir / file
-                        if potential_path.exists():
-                            file_path = potential_path
-                            break
-                
+                file_path = page_index.find(file, section)
                 if file_path:
-                    content = self.extract_content(file_path)
-                    all_styles.update(content['styles'])
-                    all_scripts.extend(content['scripts'])
-                    section_content.append(content['content'])
-            
-            # Create section HTML
-            section_html = f"""
+                    section_paths[section].append(file_path)
+        
+        # Extract every page in one batch, in structure order
+        pages = self.load_pages([file_path for paths in section_paths.values() for file_path in paths])
+        return section_paths, pages
+    
+    def write_integrated_html(self, stream, structure_pages):
+        """Stream the integrated HTML to any writable text stream."""
+        section_paths, pages = structure_pages
+        pages = iter(pages)
+        
+        # Collect all Tufte content
+        all_styles = OrderedFragments()
+        all_scripts = OrderedFragments(exclude=TEMPLATE_SCRIPTS)
+        
+        # Sections are spooled while styles and scripts are collected, since
+        # the styles have to be written first
+        with section_spool() as sections:
+            for i, (section, paths) in enumerate(section_paths.items()):
+                if i:
+                    sections.write('\n')
+                
+                # Create section HTML
+                sections.write(f"""
             <section class="section" data-step="{section}" data-title="{section.title()}">
                 <div class="node"></div>
                 <div class="content">
                     <div class="tufte-container">
-                        {''.join(section_content)}
+                        """)
+                for file_path in paths:
+                    content = next(pages)
+                    all_styles.update(content['styles'])
+                    all_scripts.update(content['scripts'])
+                    sections.write(content['content'])
+                sections.write("""
                     </div>
                 </div>
             </section>
-            """
-            sections_html.append(section_html)
+            """)
+            
+            # Precompute chart data once the scripts that use it are known;
+            # pages that fetch the same data share one request and parse
+            self.data_blocks, page_scripts, self.data_outputs = prepare_page_data(
+                self.base_dir, share_data_loads(block_scoped(all_scripts)))
+            
+            # Data blocks go first so page scripts can read them synchronously
+            def write_all_scripts(out):
+                write_data_blocks(out, self.data_blocks)
+                write_scripts(out, page_scripts)
+            
+            render_template(stream, TEMPLATE_PARTS, {
+                '{{TUFTE_STYLES}}': lambda out: write_styles(out, all_styles),
+                '{{SECTIONS}}': lambda out: copy_spool(sections, out),
+                '{{TUFTE_SCRIPTS}}': write_all_scripts
+            })
+    
+    def save_integrated_html(self, output_file='datawalker-solo.html', incremental=False):
+        """Save the integrated HTML to a file."""
+        output_path = self.base_dir / output_file
+        if incremental:
+            self.manifest = BuildManifest.for_output(output_path, self.base_dir, self)
+            for file in DATA_INPUTS:
+                self.manifest.track(self.base_dir / file)
         
-        # Generate scripts HTML
-        scripts_html = []
-        for script in all_scripts:
-            if 'src' in script:
-                scripts_html.append(f'<script src="{script["src"]}"></script>')
-            elif 'content' in script:
-                scripts_html.append(f'<script>{script["content"]}</script>')
+        structure_pages = self.load_structure_pages()
         
-        # Replace placeholders in template
-        html = template.replace('{{TUFTE_STYLES}}', 
-                              f'<style>{"".join(all_styles)}</style>')
-        html = html.replace('{{TUFTE_SCRIPTS}}', '\n'.join(scripts_html))
-        html = html.replace('{{SECTIONS}}', '\n'.join(sections_html))
+        if incremental and not self.manifest.is_stale(output_path):
+            print(f"Up to date: {output_file}")
+            return
+        if incremental and self.manifest.missing_outputs():
+            print(f"Rebuilding, missing {', '.join(self.manifest.missing_outputs())}")
         
-        return html
-    
-    def save_integrated_html(self, output_file='datawalker-solo.html'):
-        """Save the integrated HTML to a file."""
-        html = self.generate_integrated_html()
-        with open(self.base_dir / output_file, 'w', encoding='utf-8') as f:
-            f.write(html)
+        with open(output_path, 'w', encoding='utf-8') as f:
+            self.write_integrated_html(f, structure_pages)
+        if incremental:
+            self.manifest.record_outputs(self.data_outputs)
+            self.manifest.save()
         print(f"Created integrated file: {output_file}")
 
 def main():
-    base_dir = "/Users/gaia/Downloads/WalkabilityIndex"
-    integrator = TufteIntegrator(base_dir)
-    integrator.save_integrated_html()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('base_dir', nargs='?', default="/Users/gaia/Downloads/WalkabilityIndex")
+    parser.add_argument('--output', default='datawalker-solo.html')
+    parser.add_argument('--incremental', action='store_true',
+                        help='only re-extract pages whose content changed')
+    parser.add_argument('--parser', choices=['auto'] + BACKENDS, default='auto',
+                        help='HTML parser backend (auto picks the fastest installed)')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='worker processes for page extraction (0 = all cores)')
+    args = parser.parse_args()
+    
+    integrator = TufteIntegrator(args.base_dir, jobs=args.jobs, parser=args.parser)
+    integrator.save_integrated_html(args.output, incremental=args.incremental)
 
 if __name__ == "__main__":
-    main()
+    main()
\ No newline at end of file
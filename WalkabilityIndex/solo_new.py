@@ -1,13 +1,18 @@
+import argparse
 import os
-from bs4 import BeautifulSoup
 from pathlib import Path
+from page_index import get_page_index
+from html_backends import BACKENDS, parse_page
+from parallel_extract import extract_pages
 import json
 
 class TuftePageAnalyzer:
-    def __init__(self, base_dir):
+    def __init__(self, base_dir, jobs=1, parser=None):
         self.base_dir = Path(base_dir)
         self.tufte_dir = self.base_dir / 'tufte_tests'
         self.pages = {}
+        self.jobs = jobs
+        self.parser = parser
         self.structure = {
             'overview': ['creator.html', 'temporal.html'],
             'access': ['instructions.html', 'requirements.html'],
@@ -21,40 +26,23 @@ class TuftePageAnalyzer:
     def analyze_page(self, file_path):
         """Analyze a single Tufte page for its components and dependencies."""
         with open(file_path, 'r', encoding='utf-8') as f:
-            soup = BeautifulSoup(f.read(), 'html.parser')
+            page = parse_page(f.read(), self.parser)
             
             # Extract metadata
-            title = soup.title.string if soup.title else ""
+            title = page.title()
             
             # Extract styles
-            styles = []
-            for style in soup.find_all('style'):
-                if style.string:
-                    styles.append(style.string)
+            styles = page.styles()
             
             # Extract scripts
-            scripts = []
-            for script in soup.find_all('script'):
-                if script.get('src'):
-                    scripts.append({'src': script['src']})
-                elif script.string:
-                    scripts.append({'content': script.string})
+            scripts = page.scripts()
             
             # Extract main content structure
-            main_content = soup.find('body')
+            # Remove scripts from content analysis
+            main_content = page.body(strip_scripts=True)
             if main_content:
-                # Remove scripts from content analysis
-                for script in main_content.find_all('script'):
-                    script.decompose()
-                
                 # Analyze content structure
-                sections = []
-                for section in main_content.find_all(['section', 'div'], class_=True):
-                    sections.append({
-                        'class': section.get('class'),
-                        'id': section.get('id'),
-                        'type': section.name
-                    })
+                sections = page.class_elements(['section', 'div'])
             
             return {
                 'title': title,
@@ -69,24 +57,22 @@ class TuftePageAnalyzer:
     
     def analyze_all_pages(self):
         """Analyze all Tufte pages and their relationships."""
+        page_index = get_page_index(self.tufte_dir)
+        page_paths = []
         for section, files in self.structure.items():
-            section_pages = []
             for file in files:
                 # Find the file in the section subdirectory
-                file_path = None
-                for subdir in self.tufte_dir.glob('*'):
-                    if subdir.is_dir():
-                        potential_path = subdir / file
-                        if potential_path.exists():
-                            file_path = potential_path
-                            break
-                
+                file_path = page_index.find(file, section)
                 if file_path:
-                    analysis = self.analyze_page(file_path)
-                    analysis['file'] = str(file_path.relative_to(self.tufte_dir))
-                    section_pages.append(analysis)
-            
-            self.pages[section] = section_pages
+                    page_paths.append((section, file_path))
+        
+        # Analyze every page in one batch, then group results by section
+        analyses = extract_pages(self, [file_path for section, file_path in page_paths],
+                                 self.jobs, method='analyze_page')
+        self.pages = {section: [] for section in self.structure}
+        for (section, file_path), analysis in zip(page_paths, analyses):
+            analysis['file'] = str(file_path.relative_to(self.tufte_dir))
+            self.pages[section].append(analysis)
     
     def generate_report(self):
         """Generate a detailed report of the analysis."""
@@ -123,8 +109,15 @@ class TuftePageAnalyzer:
             json.dump(report, f, indent=2)
 
 def main():
-    base_dir = "/Users/gaia/Downloads/WalkabilityIndex"
-    analyzer = TuftePageAnalyzer(base_dir)
+    parser = argparse.ArgumentParser()
+    parser.add_argument('base_dir', nargs='?', default="/Users/gaia/Downloads/WalkabilityIndex")
+    parser.add_argument('--parser', choices=['auto'] + BACKENDS, default='auto',
+                        help='HTML parser backend (auto picks the fastest installed)')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='worker processes for page analysis (0 = all cores)')
+    args = parser.parse_args()
+    
+    analyzer = TuftePageAnalyzer(args.base_dir, jobs=args.jobs, parser=args.parser)
     analyzer.analyze_all_pages()
     analyzer.save_analysis()
     print("Analysis complete. Check tufte_analysis.json for results.")
@@ -0,0 +1,309 @@
+import argparse
+import csv
+import math
+import struct
+import time
+from pathlib import Path
+import numpy as np
+from geojson_prune import ID_FIELD
+from walkability_data import GEOJSON_FILE, FeatureSource
+
+# Children per R-tree node
+NODE_SIZE = 16
+
+# Grid the box centers are snapped to before taking their Hilbert value
+HILBERT_MAX = (1 << 16) - 1
+
+# Header of the binary index, laid out as Flatbush v3 with Float64 boxes:
+# magic byte, version and array type, node size (uint16), item count (uint32)
+MAGIC = 0xfb
+VERSION = 3
+FLOAT64_TYPE = 8
+HEADER = struct.Struct('<BBHI')
+
+# Loader injected ahead of the page scripts. It fetches the index once and
+# returns search(x, y), the ids of the items whose box contains the point
+SPATIAL_INDEX_LOADER = """
+const loadWalkabilityIndex = (() => {
+    const header = JSON.parse(document.getElementById("walkability-spatial-index").textContent);
+    let index = null;
+    return () => index || (index = fetch(header.url)
+        .then(response => response.arrayBuffer())
+        .then(buffer => {
+            const view = new DataView(buffer);
+            const nodeSize = view.getUint16(2, true);
+            const numItems = view.getUint32(4, true);
+            const levelBounds = [numItems * 4];
+            let n = numItems, numNodes = numItems;
+            do {
+                n = Math.ceil(n / nodeSize);
+                numNodes += n;
+                levelBounds.push(numNodes * 4);
+            } while (n !== 1);
+            const boxes = new Float64Array(buffer, 8, numNodes * 4);
+            const IndexArray = numNodes < 16384 ? Uint16Array : Uint32Array;
+            const indices = new IndexArray(buffer, 8 + numNodes * 32, numNodes);
+            const search = (x, y) => {
+                const results = [];
+                const queue = [];
+                let node = boxes.length - 4;
+                while (node !== undefined) {
+                    const end = Math.min(node + nodeSize * 4, levelBounds.find(bound => bound > node));
+                    for (let pos = node; pos < end; pos += 4) {
+                        if (x < boxes[pos] || y < boxes[pos + 1] || x > boxes[pos + 2] || y > boxes[pos + 3]) continue;
+                        if (node >= numItems * 4) queue.push(indices[pos >> 2]);
+                        else results.push(indices[pos >> 2]);
+                    }
+                    node = queue.pop();
+                }
+                return results;
+            };
+            return {count: numItems, search};
+        }));
+})();
+"""
+
+def hilbert(x, y):
+    """Hilbert curve distance of integer points on a 2^16 grid, as Flatbush computes it."""
+    x = np.asarray(x, dtype=np.int64)
+    y = np.asarray(y, dtype=np.int64)
+    a = x ^ y
+    b = 0xFFFF ^ a
+    c = 0xFFFF ^ (x | y)
+    d = x & (y ^ 0xFFFF)
+
+    A = a | (b >> 1)
+    B = (a >> 1) ^ a
+    C = ((c >> 1) ^ (b & (d >> 1))) ^ c
+    D = ((a & (c >> 1)) ^ (d >> 1)) ^ d
+
+    a, b, c, d = A, B, C, D
+    A = (a & (a >> 2)) ^ (b & (b >> 2))
+    B = (a & (b >> 2)) ^ (b & ((a ^ b) >> 2))
+    C = C ^ ((a & (c >> 2)) ^ (b & (d >> 2)))
+    D = D ^ ((b & (c >> 2)) ^ ((a ^ b) & (d >> 2)))
+
+    a, b, c, d = A, B, C, D
+    A = (a & (a >> 4)) ^ (b & (b >> 4))
+    B = (a & (b >> 4)) ^ (b & ((a ^ b) >> 4))
+    C = C ^ ((a & (c >> 4)) ^ (b & (d >> 4)))
+    D = D ^ ((b & (c >> 4)) ^ ((a ^ b) & (d >> 4)))
+
+    a, b, c, d = A, B, C, D
+    C = C ^ ((a & (c >> 8)) ^ (b & (d >> 8)))
+    D = D ^ ((b & (c >> 8)) ^ ((a ^ b) & (d >> 8)))
+
+    a = C ^ (C >> 1)
+    b = D ^ (D >> 1)
+    i0 = x ^ y
+    i1 = b | (0xFFFF ^ (i0 | a))
+    for shift, mask in ((8, 0x00FF00FF), (4, 0x0F0F0F0F), (2, 0x33333333), (1, 0x55555555)):
+        i0 = (i0 | (i0 << shift)) & mask
+        i1 = (i1 | (i1 << shift)) & mask
+    return (i1 << 1) | i0
+
+def _level_bounds(num_items, node_size):
+    """End offset (in box values) of each tree level, leaves first."""
+    bounds = [num_items * 4]
+    n = num_nodes = num_items
+    while True:
+        n = math.ceil(n / node_size)
+        num_nodes += n
+        bounds.append(num_nodes * 4)
+        if n == 1:
+            return bounds
+
+class PackedRTree:
+    """Static R-tree over bounding boxes, packed bottom-up in Hilbert order.
+
+    Boxes are [min_x, min_y, max_x, max_y]; rows of NaN (features without
+    geometry) are kept so ids stay aligned but never match a search. The
+    layout matches Flatbush, so search walks at most one root-to-leaf path
+    per overlapping branch, O(log n) for a point in non-overlapping polygons.
+    """
+
+    def __init__(self, boxes, indices, num_items, node_size=NODE_SIZE):
+        self.boxes = boxes
+        self.indices = indices
+        self.num_items = num_items
+        self.node_size = node_size
+        self.level_bounds = _level_bounds(num_items, node_size)
+
+    @classmethod
+    def build(cls, item_boxes, node_size=NODE_SIZE):
+        item_boxes = np.asarray(item_boxes, dtype=float).reshape(-1, 4)
+        n = len(item_boxes)
+        if not n:
+            raise ValueError("Cannot index zero items")
+        level_bounds = _level_bounds(n, node_size)
+        num_nodes = level_bounds[-1] // 4
+        boxes = np.empty((num_nodes, 4))
+        indices = np.zeros(num_nodes, dtype=np.uint32 if num_nodes >= 16384 else np.uint16)
+
+        # Empty boxes sort last and are stored inverted so nothing intersects them
+        valid = ~np.isnan(item_boxes).any(axis=1)
+        lo = item_boxes[valid, :2].min(axis=0) if valid.any() else np.zeros(2)
+        hi = item_boxes[valid, 2:].max(axis=0) if valid.any() else np.zeros(2)
+        stored = np.where(valid[:, None], item_boxes, [np.inf, np.inf, -np.inf, -np.inf])
+        if n <= node_size:
+            order = np.arange(n)
+        else:
+            span = np.where(hi > lo, hi - lo, 1)
+            centers = (item_boxes[:, :2] + item_boxes[:, 2:]) / 2
+            cells = np.floor(HILBERT_MAX * (np.nan_to_num(centers, nan=0) - lo) / span).astype(np.int64)
+            values = np.where(valid, hilbert(cells[:, 0], cells[:, 1]), np.iinfo(np.int64).max)
+            order = np.argsort(values, kind='stable')
+        boxes[:n] = stored[order]
+        indices[:n] = order
+
+        # Each parent covers node_size consecutive nodes of the level below
+        for level in range(len(level_bounds) - 1):
+            child_start = level_bounds[level - 1] // 4 if level else 0
+            child_end = level_bounds[level] // 4
+            first = np.arange(child_start, child_end, node_size)
+            parents = slice(child_end, level_bounds[level + 1] // 4)
+            children = boxes[child_start:child_end]
+            boxes[parents, :2] = np.minimum.reduceat(children[:, :2], first - child_start)
+            boxes[parents, 2:] = np.maximum.reduceat(children[:, 2:], first - child_start)
+            indices[parents] = first * 4
+        return cls(boxes, indices, n, node_size)
+
+    def search(self, min_x, min_y, max_x, max_y):
+        """Ids of the items whose box intersects the query box."""
+        boxes = self.boxes.reshape(-1)
+        results = []
+        queue = []
+        node = len(boxes) - 4
+        while node is not None:
+            upper = next(bound for bound in self.level_bounds if bound > node)
+            end = min(node + self.node_size * 4, upper)
+            block = self.boxes[node // 4:end // 4]
+            hits = np.flatnonzero((max_x >= block[:, 0]) & (max_y >= block[:, 1]) &
+                                  (min_x <= block[:, 2]) & (min_y <= block[:, 3]))
+            ids = self.indices[node // 4 + hits].tolist()
+            if node >= self.num_items * 4:
+                queue.extend(ids)
+            else:
+                results.extend(ids)
+            node = queue.pop() if queue else None
+        return results
+
+    def to_bytes(self):
+        header = HEADER.pack(MAGIC, (VERSION << 4) + FLOAT64_TYPE, self.node_size, self.num_items)
+        return header + self.boxes.astype('<f8').tobytes() + self.indices.astype(
+            self.indices.dtype.newbyteorder('<')).tobytes()
+
+    @classmethod
+    def from_bytes(cls, data):
+        magic, version_type, node_size, num_items = HEADER.unpack_from(data)
+        if magic != MAGIC or version_type != (VERSION << 4) + FLOAT64_TYPE:
+            raise ValueError("Not a Float64 packed R-tree index")
+        num_nodes = _level_bounds(num_items, node_size)[-1] // 4
+        boxes = np.frombuffer(data, dtype='<f8', count=num_nodes * 4, offset=HEADER.size).reshape(-1, 4)
+        index_type = '<u4' if num_nodes >= 16384 else '<u2'
+        indices = np.frombuffer(data, dtype=index_type, count=num_nodes,
+                                offset=HEADER.size + num_nodes * 32)
+        return cls(boxes, indices, num_items, node_size)
+
+def _feature_rings(feature):
+    geometry = feature.get('geometry')
+    if not geometry:
+        return []
+    polygons = [geometry['coordinates']] if geometry['type'] == 'Polygon' else geometry['coordinates']
+    return [np.asarray(ring, dtype=float)[:, :2] for polygon in polygons for ring in polygon if len(ring)]
+
+def ring_contains(rings, x, y):
+    """Even-odd test over all of a feature's rings, so holes are excluded."""
+    inside = False
+    for ring in rings:
+        xi, yi = ring[:, 0], ring[:, 1]
+        xj, yj = np.roll(xi, 1), np.roll(yi, 1)
+        crosses = (yi > y) != (yj > y)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            edge_x = (xj - xi) * (y - yi) / (yj - yi) + xi
+        inside ^= bool(np.count_nonzero(crosses & (x < edge_x)) % 2)
+    return inside
+
+class PolygonIndex:
+    """Which feature contains a point, by R-tree candidates and a point-in-polygon test."""
+
+    def __init__(self, features, node_size=NODE_SIZE):
+        self.rings = []
+        self.ids = []
+        boxes = []
+        for feature in features:
+            rings = _feature_rings(feature)
+            self.rings.append(rings)
+            self.ids.append((feature.get('properties') or {}).get(ID_FIELD))
+            if rings:
+                points = np.concatenate(rings)
+                boxes.append([*points.min(axis=0), *points.max(axis=0)])
+            else:
+                boxes.append([np.nan] * 4)
+        self.tree = PackedRTree.build(boxes, node_size)
+
+    def locate(self, x, y):
+        """Index of the feature containing (x, y), or None."""
+        for item in sorted(self.tree.search(x, y, x, y), reverse=True):
+            if ring_contains(self.rings[item], x, y):
+                return item
+        return None
+
+    def locate_all(self, points):
+        return [self.locate(x, y) for x, y in points]
+
+class BoxCollector:
+    """[west, south, east, north] of each feature, NaN without geometry, gathered a feature at a time."""
+
+    def __init__(self):
+        self.rows = []
+
+    def add(self, feature):
+        rings = _feature_rings(feature)
+        if rings:
+            points = np.concatenate(rings)
+            self.rows.append([*points.min(axis=0), *points.max(axis=0)])
+        else:
+            self.rows.append([np.nan] * 4)
+
+    def boxes(self):
+        return np.array(self.rows, dtype=float).reshape(-1, 4)
+
+def write_spatial_index(boxes, output_path, node_size=NODE_SIZE):
+    """Write the packed R-tree of the features' bounding boxes and return the item count."""
+    tree = PackedRTree.build(boxes, node_size)
+    with open(output_path, 'wb') as f:
+        f.write(tree.to_bytes())
+    return tree.num_items
+
+def main():
+    parser = argparse.ArgumentParser(description='Find the block group containing each point of a CSV.')
+    parser.add_argument('points', help='CSV with lon and lat columns')
+    parser.add_argument('--base-dir', default="/Users/gaia/Downloads/WalkabilityIndex")
+    parser.add_argument('--geojson', default=GEOJSON_FILE)
+    parser.add_argument('--output', help='CSV to write (default: print a summary only)')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    index = PolygonIndex(FeatureSource(Path(args.base_dir) / args.geojson))
+    build_time = time.perf_counter() - start
+
+    with open(args.points, newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    start = time.perf_counter()
+    found = index.locate_all((float(row['lon']), float(row['lat'])) for row in rows)
+    query_time = time.perf_counter() - start
+
+    if args.output:
+        with open(args.output, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=[*rows[0].keys(), ID_FIELD] if rows else [ID_FIELD])
+            writer.writeheader()
+            for row, item in zip(rows, found):
+                writer.writerow(dict(row, **{ID_FIELD: '' if item is None else index.ids[item]}))
+    matched = sum(item is not None for item in found)
+    print(f"Indexed {len(index.ids):,} features in {build_time:.2f} s")
+    print(f"Located {matched:,} of {len(rows):,} points in {query_time:.2f} s "
+          f"({query_time / max(len(rows), 1) * 1e6:.0f} us per point)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+import argparse
+import json
+import time
+import numpy as np
+
+# Fields tested for spatial clusters and outliers
+OUTLIER_FIELDS = ['NatWalkInd', 'D2A_Ranked', 'D2B_Ranked', 'D3B_Ranked', 'D4A_Ranked']
+
+# Random permutations behind each pseudo p-value, and the seed that makes
+# a build reproducible
+PERMUTATIONS = 999
+SEED = 0
+
+# Pseudo p-value at or below which a local statistic is significant
+SIGNIFICANCE = 0.05
+
+# Distribution outliers: |z| above this, or beyond 1.5 IQR of the quartiles
+Z_THRESHOLD = 3
+IQR_FACTOR = 1.5
+
+# Observations scored together in the local permutation test, bounding its
+# memory to about BLOCK * PERMUTATIONS * max degree values
+BLOCK = 256
+
+# Per-field columns of each block group in the outliers file
+OUTLIER_COLUMNS = ['value', 'localI', 'p', 'cluster', 'z', 'iqr']
+
+def subgraph(indptr, indices, keep):
+    """CSR graph restricted to the kept rows, renumbered in order."""
+    rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+    renumber = np.cumsum(keep) - 1
+    edge = keep[rows] & keep[indices]
+    new_rows = renumber[rows[edge]]
+    new_indptr = np.zeros(int(keep.sum()) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(new_rows, minlength=len(new_indptr) - 1), out=new_indptr[1:])
+    return new_indptr, renumber[indices[edge]]
+
+def spatial_lag(indptr, indices, z):
+    """Row-standardized lag: the mean of each row's neighbours, 0 for islands.
+
+    z may be (n,) or (batch, n); rows are summed with one bincount per batch
+    entry, the CSR sparse product without SciPy.
+    """
+    degree = np.diff(indptr)
+    rows = np.repeat(np.arange(len(degree)), degree)
+    safe = np.where(degree > 0, degree, 1)
+    if z.ndim == 1:
+        return np.bincount(rows, weights=z[indices], minlength=len(degree)) / safe
+    return np.stack([np.bincount(rows, weights=zb[indices], minlength=len(degree)) for zb in z]) / safe
+
+def _pseudo_p(simulated, observed):
+    """Folded permutation p-value, as PySAL computes it: (extremes + 1) / (permutations + 1)."""
+    permutations = simulated.shape[-1]
+    larger = np.count_nonzero(simulated >= observed[..., None], axis=-1)
+    larger = np.minimum(larger, permutations - larger)
+    return (larger + 1) / (permutations + 1)
+
+def moran_global(z, indptr, indices, permutations=PERMUTATIONS, rng=None):
+    """Global Moran's I of standardized values with row-standardized weights.
+
+    Inference permutes the values over the map in batches of whole
+    permutations; returns I, its expectation under no autocorrelation, and
+    the permutation z-score and pseudo p-value.
+    """
+    rng = rng or np.random.default_rng(SEED)
+    n = len(z)
+    s0 = np.count_nonzero(np.diff(indptr))
+    if n < 3 or not s0:
+        return None
+    scale = n / s0 / (z @ z)
+    observed = scale * (z @ spatial_lag(indptr, indices, z))
+    simulated = []
+    for start in range(0, permutations, 32):
+        batch = min(32, permutations - start)
+        shuffled = rng.permuted(np.broadcast_to(z, (batch, n)), axis=1)
+        simulated.append(scale * (shuffled * spatial_lag(indptr, indices, shuffled)).sum(axis=1))
+    simulated = np.concatenate(simulated)
+    std = simulated.std()
+    return {
+        'I': float(observed),
+        'expected': -1 / (n - 1),
+        'z': float((observed - simulated.mean()) / std) if std > 0 else None,
+        'p': float(_pseudo_p(simulated, np.array(observed)))
+    }
+
+def moran_local(z, indptr, indices, permutations=PERMUTATIONS, rng=None):
+    """Local Moran's I_i = z_i * lag_i with a conditional permutation test.
+
+    Each observation's value stays fixed while its k neighbours are replaced
+    by k others drawn at random. As in PySAL, one set of draws is shared by
+    every observation, and an observation's own index is skipped by shifting
+    draws at or above it, so whole blocks of observations with the same
+    degree are scored with a single gather. Returns (I, lag, p); islands get
+    I = 0 and p = NaN.
+    """
+    rng = rng or np.random.default_rng(SEED)
+    n = len(z)
+    degree = np.diff(indptr)
+    lag = spatial_lag(indptr, indices, z)
+    local = z * lag
+    p = np.full(n, np.nan)
+    k_max = int(degree.max()) if n else 0
+    if n < 2 or not k_max:
+        return local, lag, p
+    # Each row is k_max distinct draws from the n - 1 other observations
+    draws = np.stack([rng.choice(n - 1, size=k_max, replace=False) for _ in range(permutations)])
+
+    for k in np.unique(degree[degree > 0]):
+        members = np.flatnonzero(degree == k)
+        for start in range(0, len(members), BLOCK):
+            block = members[start:start + BLOCK]
+            picks = draws[None, :, :k]
+            picks = picks + (picks >= block[:, None, None])
+            simulated = z[block, None] * z[picks].mean(axis=2)
+            p[block] = _pseudo_p(simulated, local[block])
+    return local, lag, p
+
+def clusters(z, lag, p, significance=SIGNIFICANCE):
+    """HH/LL/HL/LH quadrant of each significant observation, '' otherwise."""
+    labels = np.where(z > 0, np.where(lag > 0, 'HH', 'HL'), np.where(lag > 0, 'LH', 'LL'))
+    return np.where(p <= significance, labels, '')
+
+def distribution_outliers(values):
+    """z-scores and IQR flags ('low', 'high' or '') of values without NaNs."""
+    std = values.std(ddof=1) if len(values) > 1 else 0
+    z = (values - values.mean()) / std if std > 0 else np.zeros(len(values))
+    q1, q3 = np.quantile(values, [0.25, 0.75])
+    fence = IQR_FACTOR * (q3 - q1)
+    iqr = np.where(values < q1 - fence, 'low', np.where(values > q3 + fence, 'high', ''))
+    return z, iqr
+
+def _round(value, digits=4):
+    return None if value is None or not np.isfinite(value) else round(float(value), digits)
+
+def spatial_outliers(columns, ids, indptr, indices, fields=OUTLIER_FIELDS,
+                     permutations=PERMUTATIONS, seed=SEED):
+    """Global and local Moran's I plus z-score and IQR outliers per field.
+
+    columns maps field to a value per row of the CSR contiguity graph and
+    ids holds each row's GEOID10. Rows missing a field are left out of that
+    field's statistics, along with their links. Only block groups flagged
+    in some field are listed, with every field's columns so pages can show
+    their other indicators.
+    """
+    rng = np.random.default_rng(seed)
+    results = {'global': {}}
+    per_field = {}
+    for field in fields:
+        values = np.asarray(columns[field], dtype=float)
+        keep = ~np.isnan(values)
+        if keep.sum() < 3:
+            continue
+        field_indptr, field_indices = subgraph(indptr, indices, keep)
+        kept = values[keep]
+        z = (kept - kept.mean()) / (kept.std() or 1)
+        results['global'][field] = moran_global(z, field_indptr, field_indices, permutations, rng)
+        local, lag, p = moran_local(z, field_indptr, field_indices, permutations, rng)
+        z_scores, iqr = distribution_outliers(kept)
+        per_field[field] = (np.flatnonzero(keep), kept, local, p, clusters(z, lag, p), z_scores, iqr)
+
+    # Block groups flagged as a significant cluster or outlier in any field
+    flagged = np.zeros(len(ids), dtype=bool)
+    for rows, _, _, _, cluster, z_scores, iqr in per_field.values():
+        flagged[rows] |= (cluster != '') | (np.abs(z_scores) > Z_THRESHOLD) | (iqr != '')
+    block_groups = {}
+    for field, (rows, kept, local, p, cluster, z_scores, iqr) in per_field.items():
+        for i in np.flatnonzero(flagged[rows]):
+            block_groups.setdefault(ids[rows[i]], {})[field] = [
+                _round(kept[i]), _round(local[i]), _round(p[i]), str(cluster[i]),
+                _round(z_scores[i], 2), str(iqr[i])]
+    results.update({
+        'permutations': permutations,
+        'seed': seed,
+        'significance': SIGNIFICANCE,
+        'columns': OUTLIER_COLUMNS,
+        'blockGroups': block_groups
+    })
+    return results
+
+def write_outliers(results, output_path):
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, separators=(',', ':'))
+
+def lattice(side):
+    """Queen contiguity of a side x side grid, as CSR, for timing."""
+    cells = np.arange(side * side).reshape(side, side)
+    pairs = []
+    for dy, dx in ((0, 1), (1, 0), (1, 1), (1, -1)):
+        a = cells[:side - dy, max(0, -dx):side - max(0, dx)]
+        b = cells[dy:, max(0, dx):side + min(0, dx)]
+        pairs.append(np.column_stack([a.ravel(), b.ravel()]))
+    pairs = np.concatenate(pairs)
+    n = side * side
+    codes = np.unique(np.concatenate([pairs[:, 0] * n + pairs[:, 1], pairs[:, 1] * n + pairs[:, 0]]))
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(codes // n, minlength=n), out=indptr[1:])
+    return indptr, codes % n
+
+def main():
+    parser = argparse.ArgumentParser(description="Time Moran's I on a national-size lattice.")
+    parser.add_argument('--side', type=int, default=470, help='grid side; 470 gives ~220k block groups')
+    parser.add_argument('--permutations', type=int, default=PERMUTATIONS)
+    args = parser.parse_args()
+
+    indptr, indices = lattice(args.side)
+    n = len(indptr) - 1
+    rng = np.random.default_rng(1)
+    # A smooth surface plus noise, with a few planted hot and cold spots
+    y, x = np.divmod(np.arange(n), args.side)
+    values = np.sin(x / 40) + np.cos(y / 55) + rng.normal(0, 0.5, n)
+    values[rng.choice(n, 50, replace=False)] += 6
+    columns = {'NatWalkInd': values}
+    ids = [str(i) for i in range(n)]
+
+    start = time.perf_counter()
+    results = spatial_outliers(columns, ids, indptr, indices, ['NatWalkInd'], args.permutations)
+    elapsed = time.perf_counter() - start
+    stats = results['global']['NatWalkInd']
+    print(f"{n:,} block groups, {len(indices) // 2:,} links, {args.permutations} permutations: "
+          f"{elapsed:.1f} s")
+    print(f"  global I {stats['I']:.3f} (z {stats['z']:.1f}, p {stats['p']:.3f}), "
+          f"{len(results['blockGroups']):,} block groups flagged")
+
+if __name__ == "__main__":
+    main()
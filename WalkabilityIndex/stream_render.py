@@ -0,0 +1,114 @@
+import hashlib
+import json
+import re
+import shutil
+import tempfile
+
+# Placeholders the integrator templates are split at
+PLACEHOLDERS = ['{{TUFTE_STYLES}}', '{{SECTIONS}}', '{{TUFTE_SCRIPTS}}']
+
+# Section HTML above this size is spooled to a temporary file
+SPOOL_MAX_SIZE = 1 << 20
+
+def split_template(template):
+    """Split a template at its placeholders.
+
+    Returns (chunks, placeholders) where the chunks are the literal text
+    between placeholders, so len(chunks) == len(placeholders) + 1.
+    """
+    pattern = '(' + '|'.join(re.escape(placeholder) for placeholder in PLACEHOLDERS) + ')'
+    parts = re.split(pattern, template)
+    return parts[0::2], parts[1::2]
+
+def fragment_key(fragment):
+    """Key a CSS string or script dict by its src or a hash of its content."""
+    if isinstance(fragment, dict) and 'src' in fragment:
+        return 'src:' + fragment['src']
+    text = fragment if isinstance(fragment, str) else fragment.get('content', '')
+    return 'sha256:' + hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def template_script_keys(template):
+    """Return keys for the external scripts a template already loads."""
+    return {'src:' + src for src in re.findall(r'<script src="([^"]+)"', template)}
+
+class OrderedFragments:
+    """Insertion-ordered, de-duplicated collection of styles or scripts.
+
+    Output is reproducible across runs and each stylesheet, external script
+    and inline script is emitted only once.
+    """
+
+    def __init__(self, exclude=()):
+        self.fragments = {}
+        self.exclude = set(exclude)
+
+    def add(self, fragment):
+        key = fragment_key(fragment)
+        if key not in self.exclude and key not in self.fragments:
+            self.fragments[key] = fragment
+
+    def update(self, fragments):
+        for fragment in fragments:
+            self.add(fragment)
+
+    def __iter__(self):
+        return iter(self.fragments.values())
+
+    def __len__(self):
+        return len(self.fragments)
+
+def render_template(stream, template_parts, writers):
+    """Write a split template, calling writers[placeholder](stream) for each placeholder."""
+    chunks, placeholders = template_parts
+    stream.write(chunks[0])
+    for placeholder, chunk in zip(placeholders, chunks[1:]):
+        writers[placeholder](stream)
+        stream.write(chunk)
+
+def section_spool():
+    """Return a text buffer for section HTML that spills to disk when large."""
+    return tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE, mode='w+', encoding='utf-8')
+
+def copy_spool(spool, stream):
+    """Copy everything written to a section spool into stream."""
+    spool.seek(0)
+    shutil.copyfileobj(spool, stream)
+
+def write_styles(stream, styles):
+    """Write collected page CSS as a single <style> block."""
+    stream.write('<style>')
+    for css in styles:
+        stream.write(css)
+    stream.write('</style>')
+
+def compact_json(data):
+    """Serialize data as compact JSON that is safe inside a <script> element."""
+    return json.dumps(data, separators=(',', ':')).replace('</', '<\\/')
+
+def write_data_blocks(stream, blocks):
+    """Write build-time data as JSON <script> blocks that page scripts can read by id."""
+    for element_id, data in blocks.items():
+        stream.write(f'<script type="application/json" id="{element_id}">')
+        stream.write(compact_json(data))
+        stream.write('</script>\n')
+
+def block_scoped(scripts):
+    """Wrap each inline page script in a block so its top-level const/let stay its own.
+
+    Pages written to stand alone declare the same names (width, height,
+    svg), which is a redeclaration SyntaxError once they share a document.
+    Function declarations in a block still become globals in non-module
+    scripts, so handlers a page looks up by name keep working.
+    """
+    return [{**script, 'content': '{\n' + script['content'] + '\n}'} if 'content' in script else script
+            for script in scripts]
+
+def write_scripts(stream, scripts):
+    """Write collected page scripts, one tag per line."""
+    for i, script in enumerate(scripts):
+        if i:
+            stream.write('\n')
+        if 'src' in script:
+            stream.write(f'<script src="{script["src"]}"></script>')
+        elif 'content' in script:
+            stream.write(f'<script>{script["content"]}</script>')
@@ -0,0 +1,142 @@
+import io
+import numpy as np
+
+# d3.interpolateViridis's 256-colour ramp, as in d3-scale-chromatic
+VIRIDIS = (
+    "44015444025645045745055946075a46085c460a5d460b5e470d60470e6147106347116447136548146748166848176948"
+    "186a481a6c481b6d481c6e481d6f481f70482071482173482374482475482576482677482878482979472a7a472c7a472d"
+    "7b472e7c472f7d46307e46327e46337f463480453581453781453882443983443a83443b84433d84433e85423f85424086"
+    "4241864142874144874045884046883f47883f48893e49893e4a893e4c8a3d4d8a3d4e8a3c4f8a3c508b3b518b3b528b3a"
+    "538b3a548c39558c39568c38588c38598c375a8c375b8d365c8d365d8d355e8d355f8d34608d34618d33628d33638d3264"
+    "8e32658e31668e31678e31688e30698e306a8e2f6b8e2f6c8e2e6d8e2e6e8e2e6f8e2d708e2d718e2c718e2c728e2c738e"
+    "2b748e2b758e2a768e2a778e2a788e29798e297a8e297b8e287c8e287d8e277e8e277f8e27808e26818e26828e26828e25"
+    "838e25848e25858e24868e24878e23888e23898e238a8d228b8d228c8d228d8d218e8d218f8d21908d21918c20928c2092"
+    "8c20938c1f948c1f958b1f968b1f978b1f988b1f998a1f9a8a1e9b8a1e9c891e9d891f9e891f9f881fa0881fa1881fa187"
+    "1fa28720a38620a48621a58521a68522a78522a88423a98324aa8325ab8225ac8226ad8127ad8128ae8029af7f2ab07f2c"
+    "b17e2db27d2eb37c2fb47c31b57b32b67a34b67935b77937b87838b9773aba763bbb753dbc743fbc7340bd7242be7144bf"
+    "7046c06f48c16e4ac16d4cc26c4ec36b50c46a52c56954c56856c66758c7655ac8645cc8635ec96260ca6063cb5f65cb5e"
+    "67cc5c69cd5b6ccd5a6ece5870cf5773d05675d05477d1537ad1517cd2507fd34e81d34d84d44b86d54989d5488bd6468e"
+    "d64590d74393d74195d84098d83e9bd93c9dd93ba0da39a2da37a5db36a8db34aadc32addc30b0dd2fb2dd2db5de2bb8de"
+    "29bade28bddf26c0df25c2df23c5e021c8e020cae11fcde11dd0e11cd2e21bd5e21ad8e219dae319dde318dfe318e2e418"
+    "e5e419e7e419eae51aece51befe51cf1e51df4e61ef6e620f8e621fbe723fde725"
+)
+VIRIDIS_COLORS = ['#' + VIRIDIS[i:i + 6] for i in range(0, len(VIRIDIS), 6)]
+
+# Size the map is rendered at; the SVG scales to its container through its viewBox
+MAP_WIDTH = 960
+MAP_HEIGHT = 600
+
+# Features above which map sections draw to a canvas instead of one SVG
+# path each; pages use the same default when no threshold is embedded
+CANVAS_THRESHOLD = 20000
+
+# Decimals kept in path coordinates; a tenth of a pixel is below what a screen shows
+PATH_DIGITS = 1
+
+def interpolate_viridis(t):
+    """Colour at t in [0, 1], indexing the ramp the way d3's ramp() does."""
+    n = len(VIRIDIS_COLORS)
+    return VIRIDIS_COLORS[max(0, min(n - 1, int(np.floor(t * n))))]
+
+def sequential_color(value, extent):
+    """d3.scaleSequential(d3.interpolateViridis).domain(extent), unclamped; None for missing values."""
+    if value is None or np.isnan(value):
+        return None
+    x0, x1 = extent
+    return interpolate_viridis((value - x0) * (0 if x0 == x1 else 1 / (x1 - x0)))
+
+def mercator(points):
+    """Spherical Mercator of (longitude, latitude) degrees, with y pointing down as on screen."""
+    lam = np.radians(points[:, 0])
+    phi = np.radians(points[:, 1])
+    return np.column_stack([lam, -np.log(np.tan((np.pi / 2 + phi) / 2))])
+
+def _polygons(geometry):
+    if not geometry:
+        return []
+    if geometry['type'] == 'Polygon':
+        return [geometry['coordinates']]
+    if geometry['type'] == 'MultiPolygon':
+        return geometry['coordinates']
+    raise ValueError(f"Unsupported geometry type {geometry['type']}")
+
+def _projected_rings(feature):
+    for polygon in _polygons(feature.get('geometry')):
+        for ring in polygon:
+            if len(ring):
+                yield mercator(np.asarray(ring, dtype=float)[:, :2])
+
+def fit_size(feature_rings, width, height):
+    """Scale and translate that fit the projected rings to width x height, as fitSize does."""
+    lo = np.array([np.inf, np.inf])
+    hi = np.array([-np.inf, -np.inf])
+    for rings in feature_rings:
+        for ring in rings:
+            lo = np.minimum(lo, ring.min(axis=0))
+            hi = np.maximum(hi, ring.max(axis=0))
+    if not np.isfinite(lo).all():
+        return 1.0, np.zeros(2)
+    span = np.maximum(hi - lo, 1e-12)
+    k = min(width / span[0], height / span[1])
+    return k, (np.array([width, height]) - k * (hi + lo)) / 2
+
+def ring_path(ring, digits=PATH_DIGITS):
+    """SVG path data for one closed ring, without the repeated closing point.
+
+    Points that round onto the previous one are dropped; rings left with
+    fewer than three points are too small to see and return ''.
+    """
+    points = np.round(ring, digits) + 0.0
+    keep = np.ones(len(points), dtype=bool)
+    keep[1:] = (points[1:] != points[:-1]).any(axis=1)
+    points = points[keep]
+    if len(points) > 1 and (points[0] == points[-1]).all():
+        points = points[:-1]
+    if len(points) < 3:
+        return ''
+    return 'M' + 'L'.join('%g,%g' % tuple(point) for point in points.tolist()) + 'Z'
+
+def render_choropleth(feature_rings, values, extent, width=MAP_WIDTH, height=MAP_HEIGHT,
+                      digits=PATH_DIGITS):
+    """Render projected features as a Mercator choropleth <svg>, one <path> per feature.
+
+    feature_rings holds each feature's projected rings, as ChoroplethCollector
+    gathers them, values each feature's value in order, and extent is the
+    colour scale's domain. Paths keep the features' order, including empty
+    ones for features without geometry, so a page can bind data to them by
+    index.
+    """
+    k, (tx, ty) = fit_size(feature_rings, width, height)
+    out = io.StringIO()
+    out.write(f'<svg class="prerendered-map" width="100%" height="{height}" '
+              f'viewBox="0 0 {width} {height}">')
+    for rings, value in zip(feature_rings, values):
+        d = ''.join(ring_path(ring * k + (tx, ty), digits) for ring in rings)
+        fill = sequential_color(value, extent)
+        out.write('<path')
+        if d:
+            out.write(f' d="{d}"')
+        if fill:
+            out.write(f' fill="{fill}"')
+        out.write(' opacity="0.8"></path>')
+    out.write('</svg>')
+    return out.getvalue()
+
+class ChoroplethCollector:
+    """Projected rings of each feature for render_choropleth, gathered a feature at a time.
+
+    Past limit features the page draws to a canvas instead, so the rings are
+    dropped and only the count is kept.
+    """
+
+    def __init__(self, limit=CANVAS_THRESHOLD):
+        self.limit = limit
+        self.count = 0
+        self.rings = []
+
+    def add(self, feature):
+        self.count += 1
+        if self.count > self.limit:
+            self.rings = None
+        else:
+            self.rings.append(list(_projected_rings(feature)))
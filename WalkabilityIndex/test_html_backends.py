@@ -0,0 +1,24 @@
+from pathlib import Path
+import pytest
+from bs4 import BeautifulSoup
+from html_backends import available_backends, parse_page
+from parser_bench import backend_mismatches
+
+HERE = Path(__file__).resolve().parent
+
+MARKUP = """<html><head><title>T</title></head><body>
+    <div class=" chart  wide" id="map" data-x='say "hi"'>
+        <p>A &amp; B &lt; C&nbsp;D</p><br><input disabled>
+        <!-- note -->
+        <svg viewBox="0 0 10 10"><path d="M0 0L10 10"/></svg>
+        <pre>  kept   as is
+        </pre>
+    </div>
+</body></html>"""
+
+@pytest.mark.parametrize('backend', available_backends())
+def test_body_matches_beautifulsoup(backend):
+    assert parse_page(MARKUP, backend).body() == str(BeautifulSoup(MARKUP, 'html.parser').body)
+
+def test_pages_extract_identically():
+    assert backend_mismatches(HERE) == []
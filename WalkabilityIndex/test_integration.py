@@ -0,0 +1,48 @@
+import shutil
+import subprocess
+from pathlib import Path
+import pytest
+from white_theme_complete import WhiteThemeIntegrator
+
+HERE = Path(__file__).resolve().parent
+
+# Runs every inline script of a page in one shared global scope, as a
+# browser does, and reports the ones that don't parse; runtime errors from
+# the missing DOM and d3 are expected and ignored
+SCRIPT_CHECK = """
+const fs = require('fs'), vm = require('vm');
+const html = fs.readFileSync(process.argv[1], 'utf8');
+const tags = /<script(\\s[^>]*)?>([\\s\\S]*?)<\\/script>/g;
+const context = vm.createContext({});
+let match, index = 0, errors = 0;
+while ((match = tags.exec(html))) {
+    if (!/src=|application\\/json/.test(match[1] || '')) {
+        try { vm.runInContext(match[2], context); } catch (e) {
+            if (e && e.name === 'SyntaxError') { console.log(`script ${index}: ${e.message}`); errors++; }
+        }
+    }
+    index++;
+}
+process.exit(errors ? 1 : 0);
+"""
+
+@pytest.fixture
+def integrated(tmp_path):
+    shutil.copytree(HERE / 'tufte_tests', tmp_path / 'tufte_tests')
+    for data_file in HERE.glob('*_data.json'):
+        shutil.copy(data_file, tmp_path)
+    WhiteThemeIntegrator(tmp_path).save_integrated_html('integrated.html')
+    return tmp_path / 'integrated.html'
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='node is not installed')
+def test_every_script_parses_together(integrated):
+    result = subprocess.run(['node', '-e', SCRIPT_CHECK, str(integrated)],
+                            capture_output=True, text=True)
+    assert result.returncode == 0, result.stdout + result.stderr
+
+def test_structure_diagram_targets_its_container(integrated):
+    html = integrated.read_text(encoding='utf-8')
+    assert "document.querySelector('.structure-tree')" in html
+    assert 'class="structure-tree"' in html
+    assert "querySelector('.structure-diagram')" not in html
+    assert 'class="structure-diagram"' not in html
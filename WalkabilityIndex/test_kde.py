@@ -0,0 +1,19 @@
+import numpy as np
+from kde import KDE_TOLERANCE, binned_kde, exact_kde, kde_error
+
+def test_binned_matches_exact_sum():
+    rng = np.random.default_rng(0)
+    # Skewed and bimodal, like NatWalkInd across urban and suburban block groups
+    values = np.concatenate([rng.normal(6, 2, 20000), rng.normal(14, 1.5, 5000)])
+    assert kde_error(values, binned_kde(values)) < KDE_TOLERANCE
+
+def test_given_bandwidth_and_missing_values():
+    values = np.array([1.0, 2.0, np.nan, 2.5, 9.0])
+    curve = binned_kde(values, bandwidth=1.0, points=64)
+    assert curve['bandwidth'] == 1.0 and len(curve['x']) == 64
+    assert curve['x'][0] == 1.0 and curve['x'][-1] == 9.0
+    exact = exact_kde(values, curve['x'], 1.0)
+    assert np.abs(np.array(curve['density']) - exact).max() < KDE_TOLERANCE * exact.max()
+
+def test_no_values():
+    assert binned_kde([np.nan, np.nan]) is None
@@ -0,0 +1,48 @@
+import numpy as np
+from nearest import EARTH_RADIUS_KM, CentroidTree
+
+def haversine_km(lonlat, lon, lat):
+    lam, phi = np.radians(lonlat[:, 0]), np.radians(lonlat[:, 1])
+    lam0, phi0 = np.radians(lon), np.radians(lat)
+    h = np.sin((phi - phi0) / 2) ** 2 + np.cos(phi) * np.cos(phi0) * np.sin((lam - lam0) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(h))
+
+def random_tree(n=5000, seed=0):
+    rng = np.random.default_rng(seed)
+    # Block groups around Atlanta, as the sample data has
+    lonlat = np.column_stack([rng.uniform(-84.8, -84.0, n), rng.uniform(33.4, 34.2, n)])
+    values = rng.uniform(1, 20, n)
+    values[rng.random(n) < 0.05] = np.nan
+    return CentroidTree.build(lonlat, [f'{i:012d}' for i in range(n)], values, leaf_size=8)
+
+def brute_force(tree, lon, lat, k=None, radius_km=None, min_value=None, max_value=None):
+    distances = haversine_km(tree.lonlat, lon, lat)
+    keep = np.ones(len(distances), dtype=bool)
+    if radius_km is not None:
+        keep &= distances <= radius_km
+    if min_value is not None:
+        keep &= tree.values >= min_value
+    if max_value is not None:
+        keep &= tree.values <= max_value
+    found = sorted((distances[i], i) for i in np.flatnonzero(keep))[:k]
+    return [i for _, i in found], np.array([d for d, _ in found])
+
+def test_queries_match_brute_force():
+    tree = random_tree()
+    rng = np.random.default_rng(1)
+    for lon, lat in zip(rng.uniform(-85, -83.8, 20), rng.uniform(33.2, 34.4, 20)):
+        for options in [{'k': 1}, {'k': 25}, {'radius_km': 3}, {'k': 10, 'radius_km': 2},
+                        {'k': 15, 'min_value': 12}, {'radius_km': 5, 'min_value': 4, 'max_value': 9}]:
+            found = tree.query(lon, lat, **options)
+            indexes, distances = brute_force(tree, lon, lat, **options)
+            assert [index for index, _ in found] == indexes
+            assert np.allclose([distance for _, distance in found], distances, atol=1e-9)
+
+def test_most_walkable_leaves_out_missing_values():
+    tree = random_tree()
+    found = tree.most_walkable(-84.4, 33.75, 4, k=50)
+    values = tree.values[[index for index, _ in found]]
+    distances = haversine_km(tree.lonlat, -84.4, 33.75)
+    ranked = np.flatnonzero((distances <= 4) & ~np.isnan(tree.values))
+    assert not np.isnan(values).any()
+    assert list(values) == sorted(tree.values[ranked], reverse=True)[:50]
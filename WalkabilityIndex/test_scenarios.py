@@ -0,0 +1,53 @@
+import numpy as np
+from scenarios import INDEX_FIELD, INDICATORS, ScenarioCache, baseline_error, evaluate
+
+def epa_columns(n=200, seed=0):
+    """Ranked indicators with NatWalkInd computed and rounded the way EPA publishes it."""
+    rng = np.random.default_rng(seed)
+    columns = {field: rng.integers(1, 21, n).astype(float) for field in INDICATORS}
+    columns[INDEX_FIELD] = np.round(columns['D2A_Ranked'] / 6 + columns['D2B_Ranked'] / 6 +
+                                    columns['D3B_Ranked'] / 3 + columns['D4A_Ranked'] / 3, 4)
+    return columns
+
+def test_weights_match_epa():
+    # A baseline scenario recomputed from the ranks reproduces the published index
+    assert baseline_error(epa_columns()) < 1e-3
+
+def test_unchanged_scenario_reproduces_index():
+    columns = epa_columns()
+    results = evaluate(columns, [{'name': 'baseline'}])
+    assert np.allclose(results[0], columns[INDEX_FIELD], atol=1e-4)
+
+def test_changes_are_weighted_and_clamped():
+    columns = epa_columns()
+    ids = [('13121' if i % 2 else '13089') + f'{i:06d}' for i in range(len(columns[INDEX_FIELD]))]
+    scenarios = [
+        {'name': 'transit', 'changes': {'D4A_Ranked': {'add': 2}}, 'where': ['13121']},
+        {'name': 'mix', 'changes': {'D2A_Ranked': {'set': 20}, 'D2B_Ranked': {'scale': 0.5}}}
+    ]
+    results = evaluate(columns, scenarios, ids)
+    d4a = columns['D4A_Ranked']
+    in_county = np.array([i.startswith('13121') for i in ids])
+    expected = columns[INDEX_FIELD] + np.where(in_county, (np.minimum(d4a + 2, 20) - d4a) / 3, 0)
+    assert np.allclose(results[0], expected, atol=1e-4)
+    d2a, d2b = columns['D2A_Ranked'], columns['D2B_Ranked']
+    expected = columns[INDEX_FIELD] + (20 - d2a) / 6 + (np.maximum(d2b * 0.5, 1) - d2b) / 6
+    assert np.allclose(results[1], expected, atol=1e-4)
+
+def test_missing_changed_indicator_is_nan():
+    columns = epa_columns(10)
+    columns['D3B_Ranked'][3] = np.nan
+    results = evaluate(columns, [{'name': 'grid', 'changes': {'D3B_Ranked': {'add': 1}}},
+                                 {'name': 'transit', 'changes': {'D4A_Ranked': {'add': 1}}}])
+    assert np.isnan(results[0, 3]) and np.isfinite(np.delete(results[0], 3)).all()
+    assert np.isfinite(results[1]).all()
+
+def test_cache_keys_ignore_names(tmp_path):
+    columns = epa_columns()
+    cache = ScenarioCache(tmp_path, columns)
+    scenario = {'name': 'grid', 'changes': {'D3B_Ranked': {'add': 2}}}
+    (key, values), = cache.results([scenario])
+    (renamed_key, cached), = cache.results([dict(scenario, name='renamed')])
+    assert key == renamed_key
+    assert np.array_equal(values, cached)
+    assert len(list(tmp_path.iterdir())) == 1
@@ -0,0 +1,45 @@
+import numpy as np
+from simplify import TopologySimplifier, effective_areas
+from topojson_convert import OBJECT_NAME, delta_decode, delta_encode
+
+def topology(arcs, rings):
+    return {'type': 'Topology', 'arcs': [delta_encode(np.array(arc)) for arc in arcs],
+            'objects': {OBJECT_NAME: {'type': 'GeometryCollection',
+                                      'geometries': [{'type': 'Polygon', 'arcs': [ring]} for ring in rings]}}}
+
+def test_collinear_runs_go_first():
+    # A square's outline with ten points along each side
+    side = np.arange(10)
+    outline = np.concatenate([np.c_[side, side * 0], np.c_[side * 0 + 10, side],
+                              np.c_[10 - side, side * 0 + 10], np.c_[side * 0, 10 - side], [[0, 0]]])
+    weights = effective_areas(outline, np.array([len(outline)]))
+    corners = [10, 20, 30]
+    assert np.isinf(weights[[0, -1]]).all()
+    assert (weights[corners] > 0).all()
+    assert (np.delete(weights, corners + [0, len(outline) - 1]) == 0).all()
+
+def test_arcs_are_eliminated_independently():
+    rng = np.random.default_rng(0)
+    lengths = np.array([2, 50, 3, 200])
+    points = np.cumsum(rng.integers(-1000, 1000, (lengths.sum(), 2)), axis=0)
+    weights = effective_areas(points, lengths)
+    for start, length in zip(np.cumsum(lengths) - lengths, lengths):
+        alone = effective_areas(points[start:start + length], np.array([length]))
+        assert np.array_equal(weights[start:start + length], alone)
+
+def test_levels_keep_rings_and_shared_arcs():
+    # Two squares sharing a jagged edge, and a sliver that would collapse
+    edge = [[10 + y % 2, y] for y in range(11)]
+    left = [[10, 10], [0, 10], [0, 0], [10, 0]]
+    right = [[10, 0], [20, 0], [20, 10], [10, 10]]
+    sliver = [[30, 0], [31, 5], [30, 10], [30, 0]]
+    simplifier = TopologySimplifier(topology([edge, left, right, sliver], [[0, 1], [~0, 2], [3]]), OBJECT_NAME)
+    coarse, fine = simplifier.levels([20.0, 0.1])
+    coarse_arcs = [delta_decode(arc) for arc in coarse['arcs']]
+    assert len(coarse_arcs[0]) == 2
+    assert len(delta_decode(fine['arcs'][0])) == len(edge)
+    assert len(coarse_arcs[3]) == 4
+    # At an area above the squares' corners they would collapse, so they stay whole
+    collapsed, = simplifier.levels([100.0])
+    assert len(delta_decode(collapsed['arcs'][1])) == len(left)
+    assert simplifier.point_count(coarse['arcs']) < simplifier.point_count(fine['arcs']) == simplifier.point_count()
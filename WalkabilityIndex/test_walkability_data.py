@@ -0,0 +1,42 @@
+import io
+import json
+import pytest
+import walkability_data
+from walkability_data import _read_collection, iter_features
+
+FEATURES = [
+    {'type': 'Feature', 'properties': {'GEOID10': '131210001001', 'NatWalkInd': 14.5,
+                                       'name': 'Five Points, "downtown" ] }'},
+     'geometry': {'type': 'Polygon', 'coordinates': [[[-84.39, 33.75], [-84.38, 33.75],
+                                                      [-84.38, 33.76], [-84.39, 33.75]]]}},
+    {'type': 'Feature', 'properties': {'GEOID10': '131210002002', 'NatWalkInd': None, 'note': 'café'},
+     'geometry': None},
+    {'type': 'Feature', 'properties': {}, 'geometry': {'type': 'MultiPolygon', 'coordinates': [
+        [[[0, 0], [1e-7, 0], [0, 1], [0, 0]]], [[[2, 2], [3, 2], [2, 3], [2, 2]]]]}}
+]
+
+# A name before the features array mentions it, and a bbox follows it
+COLLECTION = ('{"type": "FeatureCollection", "name": "\\"features\\": [",\n "features" :\n [\n  ' +
+              ',\n  '.join(json.dumps(feature) for feature in FEATURES) +
+              '\n ], "bbox": [-84.39, 33.75, 3, 3]}\n')
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 7, 16, 64, 1 << 16])
+def test_collection_matches_json_load(monkeypatch, chunk_size):
+    monkeypatch.setattr(walkability_data, 'CHUNK_SIZE', chunk_size)
+    assert list(_read_collection(io.StringIO(COLLECTION))) == json.loads(COLLECTION)['features']
+
+def test_empty_and_unterminated_collections(monkeypatch):
+    monkeypatch.setattr(walkability_data, 'CHUNK_SIZE', 4)
+    assert list(_read_collection(io.StringIO('{"type": "FeatureCollection", "features": []}'))) == []
+    unterminated = COLLECTION[:COLLECTION.index('\n ], "bbox"')]
+    with pytest.raises(ValueError):
+        list(_read_collection(io.StringIO(unterminated)))
+
+def test_sequence_files(tmp_path):
+    # NDJSON lines and RS-prefixed GeoJSONSeq records, with blank lines between
+    ndjson = tmp_path / 'features.ndjson'
+    ndjson.write_text('\n'.join(json.dumps(feature) for feature in FEATURES) + '\n\n', encoding='utf-8')
+    seq = tmp_path / 'features.geojsonseq'
+    seq.write_text(''.join('\x1e' + json.dumps(feature) + '\n' for feature in FEATURES), encoding='utf-8')
+    assert list(iter_features(ndjson)) == FEATURES
+    assert list(iter_features(seq)) == FEATURES
@@ -0,0 +1,153 @@
+import json
+
+class TreeNode:
+    """Working node of the Reingold-Tilford layout, as in d3-hierarchy's tree()."""
+
+    def __init__(self, data, index, parent=None, depth=0):
+        self.data = data
+        self.i = index
+        self.parent = parent
+        self.depth = depth
+        self.children = None
+        self.A = None     # default ancestor
+        self.a = self     # ancestor
+        self.z = 0.0      # prelim
+        self.m = 0.0      # mod
+        self.c = 0.0      # change
+        self.s = 0.0      # shift
+        self.t = None     # thread
+        self.x = 0.0
+
+def _separation(a, b):
+    """d3.tree's default: siblings one unit apart, cousins two."""
+    return 1 if a.parent is b.parent else 2
+
+def _next_left(v):
+    return v.children[0] if v.children else v.t
+
+def _next_right(v):
+    return v.children[-1] if v.children else v.t
+
+def _move_subtree(wm, wp, shift):
+    change = shift / (wp.i - wm.i)
+    wp.c -= change
+    wp.s += shift
+    wm.c += change
+    wp.z += shift
+    wp.m += shift
+
+def _execute_shifts(v):
+    shift = change = 0.0
+    for w in reversed(v.children):
+        w.z += shift
+        w.m += shift
+        change += w.c
+        shift += w.s + change
+
+def _next_ancestor(vim, v, ancestor):
+    return vim.a if vim.a.parent is v.parent else ancestor
+
+def _apportion(v, w, ancestor):
+    if w is None:
+        return ancestor
+    vip = vop = v
+    vim = w
+    vom = vip.parent.children[0]
+    sip, sop, sim, som = vip.m, vop.m, vim.m, vom.m
+    while True:
+        vim, vip = _next_right(vim), _next_left(vip)
+        if vim is None or vip is None:
+            break
+        vom = _next_left(vom)
+        vop = _next_right(vop)
+        vop.a = v
+        shift = vim.z + sim - vip.z - sip + _separation(vim, vip)
+        if shift > 0:
+            _move_subtree(_next_ancestor(vim, v, ancestor), v, shift)
+            sip += shift
+            sop += shift
+        sim += vim.m
+        sip += vip.m
+        som += vom.m
+        sop += vop.m
+    if vim is not None and _next_right(vop) is None:
+        vop.t = vim
+        vop.m += sim - sop
+    if vip is not None and _next_left(vom) is None:
+        vom.t = vip
+        vom.m += sip - som
+        ancestor = v
+    return ancestor
+
+def _build(data):
+    """Wrap a {name, children} hierarchy in TreeNodes; returns (root, nodes in pre-order)."""
+    sentinel = TreeNode(None, 0)
+    root = TreeNode(data, 0, sentinel)
+    sentinel.children = [root]
+    order = []
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        order.append(node)
+        children = node.data.get('children') or []
+        if children:
+            node.children = [TreeNode(child, i, node, node.depth + 1)
+                             for i, child in enumerate(children)]
+            stack.extend(reversed(node.children))
+    return root, order
+
+def tidy_tree(data):
+    """Lay out a {name, children} hierarchy the way d3.tree().size([1, 1]) does.
+
+    Returns {'x': [...], 'y': [...]} in pre-order (d3's eachBefore order),
+    with breadth x and depth y normalized to [0, 1], so a page scales them
+    to its own size without running the layout.
+    """
+    root, order = _build(data)
+
+    # Post-order with children left to right, so each node's left sibling
+    # is placed before it
+    post_order = []
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        post_order.append(node)
+        stack.extend(node.children or [])
+    post_order.reverse()
+
+    # First walk in post-order, second in pre-order, as in d3's tree()
+    for v in post_order:
+        siblings = v.parent.children
+        w = siblings[v.i - 1] if v.i else None
+        if v.children:
+            _execute_shifts(v)
+            midpoint = (v.children[0].z + v.children[-1].z) / 2
+            if w is not None:
+                v.z = w.z + _separation(v, w)
+                v.m = v.z - midpoint
+            else:
+                v.z = midpoint
+        elif w is not None:
+            v.z = w.z + _separation(v, w)
+        v.parent.A = _apportion(v, w, v.parent.A or siblings[0])
+    root.parent.m = -root.z
+    for v in order:
+        v.x = v.z + v.parent.m
+        v.m += v.parent.m
+
+    # Fit the breadth to [0, 1] with half a separation of margin at each end
+    left = min(order, key=lambda node: node.x)
+    right = max(order, key=lambda node: node.x)
+    bottom = max(node.depth for node in order)
+    s = 1 if left is right else _separation(left, right) / 2
+    tx = s - left.x
+    kx = 1 / (right.x + s + tx)
+    ky = 1 / (bottom or 1)
+    return {
+        'x': [round((node.x + tx) * kx, 6) for node in order],
+        'y': [round(node.depth * ky, 6) for node in order]
+    }
+
+def load_hierarchy(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
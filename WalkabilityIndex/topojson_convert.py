@@ -0,0 +1,211 @@
+import json
+import numpy as np
+
+# Name of the geometry collection in the emitted topology
+OBJECT_NAME = 'walkability'
+
+def _rings(geometry):
+    """Return (type, polygons) where polygons is a list of ring lists."""
+    if not geometry:
+        return None, []
+    if geometry['type'] == 'Polygon':
+        return 'Polygon', [geometry['coordinates']]
+    if geometry['type'] == 'MultiPolygon':
+        return 'MultiPolygon', geometry['coordinates']
+    raise ValueError(f"Unsupported geometry type {geometry['type']}")
+
+def _bbox(features):
+    x0 = y0 = float('inf')
+    x1 = y1 = float('-inf')
+    for feature in features:
+        for polygon in _rings(feature.get('geometry'))[1]:
+            for ring in polygon:
+                points = np.asarray(ring, dtype=float)[:, :2]
+                x0, y0 = np.minimum((x0, y0), points.min(axis=0))
+                x1, y1 = np.maximum((x1, y1), points.max(axis=0))
+    return float(x0), float(y0), float(x1), float(y1)
+
+def _quantize_ring(ring, x0, y0, kx, ky):
+    """Quantize a ring, dropping repeated points; None if it collapses."""
+    points = np.rint((np.asarray(ring, dtype=float)[:, :2] - (x0, y0)) / (kx, ky)).astype(np.int32)
+    keep = np.ones(len(points), dtype=bool)
+    keep[1:] = (points[1:] != points[:-1]).any(axis=1)
+    points = points[keep]
+    if (points[0] != points[-1]).any():
+        points = np.vstack([points, points[:1]])
+    # A ring needs at least three distinct points
+    return points if len(points) >= 4 else None
+
+def _point_keys(points):
+    """Pack quantized (x, y) pairs into single int64 keys."""
+    return (points[:, 0].astype(np.int64) << 32) | points[:, 1].astype(np.int64)
+
+def _junction_masks(rings):
+    """Flag points where rings stop sharing a boundary: neighbours differ between visits.
+
+    Works on every ring point at once by sorting (point, neighbour pair)
+    keys, so memory stays a few integer arrays per point rather than a
+    Python dict entry per point.
+    """
+    if not rings:
+        return []
+    sizes = np.array([len(ring) - 1 for ring in rings])
+    points = np.concatenate([ring[:-1] for ring in rings])
+    starts = np.repeat(np.cumsum(sizes) - sizes, sizes)
+    offsets = np.arange(len(points)) - starts
+    lengths = np.repeat(sizes, sizes)
+    keys = _point_keys(points)
+    before = keys[starts + (offsets - 1) % lengths]
+    after = keys[starts + (offsets + 1) % lengths]
+    low, high = np.minimum(before, after), np.maximum(before, after)
+    del points, starts, offsets, lengths, before, after
+
+    order = np.lexsort((high, low, keys))
+    sorted_keys, low, high = keys[order], low[order], high[order]
+    differs = ((sorted_keys[1:] == sorted_keys[:-1]) &
+               ((low[1:] != low[:-1]) | (high[1:] != high[:-1])))
+    junctions = np.unique(sorted_keys[1:][differs])
+    return np.split(np.isin(keys, junctions), np.cumsum(sizes)[:-1])
+
+def _cut_ring(ring, junctions):
+    """Split a closed ring into arcs that start and end at junctions."""
+    n = len(ring) - 1
+    starts = np.flatnonzero(junctions)
+    if not len(starts):
+        return None
+    # Rotate so the ring starts at its first junction
+    first = starts[0]
+    rotated = np.concatenate([ring[first:n], ring[:first + 1]])
+    cuts = list(starts - first) + [n]
+    return [rotated[a:b + 1] for a, b in zip(cuts, cuts[1:])]
+
+def _canonical_ring(ring):
+    """Rotate a junction-free ring to start at its smallest point."""
+    body = ring[:-1]
+    start = np.lexsort((body[:, 1], body[:, 0]))[0]
+    body = np.concatenate([body[start:], body[:start]])
+    return np.vstack([body, body[:1]])
+
+class ArcTable:
+    """Arcs shared between rings, looked up in either direction."""
+
+    def __init__(self):
+        self.arcs = []
+        self.index = {}
+
+    def add(self, arc):
+        """Return the arc index, or its one's complement when the arc is stored reversed."""
+        key = arc.tobytes()
+        if key in self.index:
+            return self.index[key]
+        reverse = arc[::-1].tobytes()
+        if reverse in self.index:
+            return ~self.index[reverse]
+        self.index[key] = len(self.arcs)
+        self.arcs.append(arc)
+        return self.index[key]
+
+    def add_closed(self, ring):
+        """Add a ring with no junctions, matching it to identical rings in either direction."""
+        forward = _canonical_ring(ring)
+        backward = _canonical_ring(ring[::-1]).tobytes()
+        if backward in self.index:
+            return ~self.index[backward]
+        return self.add(forward)
+
+    def encoded(self):
+        """Return the arcs delta-encoded, as TopoJSON expects with a transform."""
+        return [delta_encode(arc) for arc in self.arcs]
+
+def delta_encode(arc):
+    """Store each quantized point as its offset from the previous one."""
+    return np.diff(arc, axis=0, prepend=np.zeros((1, 2), dtype=arc.dtype))
+
+def delta_decode(deltas):
+    """Inverse of delta_encode."""
+    return np.cumsum(np.asarray(deltas, dtype=np.int64), axis=0)
+
+def geojson_to_topology(features, fields=None, quantization=100000, object_name=OBJECT_NAME,
+                        bbox=None):
+    """Convert GeoJSON features to a quantized TopoJSON topology with shared arcs.
+
+    Coordinates are snapped to a quantization x quantization grid over the
+    data's bounding box, boundaries shared by neighbouring polygons are
+    stored once, and arcs are delta-encoded as integer arrays.
+
+    features is read twice, for the bounding box and then the rings, so it
+    can be a FeatureSource streaming from disk; only the quantized rings and
+    kept properties are held in memory. Passing the [west, south, east,
+    north] bbox of the features saves the first read.
+    """
+    x0, y0, x1, y1 = bbox if bbox is not None else _bbox(features)
+    kx = (x1 - x0) / (quantization - 1) or 1
+    ky = (y1 - y0) / (quantization - 1) or 1
+
+    # Quantize every ring first, since junctions depend on all of them
+    rings = []
+    shapes = []
+    for feature in features:
+        kind, polygons = _rings(feature.get('geometry'))
+        ring_ids = []
+        for polygon in polygons:
+            ids = []
+            for ring in polygon:
+                ring = _quantize_ring(ring, x0, y0, kx, ky)
+                if ring is not None:
+                    ids.append(len(rings))
+                    rings.append(ring)
+            if ids:
+                ring_ids.append(ids)
+        properties = feature.get('properties') or {}
+        if fields is not None:
+            properties = {field: properties[field] for field in fields if field in properties}
+        shapes.append((kind, ring_ids, properties))
+    junctions = _junction_masks(rings)
+
+    table = ArcTable()
+    geometries = []
+    for kind, ring_ids, properties in shapes:
+        arc_polygons = []
+        for ids in ring_ids:
+            arc_rings = []
+            for ring_id in ids:
+                pieces = _cut_ring(rings[ring_id], junctions[ring_id])
+                if pieces is None:
+                    arc_rings.append([table.add_closed(rings[ring_id])])
+                else:
+                    arc_rings.append([table.add(piece) for piece in pieces])
+            arc_polygons.append(arc_rings)
+
+        if not arc_polygons:
+            geometry = {'type': None}
+        elif kind == 'Polygon':
+            geometry = {'type': 'Polygon', 'arcs': arc_polygons[0]}
+        else:
+            geometry = {'type': 'MultiPolygon', 'arcs': arc_polygons}
+        geometry['properties'] = properties
+        geometries.append(geometry)
+
+    return {
+        'type': 'Topology',
+        'transform': {'scale': [kx, ky], 'translate': [x0, y0]},
+        'objects': {object_name: {'type': 'GeometryCollection', 'geometries': geometries}},
+        'arcs': table.encoded()
+    }
+
+def write_topology(topology, output_path):
+    """Write a topology, serializing its arcs one at a time."""
+    with open(output_path, 'w', encoding='utf-8') as f:
+        header = {key: value for key, value in topology.items() if key != 'arcs'}
+        f.write(json.dumps(header, separators=(',', ':'))[:-1])
+        f.write(',"arcs":[')
+        for i, arc in enumerate(topology['arcs']):
+            if i:
+                f.write(',')
+            f.write(json.dumps(np.asarray(arc).tolist(), separators=(',', ':')))
+        f.write(']}')
+
+def topojson_load(url, object_name=OBJECT_NAME):
+    """JS expression loading a topology as the FeatureCollection d3.json would return."""
+    return (f'd3.json("{url}").then(topology => '
+            f'topojson.feature(topology, topology.objects.{object_name}))')
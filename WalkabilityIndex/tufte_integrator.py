@@ -1,87 +1,21 @@
+import argparse
 import os
-from bs4 import BeautifulSoup
 from pathlib import Path
+from page_index import get_page_index
+from html_backends import BACKENDS, parse_page
+from build_manifest import BuildManifest
+from data_prep import DATA_INPUTS, prepare_page_data
+from parallel_extract import extract_pages
+from shared_loads import share_data_loads
+from stream_render import (OrderedFragments, block_scoped, copy_spool, render_template,
+                           section_spool, split_template, template_script_keys, write_data_blocks,
+                           write_scripts, write_styles)
+import io
 import json
 import re
 import shutil
 
-class TufteIntegrator:
-    def __init__(self, base_dir):
-        self.base_dir = Path(base_dir)
-        self.tufte_dir = self.base_dir / 'tufte_tests'
-        self.sections = [
-            'overview',
-            'access',
-            'standards',
-            'codebook',
-            'context',
-            'uses',
-            'sources'
-        ]
-    
-    def get_all_html_files(self):
-        """Get all HTML files in the tufte_tests directory."""
-        html_files = []
-        for section in self.sections:
-            section_dir = self.tufte_dir / section
-            if section_dir.exists():
-                html_files.extend(list(section_dir.glob('*.html')))
-        return html_files
-    
-    def extract_content(self, file_path):
-        """Extract content from a Tufte page, preserving scripts and data."""
-        with open(file_path, 'r', encoding='utf-8') as f:
-            soup = BeautifulSoup(f.read(), 'html.parser')
-            
-            # Remove navigation elements
-            for nav in soup.find_all(class_=['nav-buttons', 'control-button', 'controls', 'navigation']):
-                nav.decompose()
-            
-            # Extract styles
-            styles = []
-            for style in soup.find_all('style'):
-                if style.string:
-                    styles.append(style.string)
-            
-            # Extract scripts and preserve D3 initialization
-            scripts = []
-            for script in soup.find_all('script'):
-                if script.get('src'):
-                    # Add all necessary D3 dependencies
-                    src = script['src']
-                    if any(lib in src for lib in ['d3', 'topojson']):
-                        scripts.append({'src': src})
-                elif script.string:
-                    # Fix data file paths in the script
-                    js_content = script.string
-                    js_content = js_content.replace('../../', '')
-                    js_content = js_content.replace('../', '')
-                    scripts.append({'content': js_content})
-            
-            # Extract main content
-            main_content = soup.find('body')
-            if main_content:
-                # Remove navigation
-                for nav in main_content.find_all('div', class_='navigation'):
-                    nav.decompose()
-                
-                # Keep the original structure for visualization containers
-                content = str(main_content).replace('<body>', '').replace('</body>', '').strip()
-                
-                # Create a container for the content
-                section_name = file_path.parent.name
-                content = f'<div class="tufte-content" data-section="{section_name}">{content}</div>'
-            
-            return {
-                'styles': styles,
-                'scripts': scripts,
-                'content': content,
-                'section': file_path.parent.name
-            }
-    
-    def generate_integrated_html(self):
-        """Generate the integrated datawalker HTML with light theme."""
-        template = """
+TEMPLATE = """
 <!DOCTYPE html>
 <html>
 <head>
@@ -435,59 +369,179 @@ class TufteIntegrator:
 </body>
 </html>
 """
-        
-        # Collect all content
-        all_styles = set()
-        all_scripts = []
-        sections_html = []
-        
-        # Process each HTML file
-        html_files = self.get_all_html_files()
-        for file_path in sorted(html_files):
-            content = self.extract_content(file_path)
+
+# Split once at the placeholders so the document can be streamed
+TEMPLATE_PARTS = split_template(TEMPLATE)
+
+# External scripts the template loads itself, never repeated from pages
+TEMPLATE_SCRIPTS = template_script_keys(TEMPLATE)
+
+class TufteIntegrator:
+    def __init__(self, base_dir, jobs=1, parser=None):
+        self.base_dir = Path(base_dir)
+        self.tufte_dir = self.base_dir / 'tufte_tests'
+        self.manifest = None
+        self.jobs = jobs
+        self.parser = parser
+        self.sections = [
+            'overview',
+            'access',
+            'standards',
+            'codebook',
+            'context',
+            'uses',
+            'sources'
+        ]
+        self.data_blocks = {}
+        # Files the data prep wrote, which incremental builds check still exist
+        self.data_outputs = []
+    
+    def get_all_html_files(self):
+        """Get all HTML files in the tufte_tests directory."""
+        page_index = get_page_index(self.tufte_dir)
+        html_files = []
+        for section in self.sections:
+            html_files.extend(page_index.pages(section))
+        return html_files
+    
+    def extract_content(self, file_path):
+        """Extract content from a Tufte page, preserving scripts and data."""
+        with open(file_path, 'r', encoding='utf-8') as f:
+            page = parse_page(f.read(), self.parser)
+            
+            # Remove navigation elements
+            page.remove_classes(['nav-buttons', 'control-button', 'controls', 'navigation'])
+            
+            # Extract styles
+            styles = page.styles()
+            
+            # Extract scripts and preserve D3 initialization
+            scripts = []
+            for script in page.scripts():
+                if 'src' in script:
+                    # Add all necessary D3 dependencies
+                    src = script['src']
+                    if any(lib in src for lib in ['d3', 'topojson']):
+                        scripts.append({'src': src})
+                else:
+                    # Fix data file paths in the script
+                    js_content = script['content']
+                    js_content = js_content.replace('../../', '')
+                    js_content = js_content.replace('../', '')
+                    scripts.append({'content': js_content})
             
-            # Add styles and scripts
-            all_styles.update(content['styles'])
-            all_scripts.extend(content['scripts'])
+            # Extract main content
+            # Remove navigation; scripts are collected separately
+            page.remove_classes('navigation', tag='div', within_body=True)
+            main_content = page.body(strip_scripts=True)
+            if main_content:
+                # Keep the original structure for visualization containers
+                content = main_content.replace('<body>', '').replace('</body>', '').strip()
+                
+                # Create a container for the content
+                section_name = file_path.parent.name
+                content = f'<div class="tufte-content" data-section="{section_name}">{content}</div>'
             
-            # Create section HTML
-            section_html = f"""
+            return {
+                'styles': styles,
+                'scripts': scripts,
+                'content': content,
+                'section': file_path.parent.name
+            }
+    
+    def load_pages(self, file_paths):
+        """Extract pages in order, in parallel and from the manifest when enabled."""
+        extract = lambda paths: extract_pages(self, paths, self.jobs)
+        if self.manifest is None:
+            return extract(file_paths)
+        return self.manifest.extract_all(file_paths, extract)
+    
+    def generate_integrated_html(self):
+        """Generate the integrated datawalker HTML with light theme."""
+        buffer = io.StringIO()
+        self.write_integrated_html(buffer, self.load_pages(sorted(self.get_all_html_files())))
+        return buffer.getvalue()
+    
+    def write_integrated_html(self, stream, pages):
+        """Stream the integrated HTML to any writable text stream."""
+        # Collect all content
+        all_styles = OrderedFragments()
+        all_scripts = OrderedFragments(exclude=TEMPLATE_SCRIPTS)
+        
+        # Sections are spooled while styles and scripts are collected, since
+        # the styles have to be written first
+        with section_spool() as sections:
+            # Process each HTML file
+            for i, content in enumerate(pages):
+                # Add styles and scripts
+                all_styles.update(content['styles'])
+                all_scripts.update(content['scripts'])
+                
+                # Create section HTML
+                if i:
+                    sections.write('\n')
+                sections.write(f"""
             <section class="section" data-step="{content['section']}" data-title="{content['section'].title()}">
                 <div class="node"></div>
                 <div class="content">
                     {content['content']}
                 </div>
             </section>
-            """
-            sections_html.append(section_html)
+            """)
+            
+            # Precompute chart data once the scripts that use it are known;
+            # pages that fetch the same data share one request and parse
+            self.data_blocks, page_scripts, self.data_outputs = prepare_page_data(
+                self.base_dir, share_data_loads(block_scoped(all_scripts)))
+            
+            # Data blocks go first so page scripts can read them synchronously
+            def write_all_scripts(out):
+                write_data_blocks(out, self.data_blocks)
+                write_scripts(out, page_scripts)
+            
+            render_template(stream, TEMPLATE_PARTS, {
+                '{{TUFTE_STYLES}}': lambda out: write_styles(out, all_styles),
+                '{{SECTIONS}}': lambda out: copy_spool(sections, out),
+                '{{TUFTE_SCRIPTS}}': write_all_scripts
+            })
+    
+    def save_integrated_html(self, output_file='datawalker-dubstep.html', incremental=False):
+        """Save the integrated HTML to a file."""
+        output_path = self.base_dir / output_file
+        if incremental:
+            self.manifest = BuildManifest.for_output(output_path, self.base_dir, self)
+            for file in DATA_INPUTS:
+                self.manifest.track(self.base_dir / file)
         
-        # Generate scripts HTML
-        scripts_html = []
-        for script in all_scripts:
-            if 'src' in script:
-                scripts_html.append(f'<script src="{script["src"]}"></script>')
-            elif 'content' in script:
-                scripts_html.append(f'<script>{script["content"]}</script>')
+        pages = self.load_pages(sorted(self.get_all_html_files()))
         
-        # Replace placeholders in template
-        html = template.replace('{{TUFTE_STYLES}}', 
-                              f'<style>{"".join(all_styles)}</style>')
-        html = html.replace('{{TUFTE_SCRIPTS}}', '\n'.join(scripts_html))
-        html = html.replace('{{SECTIONS}}', '\n'.join(sections_html))
+        if incremental and not self.manifest.is_stale(output_path):
+            print(f"Up to date: {output_file}")
+            return
+        if incremental and self.manifest.missing_outputs():
+            print(f"Rebuilding, missing {', '.join(self.manifest.missing_outputs())}")
         
-        return html
-    
-    def save_integrated_html(self, output_file='datawalker-dubstep.html'):
-        """Save the integrated HTML to a file."""
-        html = self.generate_integrated_html()
-        with open(self.base_dir / output_file, 'w', encoding='utf-8') as f:
-            f.write(html)
+        with open(output_path, 'w', encoding='utf-8') as f:
+            self.write_integrated_html(f, pages)
+        if incremental:
+            self.manifest.record_outputs(self.data_outputs)
+            self.manifest.save()
         print(f"Created integrated file: {output_file}")
 
 def main():
-    base_dir = "/Users/gaia/Downloads/WalkabilityIndex"
-    integrator = TufteIntegrator(base_dir)
-    integrator.save_integrated_html()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('base_dir', nargs='?', default="/Users/gaia/Downloads/WalkabilityIndex")
+    parser.add_argument('--output', default='datawalker-dubstep.html')
+    parser.add_argument('--incremental', action='store_true',
+                        help='only re-extract pages whose content changed')
+    parser.add_argument('--parser', choices=['auto'] + BACKENDS, default='auto',
+                        help='HTML parser backend (auto picks the fastest installed)')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='worker processes for page extraction (0 = all cores)')
+    args = parser.parse_args()
+    
+    integrator = TufteIntegrator(args.base_dir, jobs=args.jobs, parser=args.parser)
+    integrator.save_integrated_html(args.output, incremental=args.incremental)
 
 if __name__ == "__main__":
-    main()
+    main()
\ No newline at end of file
@@ -0,0 +1,149 @@
+import json
+import re
+from array import array
+import numpy as np
+from geojson_prune import ID_FIELD
+
+# Optional, see requirements.txt; FeatureCollections are parsed in pure
+# Python without it
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+# Walkability GeoJSON the Tufte pages load
+GEOJSON_FILE = 'atlanta_walkability_wgs84.geojson'
+
+# Numeric EPA Smart Location fields the pages chart
+NUMERIC_FIELDS = [
+    'NatWalkInd',
+    'D2A_Ranked',
+    'D2B_Ranked',
+    'D3B_Ranked',
+    'D4A_Ranked',
+    'D3B',
+    'D3BN',
+    'TotPop'
+]
+
+# Suffixes read as newline-delimited features (GeoJSONSeq / NDJSON)
+SEQUENCE_SUFFIXES = ('.geojsonl', '.geojsons', '.geojsonseq', '.ndjson', '.jsonl')
+
+# Text read per step by the fallback FeatureCollection parser
+CHUNK_SIZE = 1 << 16
+
+FEATURES_ARRAY = re.compile(r'"features"\s*:\s*\[')
+
+def _read_sequence(f):
+    """Yield features from GeoJSONSeq (RS-prefixed) or NDJSON lines."""
+    for line in f:
+        line = line.strip().lstrip('\x1e')
+        if line:
+            yield json.loads(line)
+
+def _read_collection(f):
+    """Yield the features of a FeatureCollection without loading the whole document.
+
+    Decodes one feature at a time from a sliding text buffer, so memory is
+    bounded by the largest feature rather than the file.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    while True:
+        match = FEATURES_ARRAY.search(buffer)
+        if match:
+            break
+        chunk = f.read(CHUNK_SIZE)
+        if not chunk:
+            return
+        # Keep a tail in case the key straddles two chunks
+        buffer = buffer[-32:] + chunk
+    buffer, position = buffer[match.end():], 0
+
+    while True:
+        while position < len(buffer) and buffer[position] in ' \t\r\n,':
+            position += 1
+        if position == len(buffer):
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                raise ValueError("Unterminated features array")
+            buffer, position = chunk, 0
+            continue
+        if buffer[position] == ']':
+            return
+        try:
+            feature, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            # The feature runs past the buffer; read at least as much again
+            chunk = f.read(max(CHUNK_SIZE, len(buffer) - position))
+            if not chunk:
+                raise
+            buffer, position = buffer[position:] + chunk, 0
+            continue
+        yield feature
+        position = end
+        if position > CHUNK_SIZE:
+            buffer, position = buffer[position:], 0
+
+def iter_features(geojson_path):
+    """Yield the features of a GeoJSON file one at a time.
+
+    GeoJSONSeq/NDJSON files are read line by line. FeatureCollections are
+    parsed incrementally, with ijson when it is installed.
+    """
+    geojson_path = str(geojson_path)
+    if geojson_path.endswith(SEQUENCE_SUFFIXES):
+        with open(geojson_path, 'r', encoding='utf-8') as f:
+            yield from _read_sequence(f)
+    elif ijson is not None:
+        with open(geojson_path, 'rb') as f:
+            yield from ijson.items(f, 'features.item', use_float=True)
+    else:
+        with open(geojson_path, 'r', encoding='utf-8') as f:
+            yield from _read_collection(f)
+
+class FeatureSource:
+    """Re-iterable view of a GeoJSON file that streams its features on each pass."""
+
+    def __init__(self, geojson_path):
+        self.path = geojson_path
+
+    def __iter__(self):
+        return iter_features(self.path)
+
+def scan_features(features, collectors):
+    """Read features once, handing each to every collector's add().
+
+    Stages that each need something from every feature collect it in the
+    same pass, so a large file is streamed from disk only once.
+    """
+    for feature in features:
+        for collector in collectors:
+            collector.add(feature)
+
+class ColumnCollector:
+    """Numeric property columns, GEOID10s and property names, gathered a feature at a time."""
+
+    def __init__(self, fields=NUMERIC_FIELDS):
+        self.values = {field: array('d') for field in fields}
+        self.ids = []
+        # Every property name any feature has
+        self.available = set()
+
+    def add(self, feature):
+        properties = feature.get('properties') or {}
+        for field, column in self.values.items():
+            value = properties.get(field)
+            column.append(value if isinstance(value, (int, float)) else np.nan)
+        self.ids.append(properties.get(ID_FIELD))
+        self.available.update(properties)
+
+    def columns(self):
+        """Return {field: float64 array}, NaN where a value is missing."""
+        return {field: np.array(column) for field, column in self.values.items()}
+
+def property_columns(features, fields=NUMERIC_FIELDS):
+    """Return {field: float64 array} over features, NaN where a value is missing."""
+    collector = ColumnCollector(fields)
+    scan_features(features, [collector])
+    return collector.columns()
@@ -1,141 +1,26 @@
+import argparse
 import os
-from bs4 import BeautifulSoup
 from pathlib import Path
+from page_index import get_page_index
+from html_backends import BACKENDS, parse_page
+from build_manifest import BuildManifest
+from parallel_extract import extract_pages
+from shared_loads import share_data_loads
+from stream_render import (OrderedFragments, block_scoped, copy_spool, render_template, section_spool,
+                           split_template, template_script_keys, write_data_blocks, write_scripts,
+                           write_styles)
+from data_prep import SCENARIOS_FILE, WalkabilityDataPrep
+from downsample import CHART_WIDTHS
+from partition import SCHEMES, TILE_CAPACITY
+from simplify import LOD_WIDTHS
+from svg_render import CANVAS_THRESHOLD
+from walkability_data import GEOJSON_FILE
+import io
 import json
 import re
 import shutil
 
-class WhiteThemeIntegrator:
-    def __init__(self, base_dir):
-        self.base_dir = Path(base_dir)
-        self.tufte_dir = self.base_dir / 'tufte_tests'
-        self.structure = {
-            'overview': ['creator.html', 'temporal.html', 'geographic.html'],
-            'access': ['instructions.html', 'requirements.html'],
-            'standards': ['structure.html'],
-            'codebook': ['fields.html'],
-            'context': ['analysis.html'],
-            'uses': ['applications.html'],
-            'sources': ['references.html']
-        }
-        
-    def copy_data_files(self):
-        """Copy necessary data files to the same directory as the output HTML."""
-        # We don't need to copy files since they're already in the right place
-        data_files = [
-            'atlanta_walkability_wgs84.geojson',
-            'force_graph_data.json',
-            'temporal_data.json'
-        ]
-        
-        # Just verify the files exist
-        missing_files = []
-        for file in data_files:
-            if not (self.base_dir / file).exists():
-                missing_files.append(file)
-        
-        if missing_files:
-            print("Warning: Missing data files:", missing_files)
-    
-    def extract_content(self, file_path):
-        """Extract content from a Tufte page, preserving scripts and data."""
-        with open(file_path, 'r', encoding='utf-8') as f:
-            soup = BeautifulSoup(f.read(), 'html.parser')
-            
-            # Remove navigation elements
-            for nav in soup.find_all(class_=['nav-buttons', 'control-button', 'controls']):
-                nav.decompose()
-            
-            # Extract styles
-            styles = []
-            for style in soup.find_all('style'):
-                if style.string:
-                    styles.append(style.string)
-            
-            # Extract scripts and preserve D3 initialization
-            scripts = []
-            for script in soup.find_all('script'):
-                if script.get('src'):
-                    # Add all necessary D3 dependencies
-                    src = script['src']
-                    if any(lib in src for lib in ['d3', 'topojson']):
-                        scripts.append({'src': src})
-                elif script.string:
-                    # Fix data file paths in the script
-                    js_content = script.string
-                    js_content = js_content.replace('../../', '')
-                    js_content = js_content.replace('../', '')
-                    
-                    # Special handling for force graph data
-                    if 'forceSimulation' in js_content:
-                        if not soup.find(class_='connection-graph'):
-                            js_content = js_content.replace(
-                                'document.querySelector(\'.connection-graph\')',
-                                'document.querySelector(\'.force-graph\')'
-                            )
-                    
-                    # Special handling for temporal chart
-                    if 'temporal-chart' in js_content:
-                        js_content = js_content.replace(
-                            'document.querySelector(\'.chart\')',
-                            'document.querySelector(\'.temporal-chart\')'
-                        )
-                    
-                    # Special handling for structure diagram
-                    if 'structure-diagram' in js_content:
-                        js_content = js_content.replace(
-                            'document.querySelector(\'.structure-diagram\')',
-                            'document.querySelector(\'.structure-tree\')'
-                        )
-                    
-                    scripts.append({'content': js_content})
-            
-            # Extract main content and preserve containers
-            main_content = soup.find('body')
-            if main_content:
-                # Remove navigation
-                for nav in main_content.find_all('div', class_='navigation'):
-                    nav.decompose()
-                
-                # Keep the original structure for visualization containers
-                content = str(main_content).replace('<body>', '').replace('</body>', '').strip()
-                
-                # Add force graph container if needed
-                if any('forceSimulation' in s.get('content', '') for s in scripts):
-                    content = content.replace(
-                        '<div class="connection-graph"',
-                        '<div class="force-graph" style="width: 100%; height: 400px;"'
-                    )
-                
-                # Add temporal chart container if needed
-                if any('temporal-chart' in s.get('content', '') for s in scripts):
-                    content = content.replace(
-                        '<div class="chart"',
-                        '<div class="temporal-chart"'
-                    )
-                
-                # Add structure tree container if needed
-                if any('structure-diagram' in s.get('content', '') for s in scripts):
-                    content = content.replace(
-                        '<div class="structure-diagram"',
-                        '<div class="structure-tree" style="width: 100%; height: 500px;"'
-                    )
-                
-                # Create a container for the content
-                content = f'<div class="tufte-content">{content}</div>'
-            
-            return {
-                'styles': styles,
-                'scripts': scripts,
-                'content': content
-            }
-    
-    def generate_integrated_html(self):
-        """Generate the integrated datawalker HTML with light theme."""
-        # First, copy necessary data files
-        self.copy_data_files()
-        
-        template = """
+TEMPLATE = """
 <!DOCTYPE html>
 <html>
 <head>
@@ -305,6 +190,14 @@ class WhiteThemeIntegrator:
             font-size: 0.8em;
         }
 
+        .scenario-select {
+            position: absolute;
+            top: 20px;
+            left: 20px;
+            font-family: inherit;
+            z-index: 1000;
+        }
+
         .region-highlight {
             position: absolute;
             padding: 1rem;
@@ -679,70 +572,370 @@ class WhiteThemeIntegrator:
 </body>
 </html>
 """
+
+# Split once at the placeholders so the document can be streamed
+TEMPLATE_PARTS = split_template(TEMPLATE)
+
+# External scripts the template loads itself, never repeated from pages
+TEMPLATE_SCRIPTS = template_script_keys(TEMPLATE)
+
+def replace_div_class(content, old_class, new_attrs):
+    """Replace the class of <div class="old_class"> wherever it sits among the attributes."""
+    # Parser backends serialize attributes in different orders
+    pattern = r'<div((?:\s+[\w-]+="[^"]*")*?)\s+class="%s"' % re.escape(old_class)
+    return re.sub(pattern, lambda m: f'<div {new_attrs}{m.group(1)}', content)
+
+def inline_map(content, svg):
+    """Insert a pre-rendered map <svg> as the first child of the #map container."""
+    pattern = r'<div(?:\s+[\w-]+="[^"]*")*?\s+id="map"(?:\s+[\w-]+="[^"]*")*\s*>'
+    return re.sub(pattern, lambda m: m.group(0) + svg, content, count=1)
+
+class WhiteThemeIntegrator:
+    def __init__(self, base_dir, jobs=1, parser=None, precision=5, quantization=100000,
+                 lod_widths=LOD_WIDTHS, geojson_file=GEOJSON_FILE, partition=None,
+                 tile_capacity=TILE_CAPACITY, view=None, chart_widths=CHART_WIDTHS,
+                 prerender_map=False, canvas_threshold=CANVAS_THRESHOLD, analysis=False):
+        self.base_dir = Path(base_dir)
+        self.tufte_dir = self.base_dir / 'tufte_tests'
+        self.manifest = None
+        self.jobs = jobs
+        self.parser = parser
+        self.precision = precision
+        self.quantization = quantization
+        self.lod_widths = lod_widths
+        self.structure = {
+            'overview': ['creator.html', 'temporal.html', 'geographic.html'],
+            'access': ['instructions.html', 'requirements.html'],
+            'standards': ['structure.html'],
+            'codebook': ['fields.html'],
+            'context': ['analysis.html'],
+            'uses': ['applications.html'],
+            'sources': ['references.html']
+        }
+        self.geojson_file = geojson_file
+        self.partition = partition
+        self.tile_capacity = tile_capacity
+        self.view = view
+        self.chart_widths = chart_widths
+        # Render the geographic section's choropleth at build time
+        self.prerender_map = prerender_map
+        self.canvas_threshold = canvas_threshold
+        # Also write the contiguity, outliers and centroid tree files
+        self.analysis = analysis
+        self.data_files = [
+            geojson_file,
+            'force_graph_data.json',
+            'structure_data.json',
+            'temporal_data.json'
+        ]
+        self.data_blocks = {}
+        # Files the data prep wrote, which incremental builds check still exist
+        self.data_outputs = []
+
+    def build_options(self):
+        """Options that shape the output, part of the incremental build's staleness key."""
+        return {
+            'structure': self.structure,
+            'geojson_file': self.geojson_file,
+            'precision': self.precision,
+            'quantization': self.quantization,
+            'lod_widths': list(self.lod_widths),
+            'partition': self.partition,
+            'tile_capacity': self.tile_capacity,
+            'view': list(self.view) if self.view else None,
+            'chart_widths': list(self.chart_widths),
+            'prerender_map': self.prerender_map,
+            'canvas_threshold': self.canvas_threshold,
+            'analysis': self.analysis
+        }
         
-        # Collect all Tufte content
-        all_styles = set()
-        all_scripts = []
-        sections_html = []
+    def copy_data_files(self):
+        """Copy necessary data files to the same directory as the output HTML."""
+        # We don't need to copy files since they're already in the right place
+        # Just verify the files exist
+        missing_files = []
+        for file in self.data_files:
+            if not (self.base_dir / file).exists():
+                missing_files.append(file)
         
+        if missing_files:
+            print("Warning: Missing data files:", missing_files)
+    
+    def extract_content(self, file_path):
+        """Extract content from a Tufte page, preserving scripts and data."""
+        with open(file_path, 'r', encoding='utf-8') as f:
+            page = parse_page(f.read(), self.parser)
+            
+            # Remove navigation elements
+            page.remove_classes(['nav-buttons', 'control-button', 'controls'])
+            
+            # Extract styles
+            styles = page.styles()
+            
+            # The structure diagram is drawn into the theme's tree container,
+            # decided from the markup since the rewrite below removes the
+            # scripts' only mention of the page's class
+            structure_tree = page.has_class('structure-diagram')
+            
+            # Extract scripts and preserve D3 initialization
+            scripts = []
+            for script in page.scripts():
+                if 'src' in script:
+                    # Add all necessary D3 dependencies
+                    src = script['src']
+                    if any(lib in src for lib in ['d3', 'topojson']):
+                        scripts.append({'src': src})
+                else:
+                    # Fix data file paths in the script
+                    js_content = script['content']
+                    js_content = js_content.replace('../../', '')
+                    js_content = js_content.replace('../', '')
+                    
+                    # Special handling for force graph data
+                    if 'forceSimulation' in js_content:
+                        if not page.has_class('connection-graph'):
+                            js_content = js_content.replace(
+                                'document.querySelector(\'.connection-graph\')',
+                                'document.querySelector(\'.force-graph\')'
+                            )
+                    
+                    # Special handling for temporal chart
+                    if 'temporal-chart' in js_content:
+                        js_content = js_content.replace(
+                            'document.querySelector(\'.chart\')',
+                            'document.querySelector(\'.temporal-chart\')'
+                        )
+                    
+                    # Special handling for structure diagram
+                    if structure_tree:
+                        js_content = js_content.replace(
+                            'document.querySelector(\'.structure-diagram\')',
+                            'document.querySelector(\'.structure-tree\')'
+                        )
+                    
+                    scripts.append({'content': js_content})
+            
+            # Extract main content and preserve containers
+            # Remove navigation; scripts are collected separately
+            page.remove_classes('navigation', tag='div', within_body=True)
+            main_content = page.body(strip_scripts=True)
+            if main_content:
+                # Keep the original structure for visualization containers
+                content = main_content.replace('<body>', '').replace('</body>', '').strip()
+                
+                # Add force graph container if needed
+                if any('forceSimulation' in s.get('content', '') for s in scripts):
+                    content = replace_div_class(
+                        content, 'connection-graph',
+                        'class="force-graph" style="width: 100%; height: 400px;"'
+                    )
+                
+                # Add temporal chart container if needed
+                if any('temporal-chart' in s.get('content', '') for s in scripts):
+                    content = replace_div_class(
+                        content, 'chart',
+                        'class="temporal-chart"'
+                    )
+                
+                # Add structure tree container if needed
+                if structure_tree:
+                    content = replace_div_class(
+                        content, 'structure-diagram',
+                        'class="structure-tree" style="width: 100%; height: 500px;"'
+                    )
+                
+                # Create a container for the content
+                content = f'<div class="tufte-content">{content}</div>'
+            
+            return {
+                'styles': styles,
+                'scripts': scripts,
+                'content': content
+            }
+    
+    def load_pages(self, file_paths):
+        """Extract pages in order, in parallel and from the manifest when enabled."""
+        extract = lambda paths: extract_pages(self, paths, self.jobs)
+        if self.manifest is None:
+            return extract(file_paths)
+        return self.manifest.extract_all(file_paths, extract)
+    
+    def generate_integrated_html(self):
+        """Generate the integrated datawalker HTML with light theme."""
+        buffer = io.StringIO()
+        self.write_integrated_html(buffer, self.load_structure_pages())
+        return buffer.getvalue()
+    
+    def load_structure_pages(self):
+        """Find and extract every page in self.structure, grouped by section."""
+        page_index = get_page_index(self.tufte_dir)
+        section_paths = {}
         for section, files in self.structure.items():
-            section_content = []
+            section_paths[section] = []
             for file in files:
                 # Find the file in the section subdirectory
-                file_path = None
-                for subdir in self.tufte_dir.glob('*'):
-                    if subdir.is_dir():
-                        potential_path = subdir / file
-                        if potential_path.exists():
-                            file_path = potential_path
-                            break
-                
+                file_path = page_index.find(file, section)
                 if file_path:
-                    content = self.extract_content(file_path)
-                    all_styles.update(content['styles'])
-                    all_scripts.extend(content['scripts'])
-                    section_content.append(content['content'])
-            
-            # Create section HTML
-            section_html = f"""
+                    section_paths[section].append(file_path)
+        
+        # Extract every page in one batch, in structure order
+        pages = self.load_pages([file_path for paths in section_paths.values() for file_path in paths])
+        return section_paths, pages
+    
+    def write_integrated_html(self, stream, structure_pages):
+        """Stream the integrated HTML to any writable text stream."""
+        # First, copy necessary data files
+        self.copy_data_files()
+        
+        section_paths, pages = structure_pages
+        
+        data_prep = WalkabilityDataPrep(self.base_dir, precision=self.precision,
+                                        quantization=self.quantization,
+                                        lod_widths=self.lod_widths,
+                                        geojson_file=self.geojson_file,
+                                        partition=self.partition,
+                                        tile_capacity=self.tile_capacity, view=self.view,
+                                        chart_widths=self.chart_widths,
+                                        canvas_threshold=self.canvas_threshold,
+                                        analysis=self.analysis)
+        
+        # The map is drawn by the data-prep pass, which then runs before the
+        # sections are written so the map can be inlined
+        map_svg = None
+        self.data_blocks = None
+        if self.prerender_map:
+            pages = list(pages)
+            map_scripts = [script for page in pages for script in page['scripts']
+                           if 'geoMercator' in script.get('content', '')]
+            if map_scripts:
+                page_scripts = OrderedFragments(exclude=TEMPLATE_SCRIPTS)
+                for page in pages:
+                    page_scripts.update(page['scripts'])
+                self.data_blocks = data_prep.run(page_scripts, map_scripts)
+                map_svg = data_prep.map_svg
+        pages = iter(pages)
+        
+        # Collect all Tufte content
+        all_styles = OrderedFragments()
+        all_scripts = OrderedFragments(exclude=TEMPLATE_SCRIPTS)
+        
+        # Sections are spooled while styles and scripts are collected, since
+        # the styles have to be written first
+        with section_spool() as sections:
+            for i, (section, paths) in enumerate(section_paths.items()):
+                if i:
+                    sections.write('\n')
+                
+                # Create section HTML
+                sections.write(f"""
             <section class="section" data-step="{section}" data-title="{section.title()}">
                 <div class="node"></div>
                 <div class="content">
                     <div class="tufte-container">
-                        {''.join(section_content)}
+                        """)
+                for file_path in paths:
+                    content = next(pages)
+                    all_styles.update(content['styles'])
+                    all_scripts.update(content['scripts'])
+                    if map_svg and any('geoMercator' in script.get('content', '')
+                                       for script in content['scripts']):
+                        sections.write(inline_map(content['content'], map_svg))
+                    else:
+                        sections.write(content['content'])
+                sections.write("""
                     </div>
                 </div>
             </section>
-            """
-            sections_html.append(section_html)
+            """)
+            
+            # Precompute chart data once the scripts that use it are known
+            if self.data_blocks is None:
+                self.data_blocks = data_prep.run(all_scripts)
+            self.data_outputs = data_prep.outputs
+            # Pages that fetch the same data share one request and parse
+            page_scripts = (data_prep.loader_scripts +
+                            data_prep.rewrite_scripts(share_data_loads(block_scoped(all_scripts))))
+            
+            # Data blocks go first so page scripts can read them synchronously
+            def write_all_scripts(out):
+                write_data_blocks(out, self.data_blocks)
+                write_scripts(out, page_scripts)
+            
+            render_template(stream, TEMPLATE_PARTS, {
+                '{{TUFTE_STYLES}}': lambda out: write_styles(out, all_styles),
+                '{{SECTIONS}}': lambda out: copy_spool(sections, out),
+                '{{TUFTE_SCRIPTS}}': write_all_scripts
+            })
+    
+    def save_integrated_html(self, output_file='datawalker-w.html', incremental=False):
+        """Save the integrated HTML to a file."""
+        output_path = self.base_dir / output_file
+        if incremental:
+            self.manifest = BuildManifest.for_output(output_path, self.base_dir, self)
+            for file in self.data_files + [SCENARIOS_FILE]:
+                self.manifest.track(self.base_dir / file)
         
-        # Generate scripts HTML
-        scripts_html = []
-        for script in all_scripts:
-            if 'src' in script:
-                scripts_html.append(f'<script src="{script["src"]}"></script>')
-            elif 'content' in script:
-                scripts_html.append(f'<script>{script["content"]}</script>')
+        structure_pages = self.load_structure_pages()
         
-        # Replace placeholders in template
-        html = template.replace('{{TUFTE_STYLES}}', 
-                              f'<style>{"".join(all_styles)}</style>')
-        html = html.replace('{{TUFTE_SCRIPTS}}', '\n'.join(scripts_html))
-        html = html.replace('{{SECTIONS}}', '\n'.join(sections_html))
+        if incremental and not self.manifest.is_stale(output_path):
+            print(f"Up to date: {output_file}")
+            return
+        if incremental and self.manifest.missing_outputs():
+            print(f"Rebuilding, missing {', '.join(self.manifest.missing_outputs())}")
         
-        return html
-    
-    def save_integrated_html(self, output_file='datawalker-w.html'):
-        """Save the integrated HTML to a file."""
-        html = self.generate_integrated_html()
-        with open(self.base_dir / output_file, 'w', encoding='utf-8') as f:
-            f.write(html)
+        with open(output_path, 'w', encoding='utf-8') as f:
+            self.write_integrated_html(f, structure_pages)
+        if incremental:
+            self.manifest.record_outputs(self.data_outputs)
+            self.manifest.save()
         print(f"Created integrated file: {output_file}")
 
 def main():
-    base_dir = "/Users/gaia/Downloads/WalkabilityIndex"
-    integrator = WhiteThemeIntegrator(base_dir)
-    integrator.save_integrated_html()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('base_dir', nargs='?', default="/Users/gaia/Downloads/WalkabilityIndex")
+    parser.add_argument('--output', default='datawalker-w.html')
+    parser.add_argument('--incremental', action='store_true',
+                        help='only re-extract pages whose content changed')
+    parser.add_argument('--parser', choices=['auto'] + BACKENDS, default='auto',
+                        help='HTML parser backend (auto picks the fastest installed)')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='worker processes for page extraction (0 = all cores)')
+    parser.add_argument('--geojson', default=GEOJSON_FILE,
+                        help='source features, a GeoJSON or GeoJSONSeq/NDJSON file in base_dir')
+    parser.add_argument('--precision', type=int, default=5,
+                        help='decimal places kept in the pruned GeoJSON coordinates')
+    parser.add_argument('--quantization', type=int, default=100000,
+                        help='TopoJSON grid size per axis (0 loads the pruned GeoJSON instead)')
+    parser.add_argument('--lod-widths', type=int, nargs='*', default=LOD_WIDTHS,
+                        help='map widths in pixels to write simplified levels for (none to disable)')
+    parser.add_argument('--partition', choices=SCHEMES,
+                        help='split the map data by county or quadtree tile and load only the view; '
+                             'replaces the TopoJSON, LOD levels, spatial index and scenario layers')
+    parser.add_argument('--tile-capacity', type=int, default=TILE_CAPACITY,
+                        help='most features per quadtree tile')
+    parser.add_argument('--view', type=float, nargs=4, metavar=('WEST', 'SOUTH', 'EAST', 'NORTH'),
+                        help='bounds whose partitions the page loads first (default: a quarter of the width '
+                             'and height around the median block group)')
+    parser.add_argument('--chart-widths', type=int, nargs='*', default=CHART_WIDTHS,
+                        help='chart widths in pixels to write downsampled time series for (none to disable)')
+    parser.add_argument('--prerender-map', action='store_true',
+                        help='render the choropleth to SVG at build time and inline it')
+    parser.add_argument('--canvas-threshold', type=int, default=CANVAS_THRESHOLD,
+                        help='feature count above which maps draw to a canvas instead of SVG')
+    parser.add_argument('--analysis', action='store_true',
+                        help='also write the contiguity graphs, spatial outliers and centroid KD-tree '
+                             'for outliers.html and nearest.py')
+    args = parser.parse_args()
+    
+    integrator = WhiteThemeIntegrator(args.base_dir, jobs=args.jobs, parser=args.parser,
+                                       precision=args.precision, quantization=args.quantization,
+                                       lod_widths=args.lod_widths, geojson_file=args.geojson,
+                                       partition=args.partition, tile_capacity=args.tile_capacity,
+                                       view=args.view, chart_widths=args.chart_widths,
+                                       prerender_map=args.prerender_map,
+                                       canvas_threshold=args.canvas_threshold,
+                                       analysis=args.analysis)
+    integrator.save_integrated_html(args.output, incremental=args.incremental)
 
 if __name__ == "__main__":
-    main()
+    main()
\ No newline at end of file